@@ -0,0 +1,6 @@
+"""
+Benchmarks for the hot paths of payeshgar server.
+
+Each module is runnable on its own, e.g. ``python -m benchmarks.generate_inspections``,
+it uses a throwaway test database created from the configured DATABASES settings.
+"""
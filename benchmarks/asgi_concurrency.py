@@ -0,0 +1,144 @@
+"""
+Requests per second of the agent-facing API with many concurrent agents, served the WSGI way (a pool of threads) and
+by Django's ASGI handler (see payeshgar_server.asgi).
+
+    python -m benchmarks.asgi_concurrency [--agents 1000] [--threads 32] [--db-latency 2]
+
+Every agent introduces itself (POST agents), fetches its work plan (GET inspections of an aligned window) and submits a
+result (POST inspection-results, async ingestion against kombu's in-memory transport), all agents at once. The WSGI
+deployment is a pool of --threads threads, like gunicorn's gthread workers with agents waiting in the listen backlog,
+the default executor of the event loop has the same number of threads for the ASGI one (what ASGI_THREADS sets, see
+payeshgar_server.asgi). Applications are called in-process (no sockets). The database is a local SQLite file, every
+query waits --db-latency milliseconds more to stand for the round trip to a database server, which is the wait that ties
+threads up.
+
+Errors are counted rather than raised: SQLite fails a transaction which upgrades its read lock while another one
+writes ("database is locked", e.g. two agents introducing themselves at once), whatever its busy timeout.
+"""
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from unittest import mock
+
+from benchmarks import utils
+
+
+def prepare(agents, groups):
+    from inspecting import models, tasks, workplans
+    from monitoring import models as monitoring_models
+
+    group_objects = monitoring_models.Group.objects.bulk_create([monitoring_models.Group(name=g) for g in groups])
+    endpoints = monitoring_models.Endpoint.objects.bulk_create(
+        [monitoring_models.Endpoint(name=f'benchmark-endpoint-{i}') for i in range(100)]
+    )
+    for i, endpoint in enumerate(endpoints):
+        policy = monitoring_models.MonitoringPolicy.objects.create(endpoint=endpoint)
+        policy.groups.add(group_objects[i % len(groups)])
+    tasks.generate_inspections()
+    ips = [f'10.{i // 65536}.{i // 256 % 256}.{i % 256}' for i in range(agents)]
+    # Agents are known already, they only introduce themselves again
+    monitoring_models.Agent.objects.bulk_create(
+        [monitoring_models.Agent(ip=ip, name=f'agent-{i}') for i, ip in enumerate(ips)]
+    )
+    inspections = [str(i) for i in models.Inspection.objects.values_list('id', flat=True)[:agents]]
+
+    after = workplans.bucket_of(datetime.now()) + workplans.WORK_PLAN_BUCKET
+    window = f"after={after.isoformat()}&before={(after + workplans.WORK_PLAN_BUCKET).isoformat()}"
+    requests = []
+    for i, ip in enumerate(ips):
+        group = groups[i % len(groups)]
+        result = dict(inspection=inspections[i % len(inspections)], connection_status="SUCCEED", status_code=200,
+                      response_time=0.128, byte_received=2048)
+        requests += [
+            (ip, 'POST', '/api/v1/monitoring/agents', '', json.dumps(dict(name=f'agent-{i}', groups=[group]))),
+            (ip, 'GET', '/api/v1/inspecting/inspections', f'groups={group}&{window}', ''),
+            (ip, 'POST', '/api/v1/inspecting/inspection-results', '', json.dumps([result])),
+        ]
+    return requests
+
+
+def run_wsgi(requests, threads):
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.test import RequestFactory
+
+    handler = WSGIHandler()
+
+    def call(request):
+        ip, method, path, query, body = request
+        environ = RequestFactory(REMOTE_ADDR=ip).generic(
+            method, f"{path}?{query}" if query else path, body, content_type='application/json',
+        ).environ
+        status = []
+        b"".join(handler(environ, lambda s, headers, exc_info=None: status.append(s)))
+        return int(status[0][:3])
+
+    with ThreadPoolExecutor(threads) as pool:
+        return list(pool.map(call, requests))
+
+
+async def run_asgi(handler, requests, concurrency, threads):
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(threads))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def call(request):
+        ip, method, path, query, body = request
+        body = body.encode()
+        scope = dict(type='http', method=method, path=path, query_string=query.encode(), client=(ip, 40000), headers=[
+            (b'host', b'testserver'), (b'content-type', b'application/json'), (b'content-length', b'%d' % len(body)),
+        ])
+        inbox, sent = asyncio.Queue(), []
+        inbox.put_nowait({'type': 'http.request', 'body': body})
+
+        async def send(message):
+            sent.append(message)
+
+        async with semaphore:
+            await handler(scope, inbox.get, send)
+        return sent[0]['status']
+
+    return await asyncio.gather(*(call(request) for request in requests))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--agents', type=int, default=1000)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--db-latency', type=float, default=2, help="milliseconds added to every query")
+    args = parser.parse_args()
+
+    utils.setup()
+    from django.core.handlers.asgi import ASGIHandler
+    from django.db.backends.utils import CursorWrapper
+    from django.test import override_settings
+    from payeshgar_server.celery import app
+    # settings are loaded with CELERY namespace, so the namespaced key has to be overridden
+    app.conf.CELERY_BROKER_URL = 'memory://'
+
+    with utils.test_database(on_disk=True), override_settings(DEBUG=False):
+        requests = prepare(args.agents, [f'group-{i}' for i in range(10)])
+        deployments = [
+            ("wsgi", lambda: run_wsgi(requests, args.threads)),
+            ("asgi", lambda: asyncio.run(run_asgi(ASGIHandler(), requests, args.agents, args.threads))),
+        ]
+        execute = CursorWrapper._execute_with_wrappers
+
+        def slow_execute(cursor, *arguments, **kwargs):
+            time.sleep(args.db_latency / 1000)
+            return execute(cursor, *arguments, **kwargs)
+
+        print(f"{len(requests)} requests, {args.agents} concurrent agents, {args.db_latency}ms per query")
+        print(f"{'':>14} {'seconds':>9} {'requests/s':>11} {'errors':>7}")
+        for name, deployment in deployments:
+            start = time.perf_counter()
+            with mock.patch.object(CursorWrapper, '_execute_with_wrappers', slow_execute):
+                statuses = deployment()
+            seconds = time.perf_counter() - start
+            errors = sum(1 for status in statuses if status >= 400)
+            print(f"{name:>14} {seconds:>9.2f} {len(requests) / seconds:>11.0f} {errors:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Time, queries and bytes of a polling round of many agents over endpoints and inspections of their group, plain and
+with the ETag of the previous round in If-None-Match (nothing changed in between, so every conditional poll is a 304).
+
+    python -m benchmarks.conditional_polling [--agents 5000] [--endpoints 200] [--groups 10]
+
+Each agent is in one of the groups, every endpoint is monitored by one group. Requests go through the whole Django
+stack (test client) with the default cache.
+"""
+import argparse
+from datetime import datetime, timedelta
+
+from benchmarks import utils
+
+
+def poll(client, urls, etags=None):
+    """
+    (etags, statuses, response bytes) of GETting urls
+    """
+    new_etags, statuses, size = [], {}, 0
+    for i, url in enumerate(urls):
+        headers = {} if etags is None else dict(HTTP_IF_NONE_MATCH=etags[i])
+        response = client.get(url, **headers)
+        new_etags.append(response['ETag'])
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        size += len(response.content)
+    return new_etags, statuses, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--agents', type=int, default=5000)
+    parser.add_argument('--endpoints', type=int, default=200)
+    parser.add_argument('--groups', type=int, default=10)
+    args = parser.parse_args()
+
+    utils.setup()
+    from django.test import Client
+    from inspecting import tasks
+    from monitoring import models as monitoring_models
+
+    groups = [f'group-{i}' for i in range(args.groups)]
+    with utils.test_database():
+        group_objects = monitoring_models.Group.objects.bulk_create([monitoring_models.Group(name=g) for g in groups])
+        endpoints = monitoring_models.Endpoint.objects.bulk_create(
+            [monitoring_models.Endpoint(name=f'benchmark-endpoint-{i}') for i in range(args.endpoints)]
+        )
+        for i, endpoint in enumerate(endpoints):
+            monitoring_models.HTTPEndpointDetail.objects.create(
+                endpoint=endpoint, hostname=f'endpoint-{i}.example.com', port=443, path='/', method_name='GET',
+            )
+            policy = monitoring_models.MonitoringPolicy.objects.create(endpoint=endpoint)
+            policy.groups.add(group_objects[i % len(groups)])
+        tasks.generate_inspections()
+
+        after = datetime.now().replace(second=0, microsecond=0)
+        window = f"after={after.isoformat()}&before={(after + timedelta(minutes=5)).isoformat()}"
+        cases = [
+            ("endpoints", [f"/api/v1/monitoring/endpoints?groups={groups[i % len(groups)]}"
+                           for i in range(args.agents)]),
+            ("inspections", [f"/api/v1/inspecting/inspections?groups={groups[i % len(groups)]}&{window}"
+                             for i in range(args.agents)]),
+        ]
+
+        client = Client()
+        print(f"{'':>12} {'poll':>12} {'seconds':>9} {'queries':>8} {'bytes':>11}  statuses")
+        for name, urls in cases:
+            etags = None
+            for label in ('plain', 'conditional'):
+                with utils.measure() as result:
+                    new_etags, statuses, size = poll(client, urls, etags)
+                etags = new_etags
+                print(f"{name:>12} {label:>12} {result['seconds']:>9.2f} {result['queries']:>8} {size:>11}  {statuses}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Time and queries of statistics of an endpoint per hour over a range: aggregated in Python from raw result rows (what a
+dashboard had to do), by the database (inspecting.stats) and again with closed buckets cached.
+
+    python -m benchmarks.endpoint_stats [--agents 20] [--days 7] [--interval 30]
+
+Results of every agent for every inspection of a single endpoint are stored, the range is the whole period.
+"""
+import argparse
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from benchmarks import utils
+
+
+def aggregate_in_python(endpoint_id, after, before):
+    from inspecting import models, stats
+
+    buckets = {}
+    rows = models.HTTPInspectionResult.objects.filter(
+        inspection__endpoint_id=endpoint_id, inspection__timestamp__gte=after, inspection__timestamp__lt=before,
+    ).values_list('inspection__timestamp', 'connection_status', 'status_code', 'response_time')
+    for timestamp, connection_status, status_code, response_time in rows.iterator():
+        bucket = buckets.setdefault(stats.bucket_start(timestamp, stats.HOUR), dict(
+            attempts=0, succeed=0, timed_out=0, status_classes={}, response_times=[],
+        ))
+        bucket['attempts'] += 1
+        bucket['succeed'] += connection_status == "SUCCEED"
+        bucket['timed_out'] += connection_status == "TIMED-OUT"
+        if status_code is not None:
+            status_class = f"{status_code[0]}xx"
+            bucket['status_classes'][status_class] = bucket['status_classes'].get(status_class, 0) + 1
+        if response_time is not None:
+            bucket['response_times'].append(response_time)
+    return [
+        (start, dict(
+            success_ratio=b['succeed'] / b['attempts'], timeout_ratio=b['timed_out'] / b['attempts'],
+            response_time_min=min(b['response_times'], default=None),
+            response_time_avg=sum(b['response_times']) / len(b['response_times']) if b['response_times'] else None,
+            response_time_max=max(b['response_times'], default=None),
+        ))
+        for start, b in sorted(buckets.items())
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--agents', type=int, default=20)
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--interval', type=int, default=30, help="seconds between inspections")
+    args = parser.parse_args()
+
+    utils.setup()
+    from django.core.cache import cache
+    from inspecting import models, stats
+    from monitoring import models as monitoring_models
+
+    with utils.test_database():
+        agents = monitoring_models.Agent.objects.bulk_create(
+            [monitoring_models.Agent(ip=f"10.0.{i // 256}.{i % 256}", name=f'agent-{i}') for i in range(args.agents)]
+        )
+        endpoint = monitoring_models.Endpoint.objects.create(name='benchmark-endpoint')
+        start = datetime(2026, 1, 1)
+        end = start + timedelta(days=args.days)
+        inspections = models.Inspection.objects.bulk_create([
+            models.Inspection(endpoint=endpoint, timestamp=start + timedelta(seconds=i * args.interval))
+            for i in range(args.days * 86400 // args.interval)
+        ])
+        for offset in range(0, len(inspections), 1000):
+            results = []
+            for inspection in inspections[offset:offset + 1000]:
+                for agent in agents:
+                    succeed = random.random() < 0.98
+                    results.append(models.HTTPInspectionResult(
+                        inspection=inspection, timestamp=inspection.timestamp, agent=agent,
+                        connection_status="SUCCEED" if succeed else "TIMED-OUT",
+                        status_code=random.choice(["200", "200", "200", "503"]) if succeed else None,
+                        response_time=Decimal(random.randint(80, 400)) / 1000 if succeed else None,
+                        byte_received=2048 if succeed else None,
+                    ))
+            models.HTTPInspectionResult.objects.bulk_create(results)
+        print(f"{len(inspections) * len(agents)} results over {args.days} days")
+
+        cache.clear()
+        now = end + timedelta(days=1)
+        cases = [
+            ("python", lambda: aggregate_in_python(endpoint.id, start, end)),
+            ("database", lambda: stats.query(endpoint.id, start, end, stats.HOUR, now=now)),
+            ("cached", lambda: stats.query(endpoint.id, start, end, stats.HOUR, now=now)),
+        ]
+        print(f"{'':>9} {'seconds':>9} {'queries':>8} {'buckets':>8}")
+        for name, run in cases:
+            with utils.measure() as result:
+                buckets = run()
+            print(f"{name:>9} {result['seconds']:>9.3f} {result['queries']:>8} {len(buckets):>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Load test of agent event streams: memory of many idle streams held by one process, and time to fan an event out to
+all of them or to the streams of one group set.
+
+    python -m benchmarks.event_stream [--agents 5000] [--groups 10] [--inspections 50]
+
+Streams are opened by calling the ASGI application directly (no sockets, so only the cost of the application itself
+is measured) and events go through the local broker, the in-process stand-in for the Kombu fanout exchange. Memory is
+measured with tracemalloc (Python allocations only).
+"""
+import argparse
+import asyncio
+import json
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+
+from benchmarks import utils
+
+
+class Stream:
+    """
+    A fake agent connection, counts frames sent to it and resolves waiting when `expected` streams got a frame
+    """
+    pending = 0
+    done = None
+
+    def __init__(self, app, ip, groups):
+        self.inbox = asyncio.Queue()
+        self.inbox.put_nowait({'type': 'http.request', 'body': b''})
+        self.frames = 0
+        scope = dict(
+            type='http', method='GET', path='/api/v1/monitoring/events', headers=[], client=(ip, 40000),
+            query_string="&".join(f"groups={group}" for group in groups).encode(),
+        )
+        self.task = asyncio.ensure_future(app(scope, self.inbox.get, self.send))
+
+    async def send(self, message):
+        if message['type'] != 'http.response.body' or not message.get('body'):
+            return
+        self.frames += 1
+        Stream.pending -= 1
+        if Stream.pending == 0:
+            Stream.done.set()
+
+    @classmethod
+    async def wait_for(cls, count, action=None):
+        cls.pending, cls.done = count, asyncio.Event()
+        start = time.perf_counter()
+        if action is not None:
+            action()
+        await cls.done.wait()
+        return time.perf_counter() - start
+
+
+async def run(args, ips):
+    from monitoring import events
+
+    groups = [f'group-{i}' for i in range(args.groups)]
+    app = events.EventStreamApplication(None)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    streams = []
+    opening = asyncio.ensure_future(Stream.wait_for(len(ips)))
+    start = time.perf_counter()
+    for i, ip in enumerate(ips):
+        streams.append(Stream(app, ip, [groups[i % len(groups)]]))
+    await opening
+    opened = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    print(f"opened {len(streams)} streams in {opened:.2f}s, {memory / len(streams) / 1024:.1f}KiB per idle stream")
+
+    now = datetime.now()
+    plan = json.dumps([
+        dict(id=str(uuid.uuid4()), endpoint=str(uuid.uuid4()), timestamp=(now + timedelta(seconds=i)).isoformat())
+        for i in range(args.inspections)
+    ], separators=(',', ':'))
+    cases = [
+        ("endpoints, to everyone", events.event(events.ENDPOINTS, '"version"'), len(streams)),
+        ("inspections, to one group set", events.event(events.INSPECTIONS, plan, [groups[0]]),
+         len([s for i, s in enumerate(streams) if i % len(groups) == 0])),
+    ]
+    print(f"{'event':>30} {'streams':>8} {'bytes':>8} {'fan-out':>10}")
+    for name, event, count in cases:
+        seconds = await Stream.wait_for(count, lambda: events.publish(event))
+        print(f"{name:>30} {count:>8} {len(events.encode(event)):>8} {seconds * 1000:>8.1f}ms")
+
+    for stream in streams:
+        stream.inbox.put_nowait({'type': 'http.disconnect'})
+    await asyncio.gather(*(stream.task for stream in streams))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--agents', type=int, default=5000)
+    parser.add_argument('--groups', type=int, default=10)
+    parser.add_argument('--inspections', type=int, default=50, help="per pushed work plan")
+    args = parser.parse_args()
+
+    utils.setup()
+    from django.test import override_settings
+    from monitoring import identity, models as monitoring_models
+
+    ips = [f'10.{i // 65536}.{i // 256 % 256}.{i % 256}' for i in range(args.agents)]
+    with utils.test_database(), override_settings(AGENT_EVENTS_BROKER="local"):
+        monitoring_models.Agent.objects.bulk_create(
+            [monitoring_models.Agent(ip=ip, name=f'agent-{i}') for i, ip in enumerate(ips)]
+        )
+        # Streams check identities from the local tier, as they would with a warm cache
+        identity.known_agents(ips)
+        asyncio.run(run(args, ips))
+
+
+if __name__ == '__main__':
+    main()
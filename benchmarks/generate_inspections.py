@@ -0,0 +1,50 @@
+"""
+Run time and query count of `inspecting.tasks.generate_inspections` for different number of endpoints.
+
+    python -m benchmarks.generate_inspections [--sizes 1000 10000 100000]
+
+Each size is measured twice: a cold run (no inspection exists) and a top-up run right after it, which should find
+every endpoint already covered.
+"""
+import argparse
+
+from benchmarks import utils
+
+
+def create_endpoints(count, interval=30):
+    from monitoring import models as monitoring_models
+
+    endpoints = monitoring_models.Endpoint.objects.bulk_create(
+        [monitoring_models.Endpoint(name=f'endpoint-{i}') for i in range(count)],
+    )
+    monitoring_models.MonitoringPolicy.objects.bulk_create(
+        [monitoring_models.MonitoringPolicy(endpoint=endpoint, interval=interval) for endpoint in endpoints],
+    )
+
+
+def run(sizes):
+    from inspecting import models, tasks
+    from monitoring import models as monitoring_models
+
+    print(f"{'endpoints':>10} {'run':>8} {'seconds':>10} {'queries':>8} {'planned':>10}")
+    for size in sizes:
+        models.Inspection.objects.all().delete()
+        monitoring_models.Endpoint.objects.all().delete()
+        create_endpoints(size)
+        for label in ('cold', 'top-up'):
+            with utils.measure() as result:
+                planned = tasks.generate_inspections()
+            print(f"{size:>10} {label:>8} {result['seconds']:>10.3f} {result['queries']:>8} {planned:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    args = parser.parse_args()
+    utils.setup()
+    with utils.test_database():
+        run(args.sizes)
+
+
+if __name__ == '__main__':
+    main()
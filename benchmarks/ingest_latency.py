@@ -0,0 +1,82 @@
+"""
+Latency of `inspection-results` requests in sync and async ingestion modes.
+
+    python -m benchmarks.ingest_latency [--requests 500] [--rows 100]
+
+Async mode is measured against kombu's in-memory transport, so it shows the cost of authenticating and queueing a
+submission without a network round trip to the broker.
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+
+from benchmarks import utils
+
+
+def prepare(requests, rows):
+    from inspecting import models
+    from monitoring import models as monitoring_models
+
+    endpoint = monitoring_models.Endpoint.objects.create(name='benchmark-endpoint')
+    monitoring_models.MonitoringPolicy.objects.create(endpoint=endpoint, interval=1)
+    monitoring_models.Agent.objects.create(ip='127.0.0.1', name='benchmark-agent', country='DEU')
+    start = datetime.now()
+    models.Inspection.objects.bulk_create(
+        [models.Inspection(endpoint=endpoint, timestamp=start + timedelta(seconds=i)) for i in range(requests * rows)]
+    )
+    ids = [str(i) for i in models.Inspection.objects.values_list('id', flat=True)]
+    return [
+        json.dumps([
+            {
+                'inspection': inspection_id,
+                'connection_status': "SUCCEED",
+                'status_code': 200,
+                'response_time': 0.128,
+                'byte_received': 2048,
+            } for inspection_id in ids[i * rows:(i + 1) * rows]
+        ]) for i in range(requests)
+    ]
+
+
+def measure(bodies, mode):
+    from django.test import Client, override_settings
+    from inspecting import models
+
+    client = Client()
+    latencies = []
+    with override_settings(INSPECTION_RESULT_INGESTION=mode):
+        for body in bodies:
+            start = time.perf_counter()
+            response = client.post("/api/v1/inspecting/inspection-results", data=body,
+                                   content_type="application/json")
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code in (200, 202), response.content
+    models.HTTPInspectionResult.objects.all().delete()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--rows', type=int, default=100, help="number of results in each submission")
+    args = parser.parse_args()
+
+    utils.setup()
+    from payeshgar_server.celery import app
+    # settings are loaded with CELERY namespace, so the namespaced key has to be overridden
+    app.conf.CELERY_BROKER_URL = 'memory://'
+
+    with utils.test_database():
+        bodies = prepare(args.requests, args.rows)
+        print(f"{args.requests} requests, {args.rows} results each")
+        print(f"{'mode':>6} {'p50 ms':>8} {'p99 ms':>8} {'mean ms':>8}")
+        for mode in ('sync', 'async'):
+            latencies = measure(bodies, mode)
+            print(f"{mode:>6} {utils.percentile(latencies, 50) * 1000:>8.2f} "
+                  f"{utils.percentile(latencies, 99) * 1000:>8.2f} "
+                  f"{sum(latencies) / len(latencies) * 1000:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Ingestion throughput (rows/sec) of many small submissions processed concurrently, with and without micro-batching.
+
+    python -m benchmarks.ingest_throughput [--agents 50] [--submissions 2000] [--rows 10] [--threads 64]
+                                           [--batch-max-rows 320] [--batch-max-age 0.05]
+
+Submissions are processed by a thread pool, like a Celery worker running with the threads pool (the default with
+batching), a prefork worker process runs one task at a time and doesn't batch at all. A batch can't be larger
+than threads * rows, since every submitter waits for its batch to be stored, so batch-max-rows should be lower.
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from benchmarks import utils
+
+
+def prepare(agents, submissions, rows):
+    from inspecting import models
+    from monitoring import models as monitoring_models
+
+    endpoint = monitoring_models.Endpoint.objects.create(name='benchmark-endpoint')
+    monitoring_models.MonitoringPolicy.objects.create(endpoint=endpoint, interval=1)
+    agent_ips = [f"10.0.{i // 256}.{i % 256}" for i in range(agents)]
+    monitoring_models.Agent.objects.bulk_create(
+        [monitoring_models.Agent(ip=ip, name=f'agent-{ip}', country='DEU') for ip in agent_ips]
+    )
+    per_agent = -(-submissions // agents)
+    start = datetime.now()
+    models.Inspection.objects.bulk_create(
+        [models.Inspection(endpoint=endpoint, timestamp=start + timedelta(seconds=i)) for i in range(per_agent * rows)]
+    )
+    ids = [str(i) for i in models.Inspection.objects.values_list('id', flat=True)]
+    return [
+        (agent_ips[i % agents], [
+            {
+                'inspection': inspection_id,
+                'connection_status': "SUCCEED",
+                'status_code': 200,
+                'response_time': 0.128,
+                'byte_received': 2048,
+            } for inspection_id in ids[(i // agents) * rows:(i // agents + 1) * rows]
+        ]) for i in range(submissions)
+    ]
+
+
+def measure(submissions, threads, batching, batch_max_rows, batch_max_age):
+    from django.db import connection
+    from django.test import override_settings
+    from inspecting import ingest, models
+
+    def process(submission):
+        agent_ip, results = submission
+        try:
+            ingest.submit(agent_ip, datetime.now(), results)
+        finally:
+            connection.close()
+
+    ingest._batcher = None
+    with override_settings(INSPECTION_RESULT_BATCHING=batching, INSPECTION_RESULT_BATCH_MAX_ROWS=batch_max_rows,
+                           INSPECTION_RESULT_BATCH_MAX_AGE=batch_max_age):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(process, submissions))
+        seconds = time.perf_counter() - start
+    rows = models.HTTPInspectionResult.objects.count()
+    models.HTTPInspectionResult.objects.all().delete()
+    return rows, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--agents', type=int, default=50)
+    parser.add_argument('--submissions', type=int, default=2000)
+    parser.add_argument('--rows', type=int, default=10, help="number of results in each submission")
+    parser.add_argument('--threads', type=int, default=64)
+    parser.add_argument('--batch-max-rows', type=int, default=320)
+    parser.add_argument('--batch-max-age', type=float, default=0.05)
+    args = parser.parse_args()
+
+    utils.setup()
+    with utils.test_database(on_disk=True):
+        submissions = prepare(args.agents, args.submissions, args.rows)
+        print(f"{args.submissions} submissions of {args.rows} results from {args.agents} agents, "
+              f"{args.threads} threads, batches of {args.batch_max_rows} rows / {args.batch_max_age}s")
+        print(f"{'path':>12} {'rows':>8} {'seconds':>8} {'rows/sec':>10}")
+        for label, batching in (('per-request', False), ('batched', True)):
+            rows, seconds = measure(submissions, args.threads, batching, args.batch_max_rows, args.batch_max_age)
+            print(f"{label:>12} {rows:>8} {seconds:>8.2f} {rows / seconds:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Time, time to first byte and peak memory of listing inspections of a large window, as a plain list, as keyset pages
+and streamed as NDJSON.
+
+    python -m benchmarks.inspection_listing [--endpoints 100] [--inspections 1000]
+
+Every endpoint is monitored by one of a few groups, the window is listed filtered by half of the groups. Peak memory
+is measured with tracemalloc (Python allocations only).
+"""
+import argparse
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from benchmarks import utils
+
+
+def run(view, request):
+    """
+    (seconds to the first byte, total seconds, peak bytes, response bytes) of a request
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    response = view(request)
+    if response.streaming:
+        content = iter(response.streaming_content)
+        size = len(next(content))
+        first = time.perf_counter() - start
+        size += sum(len(chunk) for chunk in content)
+    else:
+        response.render()
+        first = time.perf_counter() - start
+        size = len(response.content)
+    total = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return first, total, peak, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--endpoints', type=int, default=100)
+    parser.add_argument('--inspections', type=int, default=1000, help="per endpoint")
+    args = parser.parse_args()
+
+    utils.setup()
+    from rest_framework.test import APIRequestFactory
+    from inspecting import models, views
+    from monitoring import models as monitoring_models
+
+    groups = [f'group-{i}' for i in range(4)]
+    with utils.test_database(on_disk=True):
+        group_objects = monitoring_models.Group.objects.bulk_create([monitoring_models.Group(name=g) for g in groups])
+        endpoints = monitoring_models.Endpoint.objects.bulk_create(
+            [monitoring_models.Endpoint(name=f'benchmark-endpoint-{i}') for i in range(args.endpoints)]
+        )
+        for i, endpoint in enumerate(endpoints):
+            policy = monitoring_models.MonitoringPolicy.objects.create(endpoint=endpoint)
+            policy.groups.add(group_objects[i % len(groups)], group_objects[(i + 1) % len(groups)])
+        start = datetime(2026, 1, 1)
+        models.Inspection.objects.bulk_create([
+            models.Inspection(endpoint=endpoint, timestamp=start + timedelta(seconds=30 * i))
+            for endpoint in endpoints for i in range(args.inspections)
+        ])
+
+        filters = {
+            'after': start - timedelta(seconds=1),
+            'before': start + timedelta(seconds=30 * args.inspections),
+            'groups': groups[:2],
+        }
+        view = views.InspectionListAPIView.as_view()
+        factory = APIRequestFactory()
+        cases = [
+            ("list", factory.get('/', filters)),
+            ("ndjson", factory.get('/', filters, HTTP_ACCEPT='application/x-ndjson')),
+            ("first page", factory.get('/', dict(filters, limit=1000))),
+        ]
+        last_page = view(factory.get('/', dict(filters, limit=1000))).data
+        while True:
+            response = view(factory.get(last_page['next']))
+            if response.data['next'] is None:
+                break
+            last_page = response.data
+        cases.append(("last page", factory.get(last_page['next'])))
+
+        print(f"{'':>10} {'first byte':>11} {'total':>9} {'peak memory':>12} {'bytes':>10}")
+        for name, request in cases:
+            first, total, peak, size = run(view, request)
+            print(f"{name:>10} {first * 1000:>9.1f}ms {total * 1000:>7.1f}ms {peak / 1024 / 1024:>9.1f}MiB {size:>10}")
+
+
+if __name__ == '__main__':
+    main()
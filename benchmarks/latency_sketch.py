@@ -0,0 +1,59 @@
+"""
+Accuracy and speed of percentiles from merged latency sketches against exact percentiles of raw values.
+
+    python -m benchmarks.latency_sketch [--values 1000000] [--sketches 1200]
+
+Synthetic response times are log-normal with a slow tail, split between sketches just like results of different
+agents and hours are. Exact percentiles are computed by sorting all values, which is a lower bound of what reading
+raw results from the database would cost.
+"""
+import argparse
+import random
+import time
+
+from benchmarks import utils
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--values', type=int, default=1000000)
+    parser.add_argument('--sketches', type=int, default=1200, help="e.g. 50 agents * 24 hours")
+    args = parser.parse_args()
+
+    utils.setup()
+    from inspecting import sketches
+
+    values = [random.lognormvariate(-2.5, 0.7) if random.random() < 0.97 else random.uniform(1, 10)
+              for _ in range(args.values)]
+
+    start = time.perf_counter()
+    parts = [sketches.DDSketch() for _ in range(args.sketches)]
+    for i, value in enumerate(values):
+        parts[i % args.sketches].add(value)
+    encoded = [part.to_bytes() for part in parts]
+    build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    merged = sketches.DDSketch()
+    for data in encoded:
+        merged.merge(sketches.DDSketch.from_bytes(data))
+    estimates = [merged.quantile(q) for q in sketches.QUANTILES]
+    merge = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ordered = sorted(values)
+    exact = [ordered[int(q * (len(ordered) - 1))] for q in sketches.QUANTILES]
+    exact_duration = time.perf_counter() - start
+
+    print(f"{args.values} values in {args.sketches} sketches, "
+          f"{sum(map(len, encoded)) / len(encoded):.0f} bytes per sketch on average")
+    print(f"building sketches: {build:.2f}s (ingestion cost, {build / args.values * 1e6:.2f}us per value)")
+    print(f"merge and query:   {merge * 1000:.1f}ms")
+    print(f"exact (sorting):   {exact_duration * 1000:.1f}ms")
+    print(f"{'quantile':>8} {'exact':>9} {'sketch':>9} {'error %':>8}")
+    for q, e, s in zip(sketches.QUANTILES, exact, estimates):
+        print(f"{q:>8} {e:>9.4f} {s:>9.4f} {abs(s - e) / e * 100:>8.3f}")
+
+
+if __name__ == '__main__':
+    main()
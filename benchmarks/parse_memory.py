@@ -0,0 +1,62 @@
+"""
+Peak memory of parsing a large submission as a whole (request.data) and incrementally in chunks.
+
+    python -m benchmarks.parse_memory [--rows 200000] [--chunk-size 5000]
+
+Only parsing is measured, each chunk is dropped right away just like it is once handed to ingestion.
+"""
+import argparse
+import gzip
+import time
+import tracemalloc
+
+from benchmarks import utils
+from benchmarks.wire_format import sample_results
+
+
+def measure(parse):
+    tracemalloc.start()
+    start = time.perf_counter()
+    rows = parse()
+    duration = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return rows, duration, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    args = parser.parse_args()
+
+    utils.setup()
+    import json
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+    from inspecting import parsers
+
+    body = gzip.compress(json.dumps(sample_results(args.rows)).encode())
+
+    def make_request():
+        request = APIRequestFactory().post(
+            '/', data=body, content_type='application/json', HTTP_CONTENT_ENCODING='gzip',
+        )
+        return Request(request, parsers=[parsers.JSONParser()])
+
+    def whole():
+        return len(make_request().data)
+
+    def chunked():
+        return sum(len(chunk) for chunk in parsers.iter_result_chunks(make_request(), args.chunk_size))
+
+    print(f"{args.rows} results, {len(body) / 1024 / 1024:.1f} MiB gzipped body")
+    print(f"{'parser':>8} {'seconds':>8} {'peak MiB':>9}")
+    for name, parse in (('whole', whole), ('chunked', chunked)):
+        rows, duration, peak = measure(parse)
+        assert rows == args.rows
+        print(f"{name:>8} {duration:>8.2f} {peak / 1024 / 1024:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
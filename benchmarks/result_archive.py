@@ -0,0 +1,103 @@
+"""
+Storage and read time of results before and after archiving them into chunks (see inspecting.archive).
+
+    python -m benchmarks.result_archive [--endpoints 5] [--agents 10] [--hours 24] [--interval 30]
+
+Results of every agent for every inspection are stored as rows, then all of them are archived. Sizes include indexes
+(dbstat on SQLite, pg_total_relation_size on PostgreSQL), the read is a whole series of an endpoint with archive.query.
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from benchmarks import utils
+
+
+def table_size(connection, table):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f"VACUUM FULL {table}")
+            cursor.execute("SELECT pg_total_relation_size(%s)", [table])
+            return cursor.fetchone()[0]
+        cursor.execute("VACUUM")
+        cursor.execute(
+            "SELECT SUM(pgsize) FROM dbstat WHERE name = %s OR name IN "
+            "(SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = %s)", [table, table],
+        )
+        return cursor.fetchone()[0] or 0
+
+
+def read_series(endpoint_id, after, before):
+    from inspecting import archive
+
+    start = time.perf_counter()
+    count = sum(1 for _ in archive.query(endpoint_id, after, before))
+    return count, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--endpoints', type=int, default=5)
+    parser.add_argument('--agents', type=int, default=10)
+    parser.add_argument('--hours', type=int, default=24)
+    parser.add_argument('--interval', type=int, default=30, help="seconds between inspections")
+    args = parser.parse_args()
+
+    utils.setup()
+    from inspecting import archive, models
+    from monitoring import models as monitoring_models
+
+    with utils.test_database(on_disk=True) as connection:
+        agents = monitoring_models.Agent.objects.bulk_create(
+            [monitoring_models.Agent(ip=f"10.0.{i // 256}.{i % 256}", name=f'agent-{i}', country='DEU')
+             for i in range(args.agents)]
+        )
+        endpoints = monitoring_models.Endpoint.objects.bulk_create(
+            [monitoring_models.Endpoint(name=f'benchmark-endpoint-{i}') for i in range(args.endpoints)]
+        )
+        start = datetime(2026, 1, 1)
+        end = start + timedelta(hours=args.hours)
+        per_endpoint = args.hours * 3600 // args.interval
+        inspections = models.Inspection.objects.bulk_create([
+            models.Inspection(endpoint=endpoint, timestamp=start + timedelta(seconds=i * args.interval))
+            for endpoint in endpoints for i in range(per_endpoint)
+        ])
+        results = []
+        for inspection in inspections:
+            for agent in agents:
+                succeed = random.random() < 0.98
+                results.append(models.HTTPInspectionResult(
+                    inspection=inspection, timestamp=inspection.timestamp, agent=agent,
+                    connection_status="SUCCEED" if succeed else "TIMED-OUT",
+                    status_code="200" if succeed else None,
+                    response_time=Decimal(random.randint(80, 400)) / 1000 if succeed else None,
+                    byte_received=random.choice([2048, 2048, 2051]) if succeed else None,
+                ))
+        # Agents submit their results a few seconds after the inspection, auto_now_add would overwrite it
+        models.HTTPInspectionResult._meta.get_field('submitted_at').auto_now_add = False
+        for result in results:
+            result.submitted_at = result.inspection.timestamp + timedelta(milliseconds=random.randint(500, 5000))
+        models.HTTPInspectionResult.objects.bulk_create(results)
+
+        table = models.HTTPInspectionResult._meta.db_table
+        rows_size = table_size(connection, table)
+        rows_read = read_series(endpoints[0].id, start, end)
+
+        with utils.measure() as archiving:
+            archived = archive.archive(end)
+        chunks_size = table_size(connection, models.HTTPInspectionResultChunk._meta.db_table)
+        remaining_size = table_size(connection, table)
+        chunks_read = read_series(endpoints[0].id, start, end)
+
+    print(f"{archived} results archived in {archiving['seconds']:.2f}s ({archiving['queries']} queries)")
+    print(f"{'':>8} {'bytes':>12} {'per result':>11} {'series read':>12}")
+    print(f"{'rows':>8} {rows_size:>12} {rows_size / archived:>11.1f} {rows_read[1] * 1000:>10.1f}ms")
+    print(f"{'chunks':>8} {chunks_size:>12} {chunks_size / archived:>11.1f} {chunks_read[1] * 1000:>10.1f}ms")
+    print(f"{rows_size / chunks_size:.1f}x smaller, {rows_read[0]} == {chunks_read[0]} results in a series, "
+          f"{remaining_size} bytes left in the results table")
+
+
+if __name__ == '__main__':
+    main()
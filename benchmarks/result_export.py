@@ -0,0 +1,96 @@
+"""
+Aggregates of results per country from the database against the same aggregates from exported files.
+
+    python -m benchmarks.result_export [--endpoints 20] [--agents 20] [--days 3] [--interval 60]
+
+Results are stored as rows, exported day by day as Parquet and Arrow IPC files, then aggregated per country over the
+whole range: with a grouped query on the database and with export.aggregate on memory-mapped files.
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from benchmarks import utils
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--endpoints', type=int, default=20)
+    parser.add_argument('--agents', type=int, default=20)
+    parser.add_argument('--days', type=int, default=3)
+    parser.add_argument('--interval', type=int, default=60, help="seconds between inspections")
+    args = parser.parse_args()
+
+    utils.setup()
+    from django.db.models import Avg, Count, Max, Min, Q
+    from inspecting import export, models
+    from monitoring import models as monitoring_models
+
+    directory = tempfile.mkdtemp()
+    with utils.test_database(on_disk=True):
+        countries = ['DEU', 'IRN', 'USA', 'FRA']
+        agents = monitoring_models.Agent.objects.bulk_create(
+            [monitoring_models.Agent(ip=f"10.0.{i // 256}.{i % 256}", name=f'agent-{i}', country=countries[i % 4])
+             for i in range(args.agents)]
+        )
+        endpoints = monitoring_models.Endpoint.objects.bulk_create(
+            [monitoring_models.Endpoint(name=f'benchmark-endpoint-{i}') for i in range(args.endpoints)]
+        )
+        start = datetime(2026, 1, 1)
+        end = start + timedelta(days=args.days)
+        inspections = models.Inspection.objects.bulk_create([
+            models.Inspection(endpoint=endpoint, timestamp=start + timedelta(seconds=i * args.interval))
+            for endpoint in endpoints for i in range(args.days * 86400 // args.interval)
+        ])
+        results = [
+            models.HTTPInspectionResult(
+                inspection=inspection, timestamp=inspection.timestamp, agent=agent, connection_status="SUCCEED",
+                status_code="200", response_time=Decimal(random.randint(80, 400)) / 1000, byte_received=2048,
+            ) if random.random() < 0.98 else
+            models.HTTPInspectionResult(
+                inspection=inspection, timestamp=inspection.timestamp, agent=agent, connection_status="TIMED-OUT",
+            )
+            for inspection in inspections for agent in agents
+        ]
+        models.HTTPInspectionResult.objects.bulk_create(results)
+        del results, inspections
+
+        with utils.measure() as database:
+            list(models.HTTPInspectionResult.objects.filter(
+                inspection__timestamp__gte=start, inspection__timestamp__lt=end,
+            ).values('agent__country').annotate(
+                count=Count('id'), succeed=Count('id', filter=Q(connection_status="SUCCEED")),
+                response_time_avg=Avg('response_time'), response_time_min=Min('response_time'),
+                response_time_max=Max('response_time'),
+            ).order_by())
+
+        timings = {}
+        for file_format in (export.PARQUET, export.ARROW):
+            started = time.perf_counter()
+            count = 0
+            for day in range(args.days):
+                count += export.export_day((start + timedelta(days=day)).date(), directory, file_format)
+            exported = time.perf_counter() - started
+            size = sum(
+                os.path.getsize(export.path(directory, (start + timedelta(days=day)).date(), file_format))
+                for day in range(args.days)
+            )
+            with utils.measure() as reading:
+                export.aggregate(start, end, by='country', directory=directory, file_format=file_format)
+            timings[file_format] = (exported, size, reading)
+    shutil.rmtree(directory)
+
+    print(f"{count} results, aggregated per country over {args.days} days")
+    print(f"{'database':>8}: {database['seconds'] * 1000:>8.1f}ms ({database['queries']} queries)")
+    for file_format, (exported, size, reading) in timings.items():
+        print(f"{file_format:>8}: {reading['seconds'] * 1000:>8.1f}ms ({reading['queries']} queries), "
+              f"{size / 1024 / 1024:.1f} MiB, exported in {exported:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
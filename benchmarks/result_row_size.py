@@ -0,0 +1,115 @@
+"""
+Bytes per stored HTTPInspectionResult row before and after compact column types (migrations 0006-0008).
+
+    python -m benchmarks.result_row_size [--rows 100000]
+
+Rows are inserted with the schema of migration 0005, measured, then migrated by 0006-0008 (which also checks the data
+migration) and measured again. Sizes are the average row size of the table itself and the total size of the table with
+its indexes per row: dbstat on SQLite, pg_column_size and pg_total_relation_size on PostgreSQL.
+"""
+import argparse
+import random
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from benchmarks import utils
+
+BEFORE = ('inspecting', '0005_latencysketch')
+AFTER = ('inspecting', '0008_compact_http_results')
+
+
+def migrate(connection, target):
+    from django.db.migrations.executor import MigrationExecutor
+
+    executor = MigrationExecutor(connection)
+    executor.migrate([target])
+    executor.loader.build_graph()
+    return executor.loader.project_state(target).apps
+
+
+def row_size(connection, table):
+    """
+    (average bytes of a row, bytes of the table and its indexes per row)
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT COUNT(*) FROM {table}")
+        count = cursor.fetchone()[0]
+        if connection.vendor == 'postgresql':
+            cursor.execute(f"VACUUM FULL {table}")
+            cursor.execute(f"SELECT AVG(pg_column_size(t.*)), pg_total_relation_size('{table}') FROM {table} t")
+            average, total = cursor.fetchone()
+            return float(average), total / count
+        cursor.execute("VACUUM")
+        cursor.execute(f"SELECT SUM(payload) FROM dbstat WHERE name = '{table}'")
+        payload = cursor.fetchone()[0]
+        cursor.execute(
+            "SELECT SUM(pgsize) FROM dbstat WHERE name = %s OR name IN "
+            "(SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = %s)", [table, table],
+        )
+        total = cursor.fetchone()[0]
+        return payload / count, total / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    args = parser.parse_args()
+
+    utils.setup()
+
+    with utils.test_database(on_disk=True) as connection:
+        apps = migrate(connection, BEFORE)
+        Agent = apps.get_model('monitoring', 'Agent')
+        Endpoint = apps.get_model('monitoring', 'Endpoint')
+        Inspection = apps.get_model('inspecting', 'Inspection')
+        Result = apps.get_model('inspecting', 'HTTPInspectionResult')
+        table = Result._meta.db_table
+
+        agents = Agent.objects.bulk_create(
+            [Agent(ip=f"10.0.{i // 256}.{i % 256}", name=f'agent-{i}', country='DEU') for i in range(50)]
+        )
+        endpoint = Endpoint.objects.create(name='benchmark-endpoint')
+        now = datetime.now()
+        inspections = Inspection.objects.bulk_create(
+            [Inspection(endpoint=endpoint, timestamp=now + timedelta(minutes=i))
+             for i in range(args.rows // len(agents) + 1)]
+        )
+        statuses = ["SUCCEED"] * 18 + ["CONN-FAILED", "TIMED-OUT"]
+        expected = {}
+        results = []
+        for i in range(args.rows):
+            inspection, agent = inspections[i // len(agents)], agents[i % len(agents)]
+            status = random.choice(statuses)
+            values = dict(
+                connection_status=status,
+                status_code=random.choice(["200", "200", "301", "404", "503"]) if status == "SUCCEED" else None,
+                response_time=Decimal(random.randint(1, 999999)) / 1000 if status == "SUCCEED" else None,
+                byte_received=random.randint(100, 100000) if status == "SUCCEED" else None,
+            )
+            result_id = uuid.uuid4()
+            expected[result_id] = (agent.ip, *values.values())
+            results.append(Result(id=result_id, inspection=inspection, agent=agent, agent_ip=agent.ip, **values))
+        Result.objects.bulk_create(results)
+        before = row_size(connection, table)
+
+        with utils.measure() as migration:
+            migrate(connection, AFTER)
+        after = row_size(connection, table)
+
+        from inspecting import models
+        stored = models.HTTPInspectionResult.objects.values_list(
+            'id', 'agent_id', 'connection_status', 'status_code', 'response_time', 'byte_received',
+        )
+        mismatches = sum(1 for result_id, *values in stored.iterator() if tuple(values) != expected[result_id])
+
+    print(f"{args.rows} results on {connection.vendor}, migration took {migration['seconds']:.2f}s")
+    print(f"{'':>8} {'row bytes':>10} {'with indexes':>13}")
+    print(f"{'before':>8} {before[0]:>10.1f} {before[1]:>13.1f}")
+    print(f"{'after':>8} {after[0]:>10.1f} {after[1]:>13.1f}")
+    print(f"{'saved':>8} {1 - after[0] / before[0]:>10.1%} {1 - after[1] / before[1]:>13.1%}")
+    print(f"{mismatches} rows changed by the data migration")
+
+
+if __name__ == '__main__':
+    main()
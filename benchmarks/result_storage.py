@@ -0,0 +1,66 @@
+"""
+Insert rate of HTTPInspectionResult storage backends (see inspecting.ingest).
+
+    python -m benchmarks.result_storage [--rows 100000] [--batch 5000]
+
+The copy backend only differs from bulk_create on PostgreSQL, on other databases it falls back to bulk_create.
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from benchmarks import utils
+
+
+def prepare(count):
+    from inspecting import ingest, models
+    from monitoring import models as monitoring_models
+
+    endpoint = monitoring_models.Endpoint.objects.create(name='benchmark-endpoint')
+    monitoring_models.MonitoringPolicy.objects.create(endpoint=endpoint, interval=1)
+    monitoring_models.Agent.objects.create(ip='127.0.0.1', name='benchmark-agent', country='DEU')
+    start = datetime.now()
+    models.Inspection.objects.bulk_create(
+        [models.Inspection(endpoint=endpoint, timestamp=start + timedelta(seconds=i)) for i in range(count)]
+    )
+    now = datetime.now()
+    return [
+        tuple(dict(
+            inspection_id=inspection_id, timestamp=timestamp, agent_id='127.0.0.1', connection_status="SUCCEED",
+            status_code="200", response_time="0.128", byte_received=2048, submitted_at=now,
+        )[column] for column in ingest.RESULT_COLUMNS)
+        for inspection_id, timestamp in models.Inspection.objects.values_list('id', 'timestamp')
+    ]
+
+
+def measure(rows, batch, backend):
+    from django.db import transaction
+    from inspecting import ingest, models
+
+    start = time.perf_counter()
+    for i in range(0, len(rows), batch):
+        with transaction.atomic():
+            ingest.STORAGE_BACKENDS[backend](rows[i:i + batch])
+    seconds = time.perf_counter() - start
+    models.HTTPInspectionResult.objects.all().delete()
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--batch', type=int, default=5000)
+    args = parser.parse_args()
+
+    utils.setup()
+    with utils.test_database() as connection:
+        rows = prepare(args.rows)
+        print(f"{args.rows} rows in batches of {args.batch} on {connection.vendor}")
+        print(f"{'backend':>12} {'seconds':>8} {'rows/sec':>10}")
+        for backend in ('bulk_create', 'copy'):
+            seconds = measure(rows, args.batch, backend)
+            print(f"{backend:>12} {seconds:>8.2f} {args.rows / seconds:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
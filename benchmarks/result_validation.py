@@ -0,0 +1,71 @@
+"""
+Time and query count of validating inspection-result payloads (the `?validate=1` path).
+
+    python -m benchmarks.result_validation [--sizes 100 1000 10000]
+
+inspecting.validation.validate_results is compared with a ModelSerializer(many=True), which is how payloads used to
+be validated (one inspection lookup per row).
+"""
+import argparse
+from datetime import datetime, timedelta
+
+from benchmarks import utils
+
+
+def prepare(count):
+    from inspecting import models
+    from monitoring import models as monitoring_models
+
+    endpoint = monitoring_models.Endpoint.objects.create(name='benchmark-endpoint')
+    monitoring_models.MonitoringPolicy.objects.create(endpoint=endpoint, interval=1)
+    start = datetime.now()
+    models.Inspection.objects.bulk_create(
+        [models.Inspection(endpoint=endpoint, timestamp=start + timedelta(seconds=i)) for i in range(count)]
+    )
+    return [
+        {
+            'inspection': str(inspection_id),
+            'connection_status': "SUCCEED",
+            'status_code': 200,
+            'response_time': 0.128,
+            'byte_received': 2048,
+        } for inspection_id in models.Inspection.objects.values_list('id', flat=True)
+    ]
+
+
+def serializer_validation(results):
+    from rest_framework import serializers
+    from inspecting import models
+
+    class CreateHTTPInspectionResultSerializer(serializers.ModelSerializer):
+        class Meta:
+            model = models.HTTPInspectionResult
+            fields = ['inspection', 'connection_status', 'status_code', 'response_time', 'byte_received']
+
+    CreateHTTPInspectionResultSerializer(data=results, many=True).is_valid(raise_exception=True)
+
+
+def bulk_validation(results):
+    from inspecting import validation
+
+    validation.validate_results(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000])
+    args = parser.parse_args()
+
+    utils.setup()
+    with utils.test_database():
+        results = prepare(max(args.sizes))
+        print(f"{'rows':>8} {'validator':>12} {'seconds':>8} {'queries':>8}")
+        for size in args.sizes:
+            for label, validate in (('serializer', serializer_validation), ('bulk', bulk_validation)):
+                with utils.measure() as result:
+                    validate(results[:size])
+                print(f"{size:>8} {label:>12} {result['seconds']:>8.3f} {result['queries']:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Response size and server CPU time per request of list views with sparse fieldsets and columnar responses (see
+monitoring.fieldsets), against lists serialized the way DRF does it (a serializer per model instance).
+
+    python -m benchmarks.sparse_fieldsets [--inspections 10000] [--endpoints 1000] [--repeat 5]
+
+The inspection window isn't aligned to a work plan bucket, so it's never served from the cache. CPU time is the
+median process time of --repeat requests made through the test client (in-process, including rendering), size is
+of the response body as it is and gzipped.
+"""
+import argparse
+import gzip
+import statistics
+import time
+from contextlib import ExitStack
+from datetime import datetime, timedelta
+from unittest import mock
+
+from benchmarks import utils
+
+
+def create_data(inspections, endpoints):
+    from inspecting import models
+    from monitoring import models as monitoring_models
+
+    group = monitoring_models.Group.objects.create(name='benchmark')
+    endpoint_objects = monitoring_models.Endpoint.objects.bulk_create(
+        [monitoring_models.Endpoint(name=f'benchmark-endpoint-{i}') for i in range(endpoints)]
+    )
+    monitoring_models.HTTPEndpointDetail.objects.bulk_create([
+        monitoring_models.HTTPEndpointDetail(endpoint=endpoint, hostname=f'host-{i}.example.com', port="443", path="/",
+                                             method_name="GET")
+        for i, endpoint in enumerate(endpoint_objects)
+    ])
+    monitoring_models.MonitoringPolicy.objects.bulk_create(
+        [monitoring_models.MonitoringPolicy(endpoint=endpoint) for endpoint in endpoint_objects]
+    )
+    # Ids of bulk created rows aren't set on every database
+    monitoring_models.MonitoringPolicy.groups.through.objects.bulk_create([
+        monitoring_models.MonitoringPolicy.groups.through(monitoringpolicy_id=policy_id, group_id=group.name)
+        for policy_id in monitoring_models.MonitoringPolicy.objects.values_list('id', flat=True)
+    ])
+    start = datetime(2026, 1, 1, 0, 0, 1)
+    models.Inspection.objects.bulk_create([
+        models.Inspection(endpoint=endpoint_objects[i % endpoints], timestamp=start + timedelta(milliseconds=i * 10))
+        for i in range(inspections)
+    ])
+    return dict(after=(start - timedelta(seconds=1)).isoformat(), before=(start + timedelta(hours=1)).isoformat())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--inspections', type=int, default=10000)
+    parser.add_argument('--endpoints', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    utils.setup()
+    from django.test import Client, override_settings
+    from rest_framework.mixins import ListModelMixin
+    from monitoring import fieldsets, views
+
+    with utils.test_database(), override_settings(DEBUG=False):
+        window = create_data(args.inspections, args.endpoints)
+        client = Client()
+        # Lists the way they were served before: a serializer per instance, groups of policies weren't prefetched
+        serializer_per_instance = mock.patch.object(fieldsets.SparseFieldsetMixin, 'list', ListModelMixin.list)
+        old_prefetches = mock.patch.object(views.EndpointListCreateView, 'field_prefetches', {
+            'http_details': ('http_details',), 'monitoring_policy': ('monitoring_policy',),
+        })
+        cases = [
+            ("inspections", "/api/v1/inspecting/inspections", [
+                ("objects, serializer", {}, [serializer_per_instance]),
+                ("objects", {}, None),
+                ("id,timestamp", dict(fields="id,timestamp"), None),
+                ("columns", dict(shape="columns"), None),
+                ("id,timestamp columns", dict(fields="id,timestamp", shape="columns"), None),
+            ], window),
+            ("endpoints", "/api/v1/monitoring/endpoints", [
+                ("objects, serializer", {}, [serializer_per_instance, old_prefetches]),
+                ("objects", {}, None),
+                ("columns", dict(shape="columns"), None),
+                ("id,name columns", dict(fields="id,name", shape="columns"), None),
+            ], {}),
+        ]
+        for title, url, variants, params in cases:
+            print(f"{title}: {url}")
+            print(f"{'':>22} {'bytes':>9} {'gzipped':>8} {'cpu ms':>7} {'queries':>8}")
+            for name, extra, patches in variants:
+                timings = []
+                for _ in range(args.repeat):
+                    with ExitStack() as stack, utils.measure() as result:
+                        for patch in patches or ():
+                            stack.enter_context(patch)
+                        start = time.process_time()
+                        response = client.get(url, data=dict(params, **extra))
+                        timings.append(time.process_time() - start)
+                    assert response.status_code == 200, response.content
+                content = response.content
+                print(f"{name:>22} {len(content):>9} {len(gzip.compress(content)):>8} "
+                      f"{statistics.median(timings) * 1000:>7.1f} {result['queries']:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""
+Time of a status board of every endpoint: from the latest results of every endpoint and agent (a grouped scan of the
+whole history, the lower bound of joining latest inspections with their results) against the table of current states
+(see inspecting.states), and the cost of keeping current states up to date during ingestion.
+
+    python -m benchmarks.status_board [--endpoints 50000] [--agents 3] [--history 5]
+
+Every endpoint has --history inspections measured by every agent, 2% of results are failures. Boards are fetched
+through the API (GET /api/v1/inspecting/endpoint-statuses), including rendering, the second time from the cache.
+"""
+import argparse
+import random
+from datetime import datetime, timedelta
+from unittest import mock
+
+from benchmarks import utils
+
+
+def create_history(endpoints, agents, history, start):
+    from django.db import transaction
+    from inspecting import models, states
+
+    for offset in range(0, len(endpoints), 1000):
+        inspections = models.Inspection.objects.bulk_create([
+            models.Inspection(endpoint=endpoint, timestamp=start + timedelta(minutes=i))
+            for endpoint in endpoints[offset:offset + 1000] for i in range(history)
+        ])
+        results = [
+            models.HTTPInspectionResult(
+                inspection=inspection, timestamp=inspection.timestamp, agent=agent,
+                connection_status="SUCCEED" if random.random() < 0.98 else "CONN-FAILED",
+                status_code=200, response_time=0.1, byte_received=2048,
+            )
+            for inspection in inspections for agent in agents
+        ]
+        with transaction.atomic():
+            models.HTTPInspectionResult.objects.bulk_create(results)
+            states.record(
+                (r.inspection.endpoint_id, r.agent.ip, r.inspection.timestamp, r.connection_status, r.status_code,
+                 r.response_time)
+                for r in results
+            )
+
+
+def board_from_results():
+    """
+    Last result of every endpoint and agent, then endpoints with an agent whose last result failed
+    """
+    from django.db.models import Max
+    from inspecting import models, states
+
+    latest = models.HTTPInspectionResult.objects.order_by().values('inspection__endpoint_id', 'agent_id').annotate(
+        last=Max('inspection__timestamp'),
+    )
+    last = {(row['inspection__endpoint_id'], row['agent_id']): row['last'] for row in latest}
+    rows = models.HTTPInspectionResult.objects.filter(inspection__timestamp__gte=min(last.values())).values_list(
+        'inspection__endpoint_id', 'agent_id', 'inspection__timestamp', 'connection_status', 'status_code',
+    )
+    down = set()
+    for endpoint_id, agent_id, timestamp, connection_status, status_code in rows.iterator():
+        if last[(endpoint_id, agent_id)] == timestamp and states.is_failure(connection_status, status_code):
+            down.add(endpoint_id)
+    return down
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--endpoints', type=int, default=50000)
+    parser.add_argument('--agents', type=int, default=3)
+    parser.add_argument('--history', type=int, default=5, help="inspections per endpoint")
+    args = parser.parse_args()
+
+    utils.setup()
+    from django.test import Client, override_settings
+    from inspecting import ingest, models, states
+    from monitoring import identity, models as monitoring_models
+
+    with utils.test_database(), override_settings(DEBUG=False):
+        agents = monitoring_models.Agent.objects.bulk_create(
+            [monitoring_models.Agent(ip=f"10.0.0.{i}", name=f'agent-{i}') for i in range(args.agents)]
+        )
+        endpoints = monitoring_models.Endpoint.objects.bulk_create(
+            [monitoring_models.Endpoint(name=f'benchmark-endpoint-{i}') for i in range(args.endpoints)]
+        )
+        start = datetime(2026, 1, 1)
+        create_history(endpoints, agents, args.history, start)
+        print(f"{args.endpoints} endpoints, {args.endpoints * args.history * args.agents} results")
+
+        client = Client()
+        cases = [
+            ("latest results", board_from_results),
+            ("board", lambda: client.get("/api/v1/inspecting/endpoint-statuses")),
+            ("board, cached", lambda: client.get("/api/v1/inspecting/endpoint-statuses")),
+            ("board, down only", lambda: client.get("/api/v1/inspecting/endpoint-statuses", data={'down': "true"})),
+        ]
+        print(f"{'':>16} {'seconds':>9} {'queries':>8}")
+        for name, run in cases:
+            with utils.measure() as result:
+                run()
+            print(f"{name:>16} {result['seconds']:>9.3f} {result['queries']:>8}")
+
+        # One more round of results, a submission per agent of a result of every endpoint
+        identity.known_agents({agent.ip for agent in agents})
+        rounds = []
+        for i in range(2):
+            inspections = models.Inspection.objects.bulk_create([
+                models.Inspection(endpoint=endpoint, timestamp=start + timedelta(minutes=args.history + i))
+                for endpoint in endpoints
+            ])
+            rounds.append([
+                (agent.ip, datetime.now(), [
+                    dict(inspection=str(inspection.id), connection_status="SUCCEED", status_code=200,
+                         response_time=0.1, byte_received=2048)
+                    for inspection in inspections
+                ])
+                for agent in agents
+            ])
+        print(f"{'ingestion':>16} {'seconds':>9} {'queries':>8}")
+        for name, submissions, patch in [
+            ("without states", rounds[0], mock.patch.object(states, 'record')),
+            ("with states", rounds[1], mock.MagicMock()),
+        ]:
+            with patch, utils.measure() as result:
+                ingest.store_submissions(submissions)
+            print(f"{name:>16} {result['seconds']:>9.3f} {result['queries']:>8}")
+
+
+if __name__ == '__main__':
+    main()
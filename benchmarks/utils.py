@@ -0,0 +1,63 @@
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+import django
+
+
+def setup():
+    # Benchmarks run against test databases, with the same settings as tests
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'payeshgar_server.settings.test')
+    django.setup()
+
+
+@contextmanager
+def test_database(on_disk=False):
+    """
+    Create a fresh test database (just like `manage.py test` does) and destroy it afterwards
+
+    SQLite test databases live in memory by default, which can't be shared between threads writing concurrently,
+    on_disk=True puts it in a temporary file instead.
+    """
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    if on_disk and connection.vendor == 'sqlite':
+        connection.settings_dict['TEST']['NAME'] = os.path.join(tempfile.mkdtemp(), 'benchmark.sqlite3')
+        connection.settings_dict['OPTIONS'].setdefault('timeout', 300)
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+@contextmanager
+def measure():
+    """
+    Measure wall time and number of queries of the enclosed block,
+    result is available in the yielded dict after the block is finished.
+    """
+    from django.db import connection
+
+    result = {'queries': 0}
+
+    def count_queries(execute, sql, params, many, context):
+        result['queries'] += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count_queries):
+        start = time.perf_counter()
+        yield result
+        result['seconds'] = time.perf_counter() - start
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, int(round(p / 100 * len(values))) - 1))
+    return values[index]
@@ -0,0 +1,83 @@
+"""
+Size and parse time of a submission in each wire format accepted by `inspection-results`.
+
+    python -m benchmarks.wire_format [--rows 10000] [--rounds 20]
+
+Formats which need an optional package (msgpack, zstandard) are skipped if it is not installed.
+"""
+import argparse
+import gzip
+import io
+import json
+import random
+import time
+import uuid
+
+from benchmarks import utils
+
+
+def sample_results(rows):
+    return [
+        {
+            'inspection': str(uuid.uuid4()),
+            'connection_status': random.choice(["SUCCEED", "SUCCEED", "SUCCEED", "TIMED-OUT"]),
+            'status_code': random.choice([200, 200, 301, 404, 500]),
+            'response_time': round(random.uniform(0.01, 2), 3),
+            'byte_received': random.randint(100, 100000),
+        } for _ in range(rows)
+    ]
+
+
+def encodings():
+    yield 'identity', '', lambda data: data
+    yield 'gzip', 'gzip', gzip.compress
+    try:
+        import zstandard
+    except ImportError:
+        return
+    yield 'zstd', 'zstd', zstandard.ZstdCompressor().compress
+
+
+def payloads(results):
+    from inspecting import parsers
+
+    yield 'json', parsers.JSONParser, json.dumps(results).encode()
+    columns = {name: [r[name] for r in results] for name in results[0]}
+    columns['connection_status'] = [parsers.CONNECTION_STATUS_CODES.index(s) for s in columns['connection_status']]
+    yield 'columnar', parsers.ColumnarJSONParser, json.dumps(columns).encode()
+    try:
+        import msgpack
+    except ImportError:
+        return
+    columns['inspection'] = [uuid.UUID(i).bytes for i in columns['inspection']]
+    yield 'msgpack', parsers.MsgPackParser, msgpack.packb(columns)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    utils.setup()
+    from rest_framework.test import APIRequestFactory
+
+    results = sample_results(args.rows)
+    print(f"{args.rows} results")
+    print(f"{'format':>9} {'encoding':>9} {'KiB':>8} {'parse ms':>9}")
+    for name, parser_class, body in payloads(results):
+        for encoding, header, compress in encodings():
+            data = compress(body)
+            request = APIRequestFactory().post('/', data=data, content_type=parser_class.media_type,
+                                               HTTP_CONTENT_ENCODING=header)
+            durations = []
+            for _ in range(args.rounds):
+                start = time.perf_counter()
+                parsed = parser_class().parse(io.BytesIO(data), parser_context={'request': request})
+                durations.append(time.perf_counter() - start)
+            assert len(parsed) == args.rows
+            print(f"{name:>9} {encoding:>9} {len(data) / 1024:>8.1f} {utils.percentile(durations, 50) * 1000:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
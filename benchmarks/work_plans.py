@@ -0,0 +1,69 @@
+"""
+Time and queries of many agents fetching the inspections of their groups for the current work plan bucket, rendered
+per request and served from the work plan cache.
+
+    python -m benchmarks.work_plans [--agents 5000] [--endpoints 200] [--groups 10]
+
+Each agent is in one of the groups, every endpoint is monitored by one group. The rendered case asks for the same
+bucket shifted by a second, which is not aligned so it's never served from the cache. Work plans are filled by
+generate_inspections before the cached round, like the periodic task does.
+"""
+import argparse
+from datetime import datetime, timedelta
+
+from benchmarks import utils
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--agents', type=int, default=5000)
+    parser.add_argument('--endpoints', type=int, default=200)
+    parser.add_argument('--groups', type=int, default=10)
+    args = parser.parse_args()
+
+    utils.setup()
+    from django.test import Client
+    from inspecting import tasks, workplans
+    from monitoring import models as monitoring_models
+
+    groups = [f'group-{i}' for i in range(args.groups)]
+    with utils.test_database():
+        group_objects = monitoring_models.Group.objects.bulk_create([monitoring_models.Group(name=g) for g in groups])
+        endpoints = monitoring_models.Endpoint.objects.bulk_create(
+            [monitoring_models.Endpoint(name=f'benchmark-endpoint-{i}') for i in range(args.endpoints)]
+        )
+        for i, endpoint in enumerate(endpoints):
+            policy = monitoring_models.MonitoringPolicy.objects.create(endpoint=endpoint)
+            policy.groups.add(group_objects[i % len(groups)])
+        agents = monitoring_models.Agent.objects.bulk_create(
+            [monitoring_models.Agent(ip=f'10.{i // 65536}.{i // 256 % 256}.{i % 256}', name=f'agent-{i}')
+             for i in range(args.agents)]
+        )
+        monitoring_models.Agent.groups.through.objects.bulk_create([
+            monitoring_models.Agent.groups.through(agent_id=agent.ip, group_id=groups[i % len(groups)])
+            for i, agent in enumerate(agents)
+        ])
+        with utils.measure() as result:
+            tasks.generate_inspections()
+        print(f"generate_inspections: {result['seconds']:.2f}s {result['queries']} queries")
+
+        # The next bucket, the current one is only planned from now on
+        bucket = workplans.bucket_of(datetime.now()) + workplans.WORK_PLAN_BUCKET
+        cases = [
+            ("rendered", bucket + timedelta(seconds=1)),
+            ("cached", bucket),
+        ]
+        client = Client()
+        print(f"{'':>10} {'seconds':>9} {'queries':>8} {'bytes':>11}")
+        for name, after in cases:
+            window = f"after={after.isoformat()}&before={(after + workplans.WORK_PLAN_BUCKET).isoformat()}"
+            with utils.measure() as result:
+                size = sum(
+                    len(client.get(f"/api/v1/inspecting/inspections?groups={groups[i % len(groups)]}&{window}").content)
+                    for i in range(args.agents)
+                )
+            print(f"{name:>10} {result['seconds']:>9.2f} {result['queries']:>8} {size:>11}")
+
+
+if __name__ == '__main__':
+    main()
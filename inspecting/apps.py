@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class SchedulerConfig(AppConfig):
     name = 'inspecting'
+
+    def ready(self):
+        from inspecting import checks, signals  # noqa
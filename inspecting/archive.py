@@ -0,0 +1,367 @@
+"""
+Archive of old results: results of inspections older than INSPECTION_RESULT_ARCHIVE_AFTER days are packed into one
+HTTPInspectionResultChunk per endpoint, agent and hour, and deleted from HTTPInspectionResult.
+
+Old results are read as series of an endpoint and agent rather than one by one, so a chunk is a tiny column store of a
+series, each column is encoded the way its values usually behave:
+    - inspection timestamps: delta-of-delta, inspections are planned at a fixed interval so it's mostly zeros
+    - submission delays (submitted_at - inspection timestamp): varints
+    - connection status and status code: run-length encoded, they rarely change
+    - response time (microseconds) and bytes received: varints of the difference from the previous value
+All numbers are zigzag encoded varints (small values in a byte or two, whatever their sign).
+
+Archived results lose their id and inspection id, an inspection is identified by its endpoint and timestamp anyway.
+query() and iter_rows() read results of a time range from both tiers, they are the only readers which see archived
+results: exports (see inspecting.export) read through iter_rows(), endpoint stats (see inspecting.stats) only count
+the results table so they reject ranges before horizon(). Health rollups and latency sketches are made when results
+are stored, archiving doesn't change them.
+"""
+import heapq
+from datetime import timedelta
+from itertools import groupby, islice
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from inspecting import locking, models
+
+Result = models.HTTPInspectionResult
+Chunk = models.HTTPInspectionResultChunk
+
+CHUNK_PERIOD = timedelta(hours=1)
+# Number of chunks written per statement
+ARCHIVE_BATCH_SIZE = 1000
+
+_VERSION = 1
+_MICROSECOND = timedelta(microseconds=1)
+# Fields of HTTPInspectionResult kept in chunks, with their database representation
+_RESULT_FIELDS = ('connection_status', 'status_code', 'response_time', 'byte_received')
+
+
+def bucket_start(timestamp):
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def _zigzag(value):
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def _unzigzag(value):
+    return value >> 1 if not value & 1 else -(value >> 1) - 1
+
+
+def _write(out, value):
+    value = _zigzag(value)
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read(data, position):
+    value = shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return _unzigzag(value), position
+        shift += 7
+
+
+def _read_all(data):
+    position, values = 0, []
+    while position < len(data):
+        value, position = _read(data, position)
+        values.append(value)
+    return values
+
+
+def _encode_delta_of_delta(values):
+    out, previous, previous_delta = bytearray(), 0, 0
+    for value in values:
+        delta = value - previous
+        _write(out, delta - previous_delta)
+        previous, previous_delta = value, delta
+    return out
+
+
+def _decode_delta_of_delta(data):
+    values, previous, delta = [], 0, 0
+    for delta_of_delta in _read_all(data):
+        delta += delta_of_delta
+        previous += delta
+        values.append(previous)
+    return values
+
+
+def _encode_plain(values):
+    out = bytearray()
+    for value in values:
+        _write(out, value)
+    return out
+
+
+def _encode_runs(values):
+    """
+    Pairs of (value, length of run), None is kept as -1
+    """
+    out = bytearray()
+    for value, run in groupby(values):
+        _write(out, -1 if value is None else value)
+        _write(out, sum(1 for _ in run))
+    return out
+
+
+def _decode_runs(data):
+    values = []
+    pairs = _read_all(data)
+    for value, length in zip(pairs[::2], pairs[1::2]):
+        values.extend([None if value == -1 else value] * length)
+    return values
+
+
+def _encode_deltas(values):
+    """
+    Differences from the previous non-null value, shifted by one so zero can be kept for None
+    """
+    out, previous = bytearray(), 0
+    for value in values:
+        if value is None:
+            _write(out, 0)
+            continue
+        delta = value - previous
+        _write(out, delta + 1 if delta >= 0 else delta)
+        previous = value
+    return out
+
+
+def _decode_deltas(data):
+    values, previous = [], 0
+    for delta in _read_all(data):
+        if delta == 0:
+            values.append(None)
+            continue
+        previous += delta - 1 if delta > 0 else delta
+        values.append(previous)
+    return values
+
+
+_COLUMNS = (
+    (_encode_delta_of_delta, _decode_delta_of_delta),  # inspection timestamp, microseconds since the bucket
+    (_encode_plain, _read_all),  # submission delay, microseconds
+    (_encode_runs, _decode_runs),  # connection status
+    (_encode_runs, _decode_runs),  # status code
+    (_encode_deltas, _decode_deltas),  # response time, microseconds
+    (_encode_deltas, _decode_deltas),  # bytes received
+)
+
+
+def encode(rows):
+    """
+    Encode rows of (timestamp, delay, connection_status, status_code, response_time, byte_received) integers,
+    sorted by timestamp
+    """
+    out = bytearray([_VERSION])
+    _write(out, len(rows))
+    for (encode_column, _), column in zip(_COLUMNS, zip(*rows) if rows else [()] * len(_COLUMNS)):
+        data = encode_column(column)
+        _write(out, len(data))
+        out += data
+    return bytes(out)
+
+
+def decode(data):
+    """
+    Rows encoded by encode
+    """
+    data = bytes(data)
+    if data[0] != _VERSION:
+        raise ValueError(f"Unknown chunk version {data[0]}")
+    count, position = _read(data, 1)
+    columns = []
+    for _, decode_column in _COLUMNS:
+        size, position = _read(data, position)
+        columns.append(decode_column(data[position:position + size]))
+        position += size
+    return list(zip(*columns)) if count else []
+
+
+def _pack(bucket, results):
+    """
+    Encode results of a bucket (see _unpack), returns the encoded chunk and the number of results in it
+    """
+    fields = [Result._meta.get_field(name) for name in _RESULT_FIELDS]
+    rows = {}
+    for timestamp, submitted_at, *values in results:
+        # The first stored result of an inspection is kept, just like in HTTPInspectionResult
+        rows.setdefault((timestamp - bucket) // _MICROSECOND, (
+            (submitted_at - timestamp) // _MICROSECOND,
+            *(field.get_prep_value(value) for field, value in zip(fields, values)),
+        ))
+    return encode(sorted((timestamp, *values) for timestamp, values in rows.items())), len(rows)
+
+
+def _unpack(chunk):
+    """
+    Decode a chunk into rows of (timestamp, submitted_at, connection_status, status_code, response_time,
+    byte_received) with values of HTTPInspectionResult fields
+    """
+    fields = [Result._meta.get_field(name) for name in _RESULT_FIELDS]
+    for timestamp, delay, *values in decode(chunk.data):
+        timestamp = chunk.bucket + timestamp * _MICROSECOND
+        yield (timestamp, timestamp + delay * _MICROSECOND,
+               *(field.from_db_value(value, None, None) if hasattr(field, 'from_db_value') else value
+                 for field, value in zip(fields, values)))
+
+
+def _archived_values(results):
+    return results.order_by('inspection__endpoint_id', 'agent_id', 'inspection__timestamp').values_list(
+        'id', 'inspection__endpoint_id', 'agent_id', 'inspection__timestamp', 'submitted_at', *_RESULT_FIELDS,
+    )
+
+
+def _archive_series(bucket, series):
+    """
+    Write chunks of a list of ((endpoint_id, agent_id), results), merged with already archived results of the bucket
+    """
+    stored = {
+        (chunk.endpoint_id, chunk.agent_id): chunk for chunk in locking.select_for_update(
+            Chunk.objects.filter(bucket=bucket), ('endpoint_id', 'agent_id'), [key for key, _ in series],
+        )
+    }
+    created, changed = [], []
+    for (endpoint_id, agent_id), results in series:
+        results = [result[3:] for result in results]
+        chunk = stored.get((endpoint_id, agent_id))
+        if chunk is None:
+            chunk = Chunk(endpoint_id=endpoint_id, agent_id=agent_id, bucket=bucket)
+            created.append(chunk)
+        else:
+            results = list(_unpack(chunk)) + results
+            changed.append(chunk)
+        chunk.data, chunk.count = _pack(bucket, results)
+    Chunk.objects.bulk_create(created)
+    Chunk.objects.bulk_update(changed, ['data', 'count'])
+
+
+def archive_bucket(bucket, batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Archive results of inspections of an hour (starting at bucket), returns number of archived results
+    """
+    results = Result.objects.filter(
+        inspection__timestamp__gte=bucket, inspection__timestamp__lt=bucket + CHUNK_PERIOD,
+    )
+    count = 0
+    with transaction.atomic():
+        rows = _archived_values(results).iterator()
+        series = ((key, list(series_rows)) for key, series_rows in groupby(rows, key=itemgetter(1, 2)))
+        while True:
+            batch = list(islice(series, batch_size))
+            if not batch:
+                return count
+            _archive_series(bucket, batch)
+            # Results are deleted by id, so results stored in the meantime are archived by the next run
+            ids = [result[0] for _, rows in batch for result in rows]
+            size = connection.ops.bulk_batch_size(['id'], ids) or len(ids)
+            for start in range(0, len(ids), size):
+                Result.objects.filter(id__in=ids[start:start + size]).delete()
+            count += len(ids)
+
+
+def archive(before):
+    """
+    Archive results of inspections before the hour of before, oldest hour first, returns number of archived results
+    """
+    before = bucket_start(before)
+    count = 0
+    while True:
+        oldest = models.Inspection.objects.filter(timestamp__lt=before, http_results__isnull=False).aggregate(
+            oldest=Min('timestamp'),
+        )['oldest']
+        if oldest is None:
+            return count
+        count += archive_bucket(bucket_start(oldest))
+
+
+def horizon(now=None):
+    """
+    Results of inspections before this hour (INSPECTION_RESULT_ARCHIVE_AFTER days ago) may be archived, None if
+    results aren't archived
+    """
+    if not settings.INSPECTION_RESULT_ARCHIVE_AFTER:
+        return None
+    now = now or timezone.now()
+    return bucket_start(now - timedelta(days=settings.INSPECTION_RESULT_ARCHIVE_AFTER))
+
+
+def archive_expired(now=None):
+    """
+    Archive results older than INSPECTION_RESULT_ARCHIVE_AFTER days, does nothing if it's 0
+    """
+    before = horizon(now)
+    if before is None:
+        return 0
+    return archive(before)
+
+
+def _archived_results(chunks, after, before):
+    for _, bucket_chunks in groupby(chunks.iterator(), key=lambda chunk: chunk.bucket):
+        rows = sorted(
+            ((row, chunk.endpoint_id, chunk.agent_id) for chunk in bucket_chunks for row in _unpack(chunk)
+             if after <= row[0] < before),
+            key=lambda item: (item[0][0], item[2]),
+        )
+        for (timestamp, submitted_at, *values), endpoint_id, agent_id in rows:
+            yield Result(
+                id=None,
+                inspection=models.Inspection(id=None, endpoint_id=endpoint_id, timestamp=timestamp),
+                timestamp=timestamp,
+                agent_id=agent_id,
+                submitted_at=submitted_at,
+                **dict(zip(_RESULT_FIELDS, values)),
+            )
+
+
+def query(endpoint_id, after, before, agents=()):
+    """
+    Results of inspections of an endpoint in [after, before), optionally measured by some agents, whether they are
+    archived or not. Results are ordered by inspection timestamp and agent, archived ones are unsaved
+    HTTPInspectionResult instances (without id) of unsaved inspections.
+    """
+    live = Result.objects.filter(
+        inspection__endpoint_id=endpoint_id, inspection__timestamp__gte=after, inspection__timestamp__lt=before,
+    ).select_related('inspection').order_by('inspection__timestamp', 'agent_id')
+    chunks = Chunk.objects.filter(
+        endpoint_id=endpoint_id, bucket__gte=bucket_start(after), bucket__lt=before,
+    ).order_by('bucket')
+    if agents:
+        live = live.filter(agent_id__in=agents)
+        chunks = chunks.filter(agent_id__in=agents)
+    return heapq.merge(
+        _archived_results(chunks, after, before), live.iterator(),
+        key=lambda result: (result.inspection.timestamp, result.agent_id),
+    )
+
+
+ROW_FIELDS = ('endpoint_id', 'agent_id', 'timestamp', 'submitted_at') + _RESULT_FIELDS
+
+
+def iter_rows(after, before):
+    """
+    Results of all inspections in [after, before) as tuples of ROW_FIELDS, whether they are archived or not,
+    in no particular order. Cheaper than query() for bulk reads, no model instance is built.
+    """
+    yield from Result.objects.filter(
+        inspection__timestamp__gte=after, inspection__timestamp__lt=before,
+    ).order_by().values_list(
+        'inspection__endpoint_id', 'agent_id', 'inspection__timestamp', 'submitted_at', *_RESULT_FIELDS,
+    ).iterator()
+    chunks = Chunk.objects.filter(bucket__gte=bucket_start(after), bucket__lt=before).order_by()
+    for chunk in chunks.iterator():
+        for row in _unpack(chunk):
+            if after <= row[0] < before:
+                yield (chunk.endpoint_id, chunk.agent_id, *row)
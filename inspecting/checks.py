@@ -0,0 +1,19 @@
+from importlib.util import find_spec
+
+from django.conf import settings
+from django.core.checks import Error, register
+
+
+@register()
+def check_export_dependencies(app_configs, **kwargs):
+    """
+    Results are exported (see inspecting.export) by a periodic task once INSPECTION_RESULT_EXPORT_DIR is set, pyarrow
+    is an optional dependency so it's reported at startup rather than by every run of the task.
+    """
+    if not settings.INSPECTION_RESULT_EXPORT_DIR or find_spec('pyarrow') is not None:
+        return []
+    return [Error(
+        "INSPECTION_RESULT_EXPORT_DIR is set but pyarrow is not installed",
+        hint="Install pyarrow (see requirements.txt) or unset PAYESHGAR_INSPECTION_RESULT_EXPORT_DIR",
+        id='inspecting.E001',
+    )]
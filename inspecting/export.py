@@ -0,0 +1,307 @@
+"""
+Export of results to columnar files for analytics, so reports over months of results don't touch the database.
+
+Results of every closed day (inspections of the day, see EXPORT_DELAY) are exported to one file per day in
+INSPECTION_RESULT_EXPORT_DIR, as <dir>/date=<YYYY-MM-DD>/results.<format> (hive partitioning, readable by most
+analytics tools too). Results which arrive later are caught up: a day exported less than LATE_RESULTS_PERIOD ago is
+exported again once the database has more results of it than its file, later than that only re-exporting the day
+(export_results --after/--before) adds them. The format is INSPECTION_RESULT_EXPORT_FORMAT:
+    - "parquet": compressed, smallest files
+    - "arrow": uncompressed Arrow IPC files, bigger but memory-mapped with zero copies
+Results are exported from both stored and archived results, see inspecting.archive
+
+aggregate() answers aggregate queries per endpoint, agent or country from exported files only: files of the range
+are memory-mapped and aggregated with vectorized Arrow compute functions.
+
+pyarrow is an optional dependency, only needed to export or read exported results.
+"""
+import os
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Count, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from inspecting import archive, models, sketches
+from monitoring import models as monitoring_models
+
+PARQUET = "parquet"
+ARROW = "arrow"
+EXTENSIONS = {PARQUET: "parquet", ARROW: "arrow"}
+
+# A day is exported once it's over since this long, so late results are exported too
+EXPORT_DELAY = timedelta(hours=1)
+# Exported days are checked for results which arrived after their export this long after they are closed
+LATE_RESULTS_PERIOD = timedelta(days=7)
+# Number of results per record batch
+EXPORT_BATCH_SIZE = 100000
+
+# Breakdowns of aggregates -> column of exported results
+BREAKDOWN_COLUMNS = {
+    None: None,
+    'endpoint': 'endpoint_id',
+    'agent': 'agent_ip',
+    'country': 'country',
+}
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.compute
+    except ImportError:
+        raise ImproperlyConfigured("pyarrow is required to export results")
+    return pyarrow
+
+
+# Repeated strings are dictionary encoded
+DICTIONARY_COLUMNS = ('endpoint_id', 'agent_ip', 'country', 'connection_status')
+
+
+def schema():
+    pa = _pyarrow()
+    dictionary = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ('endpoint_id', dictionary),
+        ('agent_ip', dictionary),
+        ('country', dictionary),
+        ('timestamp', pa.timestamp('us')),
+        ('submitted_at', pa.timestamp('us')),
+        ('connection_status', dictionary),
+        ('status_code', pa.uint16()),
+        ('response_time_us', pa.int64()),
+        ('byte_received', pa.int64()),
+    ])
+
+
+def path(directory, day, file_format):
+    return os.path.join(directory, f"date={day.isoformat()}", f"results.{EXTENSIONS[file_format]}")
+
+
+def exported_days(directory, file_format):
+    """
+    Sorted list of days already exported in directory
+    """
+    if not os.path.isdir(directory):
+        return []
+    days = [
+        datetime.strptime(name, "date=%Y-%m-%d").date() for name in os.listdir(directory) if name.startswith("date=")
+    ]
+    return sorted(day for day in days if os.path.exists(path(directory, day, file_format)))
+
+
+class _Dictionary:
+    """
+    Dictionary of a column shared by all batches of a file, it only grows so batches can be written as deltas
+    """
+
+    def __init__(self):
+        self.indices = {}
+        self.values = []
+
+    def index(self, value):
+        if value is None:
+            return None
+        index = self.indices.get(value)
+        if index is None:
+            index = self.indices[value] = len(self.values)
+            self.values.append(value)
+        return index
+
+    def array(self, pa, indices):
+        return pa.DictionaryArray.from_arrays(pa.array(indices, pa.int32()), pa.array(self.values, pa.string()))
+
+
+def _batches(rows, batch_size):
+    pa = _pyarrow()
+    result_schema = schema()
+    countries = dict(monitoring_models.Agent.objects.values_list('ip', 'country'))
+    response_time = models.HTTPInspectionResult._meta.get_field('response_time')
+    dictionaries = [_Dictionary() if field.name in DICTIONARY_COLUMNS else None for field in result_schema]
+
+    def batch(columns):
+        return pa.record_batch([
+            pa.array(column, field.type) if dictionary is None else dictionary.array(pa, column)
+            for field, dictionary, column in zip(result_schema, dictionaries, columns)
+        ], schema=result_schema)
+
+    columns = [[] for _ in result_schema]
+    for endpoint_id, agent_id, timestamp, submitted_at, connection_status, status_code, response, size in rows:
+        for column, dictionary, value in zip(columns, dictionaries, (
+            str(endpoint_id), agent_id, countries.get(agent_id), timestamp, submitted_at, connection_status,
+            None if status_code is None else int(status_code), response_time.get_prep_value(response), size,
+        )):
+            column.append(value if dictionary is None else dictionary.index(value))
+        if len(columns[0]) >= batch_size:
+            yield batch(columns)
+            columns = [[] for _ in columns]
+    if columns[0]:
+        yield batch(columns)
+
+
+def _writer(pa, destination, file_format):
+    if file_format == PARQUET:
+        import pyarrow.parquet
+        return pyarrow.parquet.ParquetWriter(destination, schema(), compression='zstd')
+    return pa.ipc.new_file(destination, schema(), options=pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True))
+
+
+def export_day(day, directory=None, file_format=None, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Export results of inspections of a day (replacing an existing export), returns number of exported results
+    """
+    pa = _pyarrow()
+    directory = directory or settings.INSPECTION_RESULT_EXPORT_DIR
+    file_format = file_format or settings.INSPECTION_RESULT_EXPORT_FORMAT
+    if file_format not in EXTENSIONS:
+        raise ImproperlyConfigured(f'Unknown export format "{file_format}", use "parquet" or "arrow"')
+    destination = path(directory, day, file_format)
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+
+    after = datetime.combine(day, time())
+    count = 0
+    # Written to a temporary file first, so readers never see a partial export
+    with _writer(pa, destination + ".tmp", file_format) as writer:
+        for batch in _batches(archive.iter_rows(after, after + timedelta(days=1)), batch_size):
+            writer.write_batch(batch)
+            count += batch.num_rows
+    os.replace(destination + ".tmp", destination)
+    return count
+
+
+def _first_day():
+    oldest = [
+        models.Inspection.objects.filter(http_results__isnull=False).aggregate(oldest=Min('timestamp'))['oldest'],
+        models.HTTPInspectionResultChunk.objects.aggregate(oldest=Min('bucket'))['oldest'],
+    ]
+    oldest = [timestamp for timestamp in oldest if timestamp is not None]
+    return min(oldest).date() if oldest else None
+
+
+def exported_count(directory, day, file_format):
+    """
+    Number of results in the exported file of a day, read from its metadata
+    """
+    pa = _pyarrow()
+    file_path = path(directory, day, file_format)
+    if file_format == ARROW:
+        reader = pa.ipc.open_file(pa.memory_map(file_path))
+        return sum(reader.get_batch(index).num_rows for index in range(reader.num_record_batches))
+    import pyarrow.parquet
+    return pyarrow.parquet.ParquetFile(file_path).metadata.num_rows
+
+
+def _stored_counts(first_day, last_day):
+    """
+    Number of stored and archived results of inspections of each day in [first_day, last_day], as a dict
+    """
+    after = datetime.combine(first_day, time())
+    before = datetime.combine(last_day, time()) + timedelta(days=1)
+    counts = {}
+    for queryset, field, count in (
+        (models.HTTPInspectionResult.objects.filter(timestamp__gte=after, timestamp__lt=before), 'timestamp',
+         Count('id')),
+        (models.HTTPInspectionResultChunk.objects.filter(bucket__gte=after, bucket__lt=before), 'bucket',
+         Sum('count')),
+    ):
+        for day, day_count in queryset.order_by().annotate(day=TruncDate(field)).values_list('day').annotate(count):
+            counts[day] = counts.get(day, 0) + day_count
+    return counts
+
+
+def late_days(directory, file_format, exported, last_closed):
+    """
+    Days of exported which closed less than LATE_RESULTS_PERIOD ago and have more results than their exported files
+    """
+    recent = [day for day in exported if day > last_closed - LATE_RESULTS_PERIOD]
+    if not recent:
+        return []
+    counts = _stored_counts(recent[0], recent[-1])
+    return [day for day in recent if counts.get(day, 0) > exported_count(directory, day, file_format)]
+
+
+def export_closed(now=None):
+    """
+    Export closed days which are not exported yet, continuing from the last exported one, and export again recent
+    days which got late results (see late_days). Does nothing if INSPECTION_RESULT_EXPORT_DIR is not set.
+    Returns a dict of day -> number of exported results
+    """
+    directory = settings.INSPECTION_RESULT_EXPORT_DIR
+    if not directory:
+        return {}
+    now = now or timezone.now()
+    last_closed = (now - EXPORT_DELAY).date() - timedelta(days=1)
+    exported = exported_days(directory, settings.INSPECTION_RESULT_EXPORT_FORMAT)
+    report = {
+        day: export_day(day)
+        for day in late_days(directory, settings.INSPECTION_RESULT_EXPORT_FORMAT, exported, last_closed)
+    }
+    day = exported[-1] + timedelta(days=1) if exported else _first_day()
+    while day is not None and day <= last_closed:
+        report[day] = export_day(day)
+        day += timedelta(days=1)
+    return report
+
+
+def _read(pa, file_path, columns):
+    if file_path.endswith(EXTENSIONS[ARROW]):
+        return pa.ipc.open_file(pa.memory_map(file_path)).read_all().select(columns)
+    import pyarrow.parquet
+    return pyarrow.parquet.read_table(file_path, columns=columns, memory_map=True)
+
+
+def aggregate(after, before, by=None, directory=None, file_format=None, quantiles=sketches.QUANTILES):
+    """
+    Aggregate exported results of inspections in [after, before), all together or per endpoint, agent or country (by).
+    Returns a dict of key (None if by is None) -> dict of count, succeed, timed_out, success_rate and
+    response_time avg, min, max and quantiles (in seconds)
+    """
+    pa = _pyarrow()
+    pc = pa.compute
+    directory = directory or settings.INSPECTION_RESULT_EXPORT_DIR
+    file_format = file_format or settings.INSPECTION_RESULT_EXPORT_FORMAT
+    key = BREAKDOWN_COLUMNS[by]
+    columns = ['timestamp', 'connection_status', 'response_time_us'] + ([key] if key else [])
+
+    days = [day for day in exported_days(directory, file_format) if after.date() <= day <= before.date()]
+    if not days:
+        return {}
+    table = pa.concat_tables([_read(pa, path(directory, day, file_format), columns) for day in days])
+    table = table.filter(pc.and_(
+        pc.greater_equal(table['timestamp'], pa.scalar(after, pa.timestamp('us'))),
+        pc.less(table['timestamp'], pa.scalar(before, pa.timestamp('us'))),
+    ))
+    if key is None:
+        key = 'all'
+        table = table.append_column(key, pa.repeat(pa.scalar(None, pa.null()), table.num_rows))
+    table = table.append_column('succeed', pc.equal(table['connection_status'], "SUCCEED"))
+    table = table.append_column('timed_out', pc.equal(table['connection_status'], "TIMED-OUT"))
+    grouped = table.group_by(key).aggregate([
+        ('connection_status', 'count'),
+        ('succeed', 'sum'),
+        ('timed_out', 'sum'),
+        ('response_time_us', 'mean'),
+        ('response_time_us', 'min'),
+        ('response_time_us', 'max'),
+        ('response_time_us', 'tdigest', pc.TDigestOptions(q=list(quantiles))),
+    ])
+
+    def seconds(value):
+        return None if value is None else value / 1000000
+
+    report = {}
+    for row in grouped.to_pylist():
+        count = row['connection_status_count']
+        report[row[key]] = dict(
+            count=count,
+            succeed=row['succeed_sum'],
+            timed_out=row['timed_out_sum'],
+            success_rate=row['succeed_sum'] / count if count else None,
+            response_time_avg=seconds(row['response_time_us_mean']),
+            response_time_min=seconds(row['response_time_us_min']),
+            response_time_max=seconds(row['response_time_us_max']),
+            response_time_quantiles=[seconds(value) for value in row['response_time_us_tdigest'] or []],
+        )
+    return report
@@ -0,0 +1,88 @@
+"""
+Compact model fields of HTTPInspectionResult: values are stored as small integers, but in Python (and so in the API)
+they look just like the string and decimal fields they replaced.
+"""
+from decimal import Decimal
+
+from django.db import models
+
+
+class ConnectionStatusField(models.Field):
+    """
+    A choice among string choices, stored as the index of the choice in a smallint column.
+    The order of choices must not change once rows are stored.
+    """
+
+    def get_internal_type(self):
+        return 'PositiveSmallIntegerField'
+
+    @property
+    def codes(self):
+        return [value for value, _ in self.choices]
+
+    def from_db_value(self, value, expression, connection):
+        return None if value is None else self.codes[value]
+
+    def to_python(self, value):
+        if isinstance(value, int):
+            return self.codes[value]
+        return value
+
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        if value is None or isinstance(value, int):
+            return value
+        return self.codes.index(value)
+
+
+class StatusCodeField(models.Field):
+    """
+    HTTP status code stored in a smallint column, it's a string in Python
+    """
+
+    def get_internal_type(self):
+        return 'PositiveSmallIntegerField'
+
+    def from_db_value(self, value, expression, connection):
+        return None if value is None else str(value)
+
+    def to_python(self, value):
+        return None if value is None else str(value)
+
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        return None if value is None else int(value)
+
+
+class ResponseTimeField(models.Field):
+    """
+    Duration in seconds stored as integer microseconds, it's a Decimal of seconds with decimal_places digits in Python
+    """
+    MICROSECONDS = Decimal(1000000)
+
+    def __init__(self, *args, decimal_places=3, **kwargs):
+        self.decimal_places = decimal_places
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.decimal_places != 3:
+            kwargs['decimal_places'] = self.decimal_places
+        return name, path, args, kwargs
+
+    def get_internal_type(self):
+        return 'IntegerField'
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        return (Decimal(value) / self.MICROSECONDS).quantize(Decimal(1).scaleb(-self.decimal_places))
+
+    def to_python(self, value):
+        return None if value is None else Decimal(str(value))
+
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        if value is None:
+            return None
+        return int((Decimal(str(value)) * self.MICROSECONDS).to_integral_value())
@@ -0,0 +1,332 @@
+"""
+Ingestion of inspection results submitted by agents.
+
+store_submissions() stores results of any number of submissions with a single insert.
+
+ResultBatcher coalesces submissions which are processed concurrently in the same process (e.g. a Celery worker with a
+thread or gevent pool) into one batch, the batch is stored once it has INSPECTION_RESULT_BATCH_MAX_ROWS results or is
+INSPECTION_RESULT_BATCH_MAX_AGE seconds old. Every submitter waits until its batch is committed, and gets the error if
+storing failed, so a submission is never acknowledged (Celery ack or HTTP response) before its results are stored.
+A worker whose pool runs one task at a time per process (prefork, solo) has nothing to coalesce, it stores every
+submission right away instead of waiting (see configure_worker), so workers of the new_result queue should use the
+threads pool (the default when batching is enabled).
+
+Rows are written by one of the storage backends, selected by INSPECTION_RESULT_STORAGE_BACKEND setting:
+    - "bulk_create": a multi-row INSERT through the ORM
+    - "copy": COPY FROM STDIN on PostgreSQL, rows are streamed as CSV without building model instances,
+      falls back to bulk_create on other databases.
+Both of them skip rows which conflict with already stored ones, and return the rows they inserted.
+
+Health rollups of endpoints (see inspecting.rollups), latency sketches (see inspecting.sketches) and current states
+of endpoints (see inspecting.states) are updated with inserted results in the same transaction.
+"""
+import csv
+import io
+import logging
+import threading
+import uuid
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from inspecting import models, rollups, schedule, sketches, states
+from inspecting.validation import clean_result
+from monitoring import activity, identity
+
+logger = logging.getLogger(__name__)
+
+
+# Columns of HTTPInspectionResult rows passed to storage backends, id is generated by the backend
+RESULT_COLUMNS = (
+    'inspection_id',
+    'timestamp',
+    'agent_id',
+    'connection_status',
+    'status_code',
+    'response_time',
+    'byte_received',
+    'submitted_at',
+)
+
+
+def bulk_create_backend(rows):
+    results = [models.HTTPInspectionResult(**dict(zip(RESULT_COLUMNS, row))) for row in rows]
+    models.HTTPInspectionResult.objects.bulk_create(results, ignore_conflicts=True)
+    # ids are generated here, so rows which were skipped are the ones whose id isn't stored
+    return set(models.HTTPInspectionResult.objects.filter(
+        id__in=[result.id for result in results],
+    ).values_list('inspection_id', 'agent_id'))
+
+
+class CopyStream:
+    """
+    File-like object which encodes rows as CSV lazily, to be read by cursor.copy_expert
+    None values are written as empty unquoted fields which COPY reads as NULL.
+    """
+
+    def __init__(self, rows):
+        self._rows = iter(rows)
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer, lineterminator='\n')
+
+    def read(self, size=-1):
+        while size < 0 or self._buffer.tell() < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            self._writer.writerow(row)
+        data = self._buffer.getvalue()
+        if 0 <= size < len(data):
+            data, rest = data[:size], data[size:]
+        else:
+            rest = ''
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        self._buffer.write(rest)
+        return data
+
+
+def copy_backend(rows):
+    if connection.vendor != 'postgresql':
+        return bulk_create_backend(rows)
+    opts = models.HTTPInspectionResult._meta
+    fields = [opts.pk] + [opts.get_field(column) for column in RESULT_COLUMNS]
+    prepared_rows = (
+        [uuid.uuid4()] + [field.get_db_prep_save(value, connection) for field, value in zip(fields[1:], row)]
+        for row in rows
+    )
+    table = connection.ops.quote_name(opts.db_table)
+    staging_table = connection.ops.quote_name(f"{opts.db_table}_staging")
+    columns = ", ".join(connection.ops.quote_name(field.column) for field in fields)
+    # COPY can't skip conflicting rows, so rows are copied into a staging table first
+    with connection.cursor() as cursor:
+        cursor.execute(f"CREATE TEMPORARY TABLE {staging_table} (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP")
+        cursor.copy_expert(f"COPY {staging_table} ({columns}) FROM STDIN WITH (FORMAT csv)", CopyStream(prepared_rows))
+        cursor.execute(
+            f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {staging_table} ON CONFLICT DO NOTHING "
+            f"RETURNING inspection_id, agent_id"
+        )
+        inserted = set(cursor.fetchall())
+        cursor.execute(f"DROP TABLE {staging_table}")
+    return inserted
+
+
+STORAGE_BACKENDS = {
+    "bulk_create": bulk_create_backend,
+    "copy": copy_backend,
+}
+
+
+def insert_results(rows):
+    """
+    Insert HTTPInspectionResult rows (tuples of RESULT_COLUMNS) with the configured storage backend, rows which
+    conflict with stored ones are skipped, returns the set of (inspection_id, agent_id) of inserted rows
+    """
+    return STORAGE_BACKENDS[settings.INSPECTION_RESULT_STORAGE_BACKEND](rows)
+
+
+def store_submissions(submissions):
+    """
+    Store results of a list of (agent_ip, submission_time, results) submissions and record activity of agents
+    (see monitoring.activity).
+
+    Every result is handled on its own: invalid results and results of unknown inspections or unknown agents are
+    rejected, results which are already stored (same inspection and agent) are skipped as duplicates, so retrying a
+    submission is harmless.
+    Returns a dict of accepted, duplicate and rejected counts for each submission.
+    """
+    counts = [dict(accepted=0, duplicate=0, rejected=0) for _ in submissions]
+    agent_ips = {agent_ip for agent_ip, _, _ in submissions}
+    known_agents = identity.known_agents(agent_ips)
+    for agent_ip in agent_ips - known_agents:
+        logger.warning("Rejecting results submitted by unknown agent %s", agent_ip)
+
+    last_activity = {}
+    entries = []
+    for index, (agent_ip, submission_time, results) in enumerate(submissions):
+        if agent_ip not in known_agents:
+            counts[index]['rejected'] += len(results)
+            continue
+        last_activity[agent_ip] = max(submission_time, last_activity.get(agent_ip, submission_time))
+        for result in results:
+            cleaned, errors = clean_result(result)
+            if errors:
+                counts[index]['rejected'] += 1
+                continue
+            entries.append((index, agent_ip, submission_time, result, cleaned))
+
+    if schedule.is_virtual():
+        schedule.materialize_inspections([result for _, _, _, result, _ in entries])
+
+    # Stored results are looked up before the transaction to skip most duplicates cheaply, results stored concurrently
+    # since then are skipped by the insert, so only rows which were actually inserted are counted and aggregated
+    inspection_ids = {cleaned['inspection'] for _, _, _, _, cleaned in entries}
+    known_inspections = {
+        inspection_id: (endpoint_id, timestamp) for inspection_id, endpoint_id, timestamp in
+        models.Inspection.objects.filter(id__in=inspection_ids).values_list('id', 'endpoint_id', 'timestamp')
+    }
+    stored = set(
+        models.HTTPInspectionResult.objects.filter(
+            inspection_id__in=known_inspections, agent_id__in=known_agents,
+        ).values_list('inspection_id', 'agent_id')
+    )
+
+    rows = []
+    candidates = []
+    for index, agent_ip, submission_time, _, cleaned in entries:
+        if cleaned['inspection'] not in known_inspections:
+            counts[index]['rejected'] += 1
+            continue
+        if (cleaned['inspection'], agent_ip) in stored:
+            counts[index]['duplicate'] += 1
+            continue
+        stored.add((cleaned['inspection'], agent_ip))
+        endpoint_id, timestamp = known_inspections[cleaned['inspection']]
+        rows.append((
+            cleaned['inspection'],
+            timestamp,
+            agent_ip,
+            cleaned['connection_status'],
+            cleaned['status_code'],
+            cleaned['response_time'],
+            cleaned['byte_received'],
+            submission_time,
+        ))
+        candidates.append((index, endpoint_id, agent_ip, timestamp, cleaned))
+
+    with transaction.atomic():
+        inserted = insert_results(rows)
+        accepted = []
+        for index, endpoint_id, agent_ip, timestamp, cleaned in candidates:
+            if (cleaned['inspection'], agent_ip) in inserted:
+                counts[index]['accepted'] += 1
+                accepted.append((endpoint_id, agent_ip, timestamp, cleaned))
+            else:
+                counts[index]['duplicate'] += 1
+        rollups.record([
+            (endpoint_id, timestamp, cleaned['connection_status'], cleaned['status_code'], cleaned['response_time'],
+             cleaned['byte_received'])
+            for endpoint_id, _, timestamp, cleaned in accepted
+        ])
+        sketches.record([
+            (endpoint_id, agent_ip, timestamp, cleaned['response_time'])
+            for endpoint_id, agent_ip, timestamp, cleaned in accepted
+        ])
+        states.record([
+            (endpoint_id, agent_ip, timestamp, cleaned['connection_status'], cleaned['status_code'],
+             cleaned['response_time'])
+            for endpoint_id, agent_ip, timestamp, cleaned in accepted
+        ])
+        # TODO Do we need to send notification?
+    activity.record_many(last_activity)
+    return counts
+
+
+class _Batch:
+    def __init__(self):
+        self.submissions = []
+        self.rows = 0
+        self.stored = threading.Event()
+        self.error = None
+        self.counts = None
+
+
+class ResultBatcher:
+    """
+    Group commit of submissions, see module docstring.
+
+    The first submitter of a batch waits up to max_age seconds for others to join, then stores the batch,
+    a submitter which makes the batch reach max_rows stores it right away.
+    """
+
+    def __init__(self, store=store_submissions, max_rows=5000, max_age=0.5):
+        self.store = store
+        self.max_rows = max_rows
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._batch = None
+
+    def _detach(self, batch):
+        """
+        Make sure no one else joins the batch, returns False if someone else has already detached it.
+        """
+        with self._lock:
+            if self._batch is not batch:
+                return False
+            self._batch = None
+            return True
+
+    def _store(self, batch):
+        try:
+            batch.counts = self.store(batch.submissions)
+        except Exception as exp:
+            batch.error = exp
+        finally:
+            batch.stored.set()
+
+    def submit(self, agent_ip, submission_time, results):
+        with self._lock:
+            batch = self._batch
+            is_first = batch is None
+            if is_first:
+                batch = self._batch = _Batch()
+            index = len(batch.submissions)
+            batch.submissions.append((agent_ip, submission_time, results))
+            batch.rows += len(results)
+            is_full = batch.rows >= self.max_rows
+            if is_full:
+                self._batch = None
+
+        if is_full:
+            self._store(batch)
+        elif is_first and not batch.stored.wait(self.max_age) and self._detach(batch):
+            self._store(batch)
+        else:
+            batch.stored.wait()
+
+        if batch.error is not None:
+            raise batch.error
+        return batch.counts[index]
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+# Whether tasks of this process may run concurrently, so that submissions can meet in a batch
+_concurrent = True
+# Modules of Celery pools which run one task at a time per process
+SERIAL_POOLS = ('celery.concurrency.prefork', 'celery.concurrency.solo')
+
+
+def configure_worker(pool_cls, concurrency):
+    """
+    Called when a Celery worker starts (see payeshgar_server.celery) with its pool class and concurrency: with a pool
+    which runs one task at a time per process no other submission can join a batch, so batches aren't waited for.
+    """
+    global _batcher, _concurrent
+    with _batcher_lock:
+        _concurrent = concurrency > 1 and pool_cls.__module__ not in SERIAL_POOLS
+        _batcher = None
+    if settings.INSPECTION_RESULT_BATCHING and not _concurrent:
+        logger.warning("Submissions can't be batched with the %s pool (concurrency %s), use the threads pool",
+                       pool_cls.__module__, concurrency)
+
+
+def get_batcher():
+    global _batcher
+    with _batcher_lock:
+        if _batcher is None:
+            _batcher = ResultBatcher(
+                max_rows=settings.INSPECTION_RESULT_BATCH_MAX_ROWS,
+                max_age=settings.INSPECTION_RESULT_BATCH_MAX_AGE if _concurrent else 0,
+            )
+        return _batcher
+
+
+def submit(agent_ip, submission_time, results):
+    """
+    Store a submission, through the batcher if INSPECTION_RESULT_BATCHING is enabled.
+    Returns accepted, duplicate and rejected counts after results are stored.
+    """
+    if settings.INSPECTION_RESULT_BATCHING:
+        return get_batcher().submit(agent_ip, submission_time, results)
+    return store_submissions([(agent_ip, submission_time, results)])[0]
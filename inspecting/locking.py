@@ -0,0 +1,25 @@
+"""
+Row locks of ingestion: rows touched by a batch are locked with SELECT ... FOR UPDATE on exactly their keys, an OR of
+per-key conditions, so rows of other (endpoint, agent, ...) combinations of the batch stay free for concurrent
+ingestions. Keys are locked in batches of LOCK_BATCH_SIZE in key order and rows of a batch are locked in the same
+order, so concurrent ingestions can't deadlock.
+"""
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
+
+# Keys per query, SQLite limits the depth of an expression (a chain of ORs) to 1000
+LOCK_BATCH_SIZE = 250
+
+
+def select_for_update(queryset, fields, keys):
+    """
+    Lock and return rows of queryset whose values of fields are one of keys (tuples in the order of fields)
+    """
+    keys = sorted(keys, key=lambda key: [str(value) for value in key])
+    rows = []
+    for start in range(0, len(keys), LOCK_BATCH_SIZE):
+        condition = reduce(or_, (Q(**dict(zip(fields, key))) for key in keys[start:start + LOCK_BATCH_SIZE]))
+        rows.extend(queryset.select_for_update().filter(condition).order_by(*fields))
+    return rows
@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from inspecting import export
+
+
+def _day(value):
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+class Command(BaseCommand):
+    help = (
+        "Export closed days of results (and recent days which got late results again) to Parquet or Arrow files in "
+        "INSPECTION_RESULT_EXPORT_DIR, with --after/--before the given days are (re-)exported instead, e.g. days "
+        "which got results later than LATE_RESULTS_PERIOD. See inspecting.export"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--after', type=_day, help="First day to export (YYYY-MM-DD)")
+        parser.add_argument('--before', type=_day, help="Day after the last day to export (YYYY-MM-DD)")
+
+    def handle(self, *args, **options):
+        if not settings.INSPECTION_RESULT_EXPORT_DIR:
+            raise CommandError("Set INSPECTION_RESULT_EXPORT_DIR to export results")
+        try:
+            if options['after'] or options['before']:
+                if not (options['after'] and options['before']):
+                    raise CommandError("Both --after and --before are required")
+                report, day = {}, options['after']
+                while day < options['before']:
+                    report[day] = export.export_day(day)
+                    day += timedelta(days=1)
+            else:
+                report = export.export_closed()
+        except ImproperlyConfigured as error:
+            raise CommandError(error)
+
+        for day, count in report.items():
+            self.stdout.write(f"Exported {count} results of {day.isoformat()}")
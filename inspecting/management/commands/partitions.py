@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from inspecting import partitioning
+
+
+class Command(BaseCommand):
+    help = (
+        "Create upcoming partitions of inspections and results and expire old ones, "
+        "with --convert existing tables are converted to partitioned ones first. See inspecting.partitioning"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--convert', action='store_true',
+            help="Convert existing tables to partitioned ones, their rows are kept in <table>_legacy partitions",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("Partitioning is only supported on PostgreSQL")
+        period = settings.INSPECTION_PARTITIONING
+        if period not in (partitioning.DAILY, partitioning.MONTHLY):
+            raise CommandError('Set INSPECTION_PARTITIONING to "daily" or "monthly" to enable partitioning')
+
+        if options['convert']:
+            for model in partitioning.LAYOUT:
+                if partitioning.convert(model, period, timezone.now()):
+                    self.stdout.write(f"Converted {model._meta.db_table}")
+                else:
+                    self.stdout.write(f"{model._meta.db_table} is already partitioned")
+
+        for table, (created, expired) in partitioning.maintain().items():
+            for name in created:
+                self.stdout.write(f"Created {name}")
+            for name in expired:
+                self.stdout.write(f"Expired {name} ({settings.INSPECTION_EXPIRED_PARTITIONS})")
@@ -0,0 +1,18 @@
+# Generated by Django 3.0.8 on 2026-10-18 12:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inspecting', '0002_auto_20200713_2150'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='inspection',
+            name='timestamp',
+            field=models.DateTimeField(db_index=True),
+        ),
+    ]
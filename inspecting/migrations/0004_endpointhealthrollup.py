@@ -0,0 +1,45 @@
+# Generated by Django 3.0.8 on 2026-10-18 12:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0004_monitoringpolicy_anchor'),
+        ('inspecting', '0003_auto_20261018_1222'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EndpointHealthRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.PositiveIntegerField(choices=[(60, 'minute'), (3600, 'hour'), (86400, 'day')])),
+                ('bucket', models.DateTimeField()),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('succeed', models.PositiveIntegerField(default=0)),
+                ('conn_failed', models.PositiveIntegerField(default=0)),
+                ('timed_out', models.PositiveIntegerField(default=0)),
+                ('status_1xx', models.PositiveIntegerField(default=0)),
+                ('status_2xx', models.PositiveIntegerField(default=0)),
+                ('status_3xx', models.PositiveIntegerField(default=0)),
+                ('status_4xx', models.PositiveIntegerField(default=0)),
+                ('status_5xx', models.PositiveIntegerField(default=0)),
+                ('response_time_count', models.PositiveIntegerField(default=0)),
+                ('response_time_sum', models.DecimalField(decimal_places=3, default=0, max_digits=15)),
+                ('response_time_min', models.DecimalField(decimal_places=3, max_digits=6, null=True)),
+                ('response_time_max', models.DecimalField(decimal_places=3, max_digits=6, null=True)),
+                ('byte_received_count', models.PositiveIntegerField(default=0)),
+                ('byte_received_sum', models.BigIntegerField(default=0)),
+                ('byte_received_min', models.PositiveIntegerField(null=True)),
+                ('byte_received_max', models.PositiveIntegerField(null=True)),
+                ('endpoint', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='health_rollups', to='monitoring.Endpoint')),
+            ],
+            options={
+                'ordering': ('bucket',),
+                'unique_together': {('endpoint', 'resolution', 'bucket')},
+            },
+        ),
+    ]
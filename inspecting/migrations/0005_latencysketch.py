@@ -0,0 +1,31 @@
+# Generated by Django 3.0.8 on 2026-10-18 12:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0004_monitoringpolicy_anchor'),
+        ('inspecting', '0004_endpointhealthrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LatencySketch',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('agent_ip', models.CharField(max_length=32)),
+                ('bucket', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('sketch', models.BinaryField()),
+                ('agent', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='monitoring.Agent')),
+                ('endpoint', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='latency_sketches', to='monitoring.Endpoint')),
+            ],
+            options={
+                'ordering': ('bucket',),
+                'unique_together': {('endpoint', 'agent_ip', 'bucket')},
+            },
+        ),
+    ]
@@ -0,0 +1,54 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    """
+    First step of compact columns of results: new columns are added next to the old ones, which are filled by
+    0007_compact_http_results_data and removed by 0008_compact_http_results.
+    Steps are separate migrations (so separate transactions on PostgreSQL), ALTER TABLE can't follow updates of the
+    same rows in a transaction while there are deferred constraint checks pending.
+    """
+
+    dependencies = [
+        ('monitoring', '0004_monitoringpolicy_anchor'),
+        ('inspecting', '0005_latencysketch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='httpinspectionresult',
+            name='connection_status_code',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='httpinspectionresult',
+            name='status_code_number',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='httpinspectionresult',
+            name='response_time_us',
+            field=models.IntegerField(null=True, db_column='response_time_us'),
+        ),
+        # Removed columns are nullable first, so they can be added back (and filled) when the migration is reversed
+        migrations.AlterField(
+            model_name='httpinspectionresult',
+            name='agent_ip',
+            field=models.CharField(max_length=32, null=True),
+        ),
+        migrations.AlterField(
+            model_name='httpinspectionresult',
+            name='connection_status',
+            field=models.CharField(
+                choices=[('SUCCEED', 'SUCCEED'), ('CONN-FAILED', 'CONN-FAILED'), ('TIMED-OUT', 'TIMED-OUT')],
+                max_length=16, null=True),
+        ),
+        # The foreign key constraint is dropped before agent is filled with IPs of deleted agents
+        migrations.AlterField(
+            model_name='httpinspectionresult',
+            name='agent',
+            field=models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING,
+                                    to='monitoring.Agent'),
+        ),
+    ]
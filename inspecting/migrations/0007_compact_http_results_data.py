@@ -0,0 +1,54 @@
+from django.db import migrations, models
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Cast, Round
+
+CONNECTION_STATUSES = ('SUCCEED', 'CONN-FAILED', 'TIMED-OUT')
+
+
+def compact_results(apps, schema_editor):
+    HTTPInspectionResult = apps.get_model('inspecting', 'HTTPInspectionResult')
+    # Results of deleted agents lost their agent, the IP is still there
+    HTTPInspectionResult.objects.filter(agent__isnull=True).update(agent_id=F('agent_ip'))
+    HTTPInspectionResult.objects.update(
+        connection_status_code=Case(
+            *[When(connection_status=status, then=Value(code)) for code, status in enumerate(CONNECTION_STATUSES)],
+            output_field=models.PositiveSmallIntegerField(),
+        ),
+        # status_code used to be any string, the ones which aren't a number are dropped
+        status_code_number=Case(
+            When(status_code__regex=r'^[0-9]{1,4}$', then=Cast('status_code', models.PositiveSmallIntegerField())),
+            default=None,
+            output_field=models.PositiveSmallIntegerField(),
+        ),
+        response_time_us=Cast(Round(F('response_time') * 1000000), models.IntegerField()),
+    )
+
+
+def expand_results(apps, schema_editor):
+    Agent = apps.get_model('monitoring', 'Agent')
+    HTTPInspectionResult = apps.get_model('inspecting', 'HTTPInspectionResult')
+    HTTPInspectionResult.objects.update(
+        agent_ip=F('agent_id'),
+        connection_status=Case(
+            *[When(connection_status_code=code, then=Value(status)) for code, status in enumerate(CONNECTION_STATUSES)],
+            output_field=models.CharField(),
+        ),
+        status_code=Cast('status_code_number', models.CharField()),
+        response_time=Cast(F('response_time_us') / 1000000.0, models.DecimalField(max_digits=6, decimal_places=3)),
+    )
+    # The foreign key constraint is back after reversing 0006_compact_http_results_columns
+    HTTPInspectionResult.objects.exclude(agent_id__in=Agent.objects.values('ip')).update(agent_id=None)
+
+
+class Migration(migrations.Migration):
+    """
+    Second step of compact columns of results, see 0006_compact_http_results_columns
+    """
+
+    dependencies = [
+        ('inspecting', '0006_compact_http_results_columns'),
+    ]
+
+    operations = [
+        migrations.RunPython(compact_results, expand_results),
+    ]
@@ -0,0 +1,76 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+import inspecting.fields
+
+
+class Migration(migrations.Migration):
+    """
+    Last step of compact columns of results: old columns are removed and new ones take their names,
+    see 0006_compact_http_results_columns
+    """
+
+    dependencies = [
+        ('monitoring', '0004_monitoringpolicy_anchor'),
+        ('inspecting', '0007_compact_http_results_data'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='httpinspectionresult',
+            unique_together={('inspection', 'agent')},
+        ),
+        migrations.RemoveField(
+            model_name='httpinspectionresult',
+            name='agent_ip',
+        ),
+        migrations.RemoveField(
+            model_name='httpinspectionresult',
+            name='connection_status',
+        ),
+        migrations.RemoveField(
+            model_name='httpinspectionresult',
+            name='status_code',
+        ),
+        migrations.RemoveField(
+            model_name='httpinspectionresult',
+            name='response_time',
+        ),
+        migrations.RenameField(
+            model_name='httpinspectionresult',
+            old_name='connection_status_code',
+            new_name='connection_status',
+        ),
+        migrations.RenameField(
+            model_name='httpinspectionresult',
+            old_name='status_code_number',
+            new_name='status_code',
+        ),
+        migrations.RenameField(
+            model_name='httpinspectionresult',
+            old_name='response_time_us',
+            new_name='response_time',
+        ),
+        migrations.AlterField(
+            model_name='httpinspectionresult',
+            name='agent',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING,
+                                    to='monitoring.Agent'),
+        ),
+        migrations.AlterField(
+            model_name='httpinspectionresult',
+            name='connection_status',
+            field=inspecting.fields.ConnectionStatusField(
+                choices=[('SUCCEED', 'SUCCEED'), ('CONN-FAILED', 'CONN-FAILED'), ('TIMED-OUT', 'TIMED-OUT')]),
+        ),
+        migrations.AlterField(
+            model_name='httpinspectionresult',
+            name='status_code',
+            field=inspecting.fields.StatusCodeField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='httpinspectionresult',
+            name='response_time',
+            field=inspecting.fields.ResponseTimeField(db_column='response_time_us', null=True),
+        ),
+    ]
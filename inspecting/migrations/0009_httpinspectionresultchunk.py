@@ -0,0 +1,30 @@
+# Generated by Django 3.0.8 on 2026-10-18 12:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0004_monitoringpolicy_anchor'),
+        ('inspecting', '0008_compact_http_results'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HTTPInspectionResultChunk',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('data', models.BinaryField()),
+                ('agent', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='monitoring.Agent')),
+                ('endpoint', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='result_chunks', to='monitoring.Endpoint')),
+            ],
+            options={
+                'ordering': ('bucket',),
+                'unique_together': {('endpoint', 'agent', 'bucket')},
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 3.0.8 on 2026-10-18 13:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+import inspecting.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0004_monitoringpolicy_anchor'),
+        ('inspecting', '0009_httpinspectionresultchunk'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EndpointStatus',
+            fields=[
+                ('endpoint', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='status', serialize=False, to='monitoring.Endpoint')),
+                ('agents', models.PositiveIntegerField(default=0)),
+                ('agents_down', models.PositiveIntegerField(db_index=True, default=0)),
+                ('changed_at', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='EndpointAgentStatus',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(null=True)),
+                ('connection_status', inspecting.fields.ConnectionStatusField(choices=[('SUCCEED', 'SUCCEED'), ('CONN-FAILED', 'CONN-FAILED'), ('TIMED-OUT', 'TIMED-OUT')], null=True)),
+                ('status_code', inspecting.fields.StatusCodeField(null=True)),
+                ('response_time', inspecting.fields.ResponseTimeField(db_column='response_time_us', null=True)),
+                ('failures', models.PositiveIntegerField(default=0)),
+                ('changed_at', models.DateTimeField(null=True)),
+                ('agent', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='monitoring.Agent')),
+                ('endpoint', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='agent_statuses', to='monitoring.Endpoint')),
+            ],
+            options={
+                'unique_together': {('endpoint', 'agent')},
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_timestamps(apps, schema_editor):
+    Inspection = apps.get_model('inspecting', 'Inspection')
+    HTTPInspectionResult = apps.get_model('inspecting', 'HTTPInspectionResult')
+    HTTPInspectionResult.objects.update(
+        timestamp=Subquery(Inspection.objects.filter(id=OuterRef('inspection_id')).values('timestamp')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inspecting', '0010_endpoint_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='httpinspectionresult',
+            name='timestamp',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(copy_timestamps, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='httpinspectionresult',
+            name='timestamp',
+            field=models.DateTimeField(),
+        ),
+        migrations.AlterUniqueTogether(
+            name='httpinspectionresult',
+            unique_together={('inspection', 'agent', 'timestamp')},
+        ),
+    ]
@@ -2,6 +2,7 @@ import uuid
 
 from django.db import models
 
+from inspecting import fields
 from monitoring import models as monitoring_models
 
 
@@ -19,7 +20,7 @@ class Inspection(models.Model):
     """
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
 
-    timestamp = models.DateTimeField()
+    timestamp = models.DateTimeField(db_index=True)
     endpoint = models.ForeignKey(monitoring_models.Endpoint, on_delete=models.CASCADE, related_name='inspections')
 
     class Meta:
@@ -34,7 +35,11 @@ class HTTPInspectionResult(models.Model):
     HTTP Inspection Result Model:
     Keep the result of an HTTP Inspection, it uses a UUID to prevent sequentially traversing list of results.
 
-    agent and agent_ip fields are responsible to keep reference to the agent who submit this specific result
+    agent field is responsible to keep reference to the agent who submit this specific result, since agents are
+    identified by their IP address the reference (agent_id, also available as agent_ip) keeps the IP even if the agent
+    is deleted later.
+    timestamp field is a copy of the timestamp of the inspection, results are partitioned by it (see
+    inspecting.partitioning), so it's part of the unique key of results too.
 
     connection_status field will be:
         - SUCCEED: if the agent managed to received a valid HTTP response.
@@ -47,27 +52,172 @@ class HTTPInspectionResult(models.Model):
     submitted_at field will contain the time where server received the result from the agent
     list of results will be sorted by result submit time by default
 
+    Results are the largest table by far, so columns are compact (see inspecting.fields): connection_status is the
+    index of its choice and status_code a number, both in smallint columns, response_time is kept in microseconds in an
+    integer column. In Python they are still strings and a Decimal of seconds.
     """
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     inspection = models.ForeignKey(Inspection, on_delete=models.CASCADE, related_name="http_results")
+    timestamp = models.DateTimeField()
 
-    agent = models.ForeignKey(monitoring_models.Agent, on_delete=models.SET_NULL, null=True)
-    agent_ip = models.CharField(max_length=32)
+    agent = models.ForeignKey(monitoring_models.Agent, on_delete=models.DO_NOTHING, db_constraint=False)
 
     # Result:
-    connection_status = models.CharField(max_length=16, choices=[
+    connection_status = fields.ConnectionStatusField(choices=[
         ("SUCCEED", "SUCCEED",),
         ("CONN-FAILED", "CONN-FAILED",),
         ("TIMED-OUT", "TIMED-OUT",)
     ])
-    status_code = models.CharField(max_length=4, null=True)
-    response_time = models.DecimalField(max_digits=6, decimal_places=3, null=True)
+    status_code = fields.StatusCodeField(null=True)
+    response_time = fields.ResponseTimeField(null=True, db_column='response_time_us')
     byte_received = models.PositiveIntegerField(null=True)
 
     submitted_at = models.DateTimeField(auto_now_add=True)
 
+    @property
+    def agent_ip(self):
+        return self.agent_id
+
     class Meta:
         unique_together = [
-            ("inspection", "agent_ip")
+            ("inspection", "agent", "timestamp")
         ]
         ordering = ("submitted_at",)
+
+
+class EndpointHealthRollup(models.Model):
+    """
+    Endpoint Health Rollup Model:
+    aggregated results of inspections of an endpoint in a time bucket, kept at minute, hour and day resolution and
+    updated incrementally as results are ingested, see inspecting.rollups
+
+    bucket is the start of the time bucket (by timestamp of inspections), resolution is its length in seconds.
+    attempts is the number of results, which are also counted per connection_status and per class of status_code.
+    Sum, min and max of response_time and byte_received are kept along with the number of results which had them,
+    so averages can be computed over any number of buckets.
+    """
+    MINUTE = 60
+    HOUR = 60 * 60
+    DAY = 24 * 60 * 60
+
+    endpoint = models.ForeignKey(monitoring_models.Endpoint, on_delete=models.CASCADE, related_name='health_rollups')
+    resolution = models.PositiveIntegerField(choices=[(MINUTE, "minute"), (HOUR, "hour"), (DAY, "day")])
+    bucket = models.DateTimeField()
+
+    attempts = models.PositiveIntegerField(default=0)
+    succeed = models.PositiveIntegerField(default=0)
+    conn_failed = models.PositiveIntegerField(default=0)
+    timed_out = models.PositiveIntegerField(default=0)
+    status_1xx = models.PositiveIntegerField(default=0)
+    status_2xx = models.PositiveIntegerField(default=0)
+    status_3xx = models.PositiveIntegerField(default=0)
+    status_4xx = models.PositiveIntegerField(default=0)
+    status_5xx = models.PositiveIntegerField(default=0)
+
+    response_time_count = models.PositiveIntegerField(default=0)
+    response_time_sum = models.DecimalField(max_digits=15, decimal_places=3, default=0)
+    response_time_min = models.DecimalField(max_digits=6, decimal_places=3, null=True)
+    response_time_max = models.DecimalField(max_digits=6, decimal_places=3, null=True)
+    byte_received_count = models.PositiveIntegerField(default=0)
+    byte_received_sum = models.BigIntegerField(default=0)
+    byte_received_min = models.PositiveIntegerField(null=True)
+    byte_received_max = models.PositiveIntegerField(null=True)
+
+    class Meta:
+        unique_together = [
+            ("endpoint", "resolution", "bucket")
+        ]
+        ordering = ("bucket",)
+
+
+class LatencySketch(models.Model):
+    """
+    Latency Sketch Model:
+    DDSketch of response times of an endpoint measured by an agent, for inspections of an hour (bucket),
+    see inspecting.sketches
+
+    agent and agent_ip fields keep reference to the agent (agent_ip is kept after the agent is deleted), so sketches
+    can be merged per country or group of agents.
+    count is the number of values in the sketch.
+    """
+    endpoint = models.ForeignKey(monitoring_models.Endpoint, on_delete=models.CASCADE, related_name='latency_sketches')
+    agent = models.ForeignKey(monitoring_models.Agent, on_delete=models.SET_NULL, null=True)
+    agent_ip = models.CharField(max_length=32)
+    bucket = models.DateTimeField()
+
+    count = models.PositiveIntegerField(default=0)
+    sketch = models.BinaryField()
+
+    class Meta:
+        unique_together = [
+            ("endpoint", "agent_ip", "bucket")
+        ]
+        ordering = ("bucket",)
+
+
+class HTTPInspectionResultChunk(models.Model):
+    """
+    HTTP Inspection Result Chunk Model:
+    Archived results of an endpoint measured by an agent, for inspections of an hour (bucket), packed in a single
+    compressed value (data), see inspecting.archive
+
+    agent field keeps reference to the agent just like HTTPInspectionResult.
+    count is the number of results in the chunk.
+    """
+    endpoint = models.ForeignKey(monitoring_models.Endpoint, on_delete=models.CASCADE, related_name='result_chunks')
+    agent = models.ForeignKey(monitoring_models.Agent, on_delete=models.DO_NOTHING, db_constraint=False)
+    bucket = models.DateTimeField()
+
+    count = models.PositiveIntegerField(default=0)
+    data = models.BinaryField()
+
+    class Meta:
+        unique_together = [
+            ("endpoint", "agent", "bucket")
+        ]
+        ordering = ("bucket",)
+
+
+class EndpointAgentStatus(models.Model):
+    """
+    Endpoint Agent Status Model:
+    current state of an endpoint as measured by an agent, updated in place as results are ingested, see
+    inspecting.states
+
+    agent field keeps reference to the agent just like HTTPInspectionResult.
+    timestamp (of the inspection), connection_status, status_code and response_time are of the last result.
+    failures is the number of consecutive failed results up to the last one, zero if it succeeded.
+    changed_at is the timestamp of the first result since the endpoint went up or down.
+    """
+    endpoint = models.ForeignKey(monitoring_models.Endpoint, on_delete=models.CASCADE, related_name='agent_statuses')
+    agent = models.ForeignKey(monitoring_models.Agent, on_delete=models.DO_NOTHING, db_constraint=False)
+
+    timestamp = models.DateTimeField(null=True)
+    connection_status = fields.ConnectionStatusField(null=True, choices=HTTPInspectionResult._meta.get_field(
+        'connection_status').choices)
+    status_code = fields.StatusCodeField(null=True)
+    response_time = fields.ResponseTimeField(null=True, db_column='response_time_us')
+    failures = models.PositiveIntegerField(default=0)
+    changed_at = models.DateTimeField(null=True)
+
+    class Meta:
+        unique_together = [
+            ("endpoint", "agent")
+        ]
+
+
+class EndpointStatus(models.Model):
+    """
+    Endpoint Status Model:
+    current state of an endpoint over all agents, see inspecting.states
+
+    agents is the number of agents which measured the endpoint, agents_down the number of them whose last result
+    failed. changed_at is the timestamp of the result which last changed agents_down (or added the first agent).
+    Rows are only written when one of these changes, so reading all of them is a scan of a small table.
+    """
+    endpoint = models.OneToOneField(
+        monitoring_models.Endpoint, on_delete=models.CASCADE, primary_key=True, related_name='status',
+    )
+    agents = models.PositiveIntegerField(default=0)
+    agents_down = models.PositiveIntegerField(default=0, db_index=True)
+    changed_at = models.DateTimeField(null=True)
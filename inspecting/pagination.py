@@ -0,0 +1,103 @@
+"""
+Keyset (cursor) pagination of inspections on (timestamp, id).
+
+A page is fetched with `WHERE (timestamp, id) > (last timestamp, last id) ORDER BY timestamp, id LIMIT n`, which reads
+just the rows of the page from the (timestamp) index however deep the page is, unlike offsets. The cursor of the next
+page is the key of the last inspection of the current one.
+
+Pagination is opt-in: only requests with a `limit` (or `cursor`) query parameter are paginated, others keep getting a
+plain list.
+"""
+import base64
+import binascii
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def inspection_key(inspection):
+    return inspection.timestamp, str(inspection.id)
+
+
+class KeysetPagination(BasePagination):
+    limit_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    default_limit = 1000
+    max_limit = 10000
+    invalid_cursor_message = "Invalid cursor"
+
+    def get_limit(self, request):
+        if self.limit_query_param not in request.query_params:
+            return self.default_limit if self.cursor_query_param in request.query_params else None
+        try:
+            limit = int(request.query_params[self.limit_query_param])
+        except ValueError:
+            return self.default_limit
+        return min(limit, self.max_limit) if limit > 0 else self.default_limit
+
+    def encode_cursor(self, key):
+        timestamp, id_ = key
+        return base64.urlsafe_b64encode(f"{timestamp.isoformat()}|{id_}".encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            timestamp, id_ = base64.urlsafe_b64decode(encoded.encode()).decode().split("|")
+            return datetime.fromisoformat(timestamp), str(uuid.UUID(id_))
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+        self.request = request
+        position = self.decode_cursor(request)
+
+        if isinstance(queryset, list):
+            # Computed inspections (see inspecting.schedule)
+            items = sorted(queryset, key=inspection_key)
+            if position is not None:
+                items = [item for item in items if inspection_key(item) > position]
+            page = items[:self.limit + 1]
+        else:
+            queryset = queryset.order_by('timestamp', 'id')
+            if position is not None:
+                timestamp, id_ = position
+                queryset = queryset.filter(Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, id__gt=id_))
+            page = list(queryset[:self.limit + 1])
+
+        self.has_next = len(page) > self.limit
+        page = page[:self.limit]
+        self.next_key = inspection_key(page[-1]) if self.has_next else None
+        return page
+
+    def get_next_link(self):
+        if self.next_key is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_key))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
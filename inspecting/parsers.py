@@ -0,0 +1,290 @@
+"""
+Parsers of inspection results submitted by agents.
+
+Besides plain JSON (the default), agents may send results in a compact form to save bandwidth and parse time:
+    - application/vnd.payeshgar.columnar+json: an object of parallel arrays, one per field, e.g.
+      {"inspection": [...], "connection_status": [...], "status_code": [...], ...}
+    - application/msgpack: either a list of results or parallel arrays like above, inspection (and endpoint) ids may
+      be sent as 16 raw bytes instead of text. Requires msgpack package.
+In both compact forms connection_status may be sent as its index in CONNECTION_STATUS_CODES.
+
+Any of them may be compressed, as told by Content-Encoding header: gzip, or zstd (requires zstandard package).
+Compact payloads are expanded to the same list of results plain JSON gives, so the rest of ingestion doesn't care.
+
+Plain JSON arrays can also be parsed incrementally (iter_result_chunks), so results of a huge submission are handled
+in fixed-size chunks without keeping the whole body in memory. Bodies larger than INSPECTION_RESULT_MAX_BODY_SIZE
+(after decompression) are rejected with 413.
+"""
+import codecs
+import gzip
+import json
+import re
+import uuid
+import zlib
+from datetime import datetime
+from itertools import islice
+
+from django.conf import settings
+from rest_framework import parsers
+from rest_framework.exceptions import APIException, ParseError, UnsupportedMediaType
+from rest_framework.utils.json import strict_constant
+
+from inspecting import models
+
+# Order matters, compact payloads refer to connection statuses by their index
+CONNECTION_STATUS_CODES = tuple(
+    status for status, _ in models.HTTPInspectionResult._meta.get_field('connection_status').choices
+)
+
+UUID_FIELDS = ('inspection', 'endpoint')
+EXPANDED_FIELDS = UUID_FIELDS + ('connection_status', 'timestamp')
+
+READ_SIZE = 64 * 1024
+# A single result of a streamed JSON array can't be larger than this
+MAX_STREAMED_ITEM_SIZE = 64 * 1024
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+SEPARATOR = re.compile(r'[ \t\n\r]*,[ \t\n\r]*')
+
+
+class RequestBodyTooLarge(APIException):
+    status_code = 413
+    default_detail = 'Request body is too large.'
+    default_code = 'request_body_too_large'
+
+
+def _open_gzip(stream):
+    return gzip.GzipFile(fileobj=stream, mode='rb'), (OSError, EOFError, zlib.error)
+
+
+def _open_zstd(stream):
+    try:
+        import zstandard
+    except ImportError:
+        raise UnsupportedMediaType(
+            'zstd', detail='Content encoding "zstd" is not supported, zstandard is not installed.',
+        )
+    # read_across_frames makes it work for bodies streamed by the client in several frames
+    return zstandard.ZstdDecompressor().stream_reader(stream, read_across_frames=True), (zstandard.ZstdError,)
+
+
+# Content-Encoding -> function which wraps a stream with a decompressing one, returns it along with its errors
+CONTENT_DECODERS = {
+    'gzip': _open_gzip,
+    'x-gzip': _open_gzip,
+    'zstd': _open_zstd,
+}
+
+
+class BodyReader:
+    """
+    File-like view of a request body, decompressed according to its content encodings.
+    Decoding errors are raised as ParseError, and RequestBodyTooLarge is raised as soon as more than max_size bytes
+    (after decompression) are read.
+    """
+
+    def __init__(self, stream, encodings=(), max_size=None):
+        self.encodings = encodings
+        self.max_size = max_size
+        self.size = 0
+        self._errors = ()
+        # Encodings are listed in the order they were applied
+        for encoding in reversed(encodings):
+            stream, errors = CONTENT_DECODERS[encoding](stream)
+            self._errors += errors
+        self._stream = stream
+
+    def _read(self, size):
+        try:
+            data = self._stream.read(size)
+        except self._errors as exc:
+            raise ParseError(f'{", ".join(self.encodings)} decode error - {exc}')
+        self.size += len(data)
+        if self.max_size is not None and self.size > self.max_size:
+            raise RequestBodyTooLarge(f'Request body is larger than {self.max_size} bytes.')
+        return data
+
+    def read(self, size=-1):
+        if size is not None and size >= 0:
+            return self._read(size)
+        # Read in pieces, so a body which is too large is rejected without reading all of it
+        pieces = []
+        while True:
+            piece = self._read(READ_SIZE)
+            if not piece:
+                return b''.join(pieces)
+            pieces.append(piece)
+
+
+def decode_content(stream, parser_context):
+    """
+    Wrap a request body stream with a BodyReader, according to Content-Encoding of the request
+    """
+    request = (parser_context or {}).get('request')
+    header = request.META.get('HTTP_CONTENT_ENCODING', '') if request is not None else ''
+    encodings = [encoding.strip().lower() for encoding in header.split(',')]
+    encodings = [encoding for encoding in encodings if encoding not in ('', 'identity')]
+    for encoding in encodings:
+        if encoding not in CONTENT_DECODERS:
+            raise UnsupportedMediaType(encoding, detail=f'Content encoding "{encoding}" is not supported.')
+    return BodyReader(stream, encodings, settings.INSPECTION_RESULT_MAX_BODY_SIZE)
+
+
+def _expand_value(name, value):
+    if name in UUID_FIELDS and isinstance(value, bytes) and len(value) == 16:
+        return str(uuid.UUID(bytes=value))
+    if name == 'connection_status' and isinstance(value, int) and not isinstance(value, bool) \
+            and 0 <= value < len(CONNECTION_STATUS_CODES):
+        return CONNECTION_STATUS_CODES[value]
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def expand_results(data):
+    """
+    Convert a compact payload (a list of results or an object of parallel arrays) to a list of plain results.
+    Values which can't be expanded are left as they are, to be rejected by validation.
+    """
+    if isinstance(data, dict):
+        columns = {name: values for name, values in data.items() if isinstance(name, str)}
+        if not all(isinstance(values, list) for values in columns.values()):
+            raise ParseError('Columnar payload should be an object of arrays.')
+        if len({len(values) for values in columns.values()}) > 1:
+            raise ParseError('All columns of a columnar payload should have the same length.')
+        # Values are expanded column by column, which is much cheaper than looking at every cell of every row
+        names = list(columns)
+        values = [[_expand_value(name, value) for value in columns[name]] if name in EXPANDED_FIELDS else columns[name]
+                  for name in names]
+        return [dict(zip(names, row)) for row in zip(*values)]
+    if not isinstance(data, list):
+        return data
+    return [
+        {name: _expand_value(name, value) for name, value in result.items()} if isinstance(result, dict) else result
+        for result in data
+    ]
+
+
+class JSONParser(parsers.JSONParser):
+    """
+    JSON parser which accepts compressed bodies
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return super().parse(decode_content(stream, parser_context), media_type, parser_context)
+
+
+class ColumnarJSONParser(JSONParser):
+    media_type = 'application/vnd.payeshgar.columnar+json'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return expand_results(super().parse(stream, media_type, parser_context))
+
+
+class MsgPackParser(parsers.BaseParser):
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            import msgpack
+        except ImportError:
+            raise UnsupportedMediaType(self.media_type, detail=f'Unsupported media type "{self.media_type}" in '
+                                                               f'request, msgpack is not installed.')
+        stream = decode_content(stream, parser_context)
+        try:
+            # timestamp=3 gives msgpack timestamps as (aware) datetime objects
+            data = msgpack.unpackb(stream.read(), raw=False, timestamp=3, strict_map_key=False)
+        except (ValueError, msgpack.UnpackException) as exc:
+            raise ParseError(f'msgpack parse error - {exc}')
+        return expand_results(data)
+
+
+def iter_json_array(stream, read_size=READ_SIZE):
+    """
+    Parse a JSON array from a stream of bytes incrementally, yield its items one by one.
+    Only the item being parsed and at most read_size bytes after it are kept in memory.
+    """
+    decoder = json.JSONDecoder(parse_constant=strict_constant)
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    buffer, pos, eof = '', 0, False
+
+    def read_more():
+        nonlocal buffer, pos, eof
+        data = stream.read(read_size)
+        eof = not data
+        try:
+            buffer = buffer[pos:] + text_decoder.decode(data, final=eof)
+        except UnicodeDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
+        pos = 0
+
+    def next_char():
+        nonlocal pos
+        while True:
+            pos = WHITESPACE.match(buffer, pos).end()
+            if pos < len(buffer) or eof:
+                return buffer[pos:pos + 1]
+            read_more()
+
+    def next_item():
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as exc:
+                # The item may be cut off at the end of the buffer
+                if eof:
+                    raise ParseError(f'JSON parse error - {exc}')
+                if len(buffer) - pos > MAX_STREAMED_ITEM_SIZE:
+                    raise ParseError(f'JSON parse error - an item is larger than {MAX_STREAMED_ITEM_SIZE} bytes')
+                read_more()
+                continue
+            except ValueError as exc:
+                raise ParseError(f'JSON parse error - {exc}')
+            # A number at the end of the buffer may continue in the rest of the stream
+            if end == len(buffer) and not eof:
+                read_more()
+                continue
+            return item, end
+
+    if next_char() != '[':
+        raise ParseError('Expected a list of results.')
+    pos += 1
+    char = next_char()
+    while char != ']':
+        item, pos = next_item()
+        yield item
+        # Fast path, the separator and the beginning of the next item are already in the buffer
+        match = SEPARATOR.match(buffer, pos)
+        if match is not None and match.end() < len(buffer):
+            pos = match.end()
+            char = ','
+            continue
+        char = next_char()
+        if char == ',':
+            pos += 1
+            next_char()
+        elif char != ']':
+            raise ParseError("JSON parse error - expected ',' or ']' after an item")
+    pos += 1
+    if next_char() != '':
+        raise ParseError('JSON parse error - extra data after the list of results')
+
+
+def is_streamable(request):
+    """
+    Whether results of the request can be parsed incrementally (plain JSON, maybe compressed)
+    """
+    return request.content_type.split(';')[0].strip().lower() == JSONParser.media_type
+
+
+def iter_result_chunks(request, chunk_size):
+    """
+    Parse results of a (streamable) request incrementally, yield lists of at most chunk_size results
+    """
+    if request.stream is None:
+        raise ParseError('Expected a list of results.')
+    items = iter_json_array(decode_content(request.stream, {'request': request}))
+    while True:
+        chunk = list(islice(items, chunk_size))
+        if not chunk:
+            return
+        yield chunk
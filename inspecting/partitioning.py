@@ -0,0 +1,265 @@
+"""
+Time-partitioned layout of inspections and results on PostgreSQL 12+, opt-in by INSPECTION_PARTITIONING setting.
+
+inspecting_inspection and inspecting_httpinspectionresult are partitioned by range of timestamp (of inspections), each
+partition holds a day or a month of rows ("daily" or "monthly"). Queries on a time window only touch
+partitions of that window, and expired rows are removed by detaching or dropping whole partitions instead of DELETEs.
+
+Existing tables are converted by `manage.py partitions --convert`: each table is renamed to <table>_legacy and attached
+as the first partition, which covers everything up to the end of the period of its newest row. After that,
+maintain() (inspecting.tasks.maintain_partitions, runs every hour) creates partitions PARTITIONS_AHEAD periods in
+advance and detaches (or drops, see INSPECTION_EXPIRED_PARTITIONS) partitions older than INSPECTION_PARTITION_RETENTION
+days.
+
+PostgreSQL requires primary keys and unique constraints of a partitioned table to contain the partition key, so both
+tables are partitioned by timestamp of inspections, which results keep a copy of:
+    - primary keys become (id, timestamp), ids are random UUIDs so they stay unique anyway
+    - unique constraints of models already contain timestamp, (endpoint, timestamp) of inspections and
+      (inspection, agent, timestamp) of results, so they are enforced across all partitions and ingestion can keep
+      skipping conflicting rows
+    - the foreign key from results to inspections is dropped, it would need a unique constraint on inspection id alone
+Other constraints and indexes are created on the partitioned table with their original names, so migrations can still
+find and alter them, except primary keys which no migration is expected to alter.
+Lookups by id (e.g. known inspections of a submission) have to check the index of every partition.
+"""
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.backends.utils import truncate_name
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from inspecting import models
+
+DAILY = "daily"
+MONTHLY = "monthly"
+
+PARTITIONS_AHEAD = {
+    DAILY: 7,
+    MONTHLY: 2,
+}
+
+DETACH = "detach"
+DROP = "drop"
+
+# Partitioned model -> partition key
+LAYOUT = {
+    models.Inspection: 'timestamp',
+    models.HTTPInspectionResult: 'timestamp',
+}
+
+PARTITION_BOUND = re.compile(r"FROM \((?P<lower>.+?)\) TO \((?P<upper>.+?)\)")
+
+
+def is_enabled():
+    return bool(settings.INSPECTION_PARTITIONING) and connection.vendor == 'postgresql'
+
+
+def period_start(timestamp, period):
+    start = timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    return start.replace(day=1) if period == MONTHLY else start
+
+
+def next_period(start, period):
+    if period == DAILY:
+        return start + timedelta(days=1)
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def partition_name(table, start, period):
+    return f"{table}_p{start:%Y%m%d}" if period == DAILY else f"{table}_p{start:%Y%m}"
+
+
+def plan_partitions(table, period, upper, now, ahead=None):
+    """
+    List of (name, start, end) of partitions which should be created to cover from `upper` (upper bound of existing
+    partitions, or None) to `ahead` periods after now
+    """
+    ahead = PARTITIONS_AHEAD[period] if ahead is None else ahead
+    until = period_start(now, period)
+    for _ in range(ahead + 1):
+        until = next_period(until, period)
+    start = upper if upper is not None else period_start(now, period)
+    partitions = []
+    while start < until:
+        # An upper bound which is not aligned to the period (e.g. after switching from daily to monthly) gets a
+        # shorter partition up to the next period
+        end = next_period(period_start(start, period), period)
+        partitions.append((partition_name(table, start, period), start, end))
+        start = end
+    return partitions
+
+
+def _parse_bound(value):
+    value = value.strip()
+    if value == 'MINVALUE':
+        return None
+    # Bounds are shown in the time zone of the connection, which is TIME_ZONE, naive datetimes are in it too
+    bound = parse_datetime(value.strip("'"))
+    return bound if settings.USE_TZ else timezone.make_naive(bound)
+
+
+def list_partitions(cursor, table):
+    """
+    List of (name, lower, upper) of partitions of table, ordered by lower bound, MINVALUE is given as None
+    """
+    cursor.execute(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = %s::regclass",
+        [table],
+    )
+    partitions = []
+    for name, bound in cursor.fetchall():
+        match = PARTITION_BOUND.search(bound)
+        partitions.append((name, _parse_bound(match.group('lower')), _parse_bound(match.group('upper'))))
+    return sorted(partitions, key=lambda p: (p[1] is not None, p[1]))
+
+
+def is_partitioned(cursor, table):
+    cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass", [table])
+    return cursor.fetchone() is not None
+
+
+def _constraints(cursor, table):
+    """
+    List of (table, name, type, referenced table, definition) of primary key, unique and foreign key constraints of
+    table and foreign keys of other tables referencing it, the primary key comes last as foreign keys depend on it
+    """
+    cursor.execute(
+        "SELECT conrelid::regclass::text, conname, contype, confrelid::regclass::text, pg_get_constraintdef(oid) "
+        "FROM pg_constraint WHERE (conrelid = %s::regclass AND contype IN ('p', 'u', 'f')) OR confrelid = %s::regclass "
+        "ORDER BY contype = 'p'",
+        [table, table],
+    )
+    return cursor.fetchall()
+
+
+def _indexes(cursor, table):
+    """
+    List of (name, definition) of indexes of table which don't belong to a constraint
+    """
+    cursor.execute(
+        "SELECT c.relname, pg_get_indexdef(i.indexrelid) FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE i.indrelid = %s::regclass AND NOT EXISTS ("
+        "SELECT 1 FROM pg_constraint WHERE conrelid = i.indrelid AND conindid = i.indexrelid)",
+        [table],
+    )
+    return cursor.fetchall()
+
+
+def convert(model, period, now):
+    """
+    Convert the table of model to a partitioned one, its rows are kept in <table>_legacy partition
+    """
+    qn = connection.ops.quote_name
+    opts = model._meta
+    table = opts.db_table
+    key = LAYOUT[model]
+    legacy = f"{table}_legacy"
+    partitioned_tables = {m._meta.db_table for m in LAYOUT}
+    with transaction.atomic(), connection.cursor() as cursor:
+        if is_partitioned(cursor, table):
+            return False
+        # Deferred foreign key checks of rows written earlier in the transaction would block ALTER TABLE
+        cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        cursor.execute(f"SELECT MAX({qn(key)}) FROM {qn(table)}")
+        newest = cursor.fetchone()[0]
+        boundary = next_period(period_start(max(newest or now, now), period), period)
+        # Definitions are read before renaming, so index definitions refer to the new (partitioned) table
+        constraints = _constraints(cursor, table)
+        indexes = _indexes(cursor, table)
+
+        cursor.execute(f"ALTER TABLE {qn(table)} RENAME TO {qn(legacy)}")
+        # Unique constraints and indexes of the legacy table are renamed, they are attached to the ones of the
+        # partitioned table instead of being built again, the primary key doesn't contain the partition key
+        # so it's dropped along with foreign keys
+        for owner, name, kind, _, _ in constraints:
+            if kind == 'u' and owner == table:
+                legacy_name = truncate_name(f"{name}_legacy", connection.ops.max_name_length())
+                cursor.execute(f"ALTER TABLE {qn(legacy)} RENAME CONSTRAINT {qn(name)} TO {qn(legacy_name)}")
+            else:
+                cursor.execute(f"ALTER TABLE {qn(legacy) if owner == table else owner} DROP CONSTRAINT {qn(name)}")
+        for name, _ in indexes:
+            legacy_name = truncate_name(f"{name}_legacy", connection.ops.max_name_length())
+            cursor.execute(f"ALTER INDEX {qn(name)} RENAME TO {qn(legacy_name)}")
+
+        cursor.execute(
+            f"CREATE TABLE {qn(table)} (LIKE {qn(legacy)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+            f"PARTITION BY RANGE ({qn(key)})"
+        )
+        for owner, name, kind, referenced, definition in constraints:
+            if kind == 'p':
+                cursor.execute(f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(name)} "
+                               f"PRIMARY KEY ({qn(opts.pk.column)}, {qn(key)})")
+            elif owner == table and referenced not in partitioned_tables:
+                cursor.execute(f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(name)} {definition}")
+        for _, definition in indexes:
+            cursor.execute(definition)
+        cursor.execute(
+            f"ALTER TABLE {qn(table)} ATTACH PARTITION {qn(legacy)} FOR VALUES FROM (MINVALUE) TO (%s)", [boundary]
+        )
+    return True
+
+
+def ensure_partitions(model, period, now):
+    """
+    Create partitions of model up to PARTITIONS_AHEAD periods after now, returns names of created partitions
+    """
+    qn = connection.ops.quote_name
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        existing = list_partitions(cursor, table)
+        upper = existing[-1][2] if existing else None
+        planned = plan_partitions(table, period, upper, now)
+        for name, start, end in planned:
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {qn(name)} PARTITION OF {qn(table)} FOR VALUES FROM (%s) TO (%s)",
+                [start, end],
+            )
+    return [name for name, _, _ in planned]
+
+
+def expire_partitions(model, retention, now):
+    """
+    Detach (or drop) partitions of model which only contain rows older than retention, returns their names
+    """
+    qn = connection.ops.quote_name
+    table = model._meta.db_table
+    cutoff = now - retention
+    expired = []
+    with connection.cursor() as cursor:
+        for name, _, upper in list_partitions(cursor, table):
+            if upper is None or upper > cutoff:
+                continue
+            with transaction.atomic():
+                cursor.execute(f"ALTER TABLE {qn(table)} DETACH PARTITION {qn(name)}")
+                if settings.INSPECTION_EXPIRED_PARTITIONS == DROP:
+                    cursor.execute(f"DROP TABLE {qn(name)}")
+            expired.append(name)
+    return expired
+
+
+def maintain(now=None):
+    """
+    Create upcoming partitions and expire old ones for every partitioned table,
+    returns a dict of table -> (created, expired) partition names
+    """
+    if not is_enabled():
+        return {}
+    now = now or timezone.now()
+    period = settings.INSPECTION_PARTITIONING
+    report = {}
+    for model in LAYOUT:
+        table = model._meta.db_table
+        with connection.cursor() as cursor:
+            if not is_partitioned(cursor, table):
+                continue
+        created = ensure_partitions(model, period, now)
+        expired = []
+        if settings.INSPECTION_PARTITION_RETENTION:
+            expired = expire_partitions(model, timedelta(days=settings.INSPECTION_PARTITION_RETENTION), now)
+        report[table] = (created, expired)
+    return report
+
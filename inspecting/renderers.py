@@ -0,0 +1,28 @@
+"""
+Newline delimited JSON (application/x-ndjson, or ?format=ndjson): one JSON object per line.
+
+Views which support it stream items one by one (see InspectionListAPIView), so the response is never built in memory
+and the first line is sent as soon as the first row is read. The renderer itself is used for anything else
+(e.g. error responses), a list is rendered as one line per item and any other data as a single line.
+"""
+import json
+
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+def render_line(item):
+    return json.dumps(item, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':')).encode() + b"\n"
+
+
+class NDJSONRenderer(BaseRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if isinstance(data, list):
+            return b"".join(render_line(item) for item in data)
+        return render_line(data)
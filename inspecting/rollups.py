@@ -0,0 +1,188 @@
+"""
+Rollups of endpoint health (see EndpointHealthRollup) at minute, hour and day resolution.
+
+Results are aggregated in memory per (endpoint, resolution, bucket) when they are ingested, and the deltas are added to
+stored rollups with a single upsert (INSERT ... ON CONFLICT DO UPDATE), so rollups are never rebuilt from raw results.
+Rollups are updated in the same transaction as results are inserted.
+
+Readers use query(), with the coarsest resolution which still gives enough points for the requested range
+(choose_resolution).
+"""
+from django.db import connection
+
+from inspecting import models
+
+Rollup = models.EndpointHealthRollup
+
+RESOLUTIONS = (Rollup.MINUTE, Rollup.HOUR, Rollup.DAY)
+RESOLUTION_NAMES = dict(Rollup._meta.get_field('resolution').choices)
+
+# Ranges are shown with at least this many buckets, if the finest resolution allows
+MIN_POINTS = 60
+
+CONNECTION_STATUS_COUNTERS = {
+    "SUCCEED": 'succeed',
+    "CONN-FAILED": 'conn_failed',
+    "TIMED-OUT": 'timed_out',
+}
+STATUS_CLASS_COUNTERS = {str(i): f'status_{i}xx' for i in range(1, 6)}
+COUNTERS = (
+    'attempts', 'succeed', 'conn_failed', 'timed_out',
+    'status_1xx', 'status_2xx', 'status_3xx', 'status_4xx', 'status_5xx',
+    'response_time_count', 'response_time_sum', 'byte_received_count', 'byte_received_sum',
+)
+MINIMUMS = ('response_time_min', 'byte_received_min')
+MAXIMUMS = ('response_time_max', 'byte_received_max')
+KEY_COLUMNS = ('endpoint_id', 'resolution', 'bucket')
+
+
+def bucket_start(timestamp, resolution):
+    if resolution == Rollup.MINUTE:
+        return timestamp.replace(second=0, microsecond=0)
+    if resolution == Rollup.HOUR:
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _new_values():
+    return dict({name: 0 for name in COUNTERS}, **{name: None for name in MINIMUMS + MAXIMUMS})
+
+
+def _add_measure(values, name, value):
+    if value is None:
+        return
+    values[f'{name}_count'] += 1
+    values[f'{name}_sum'] += value
+    if values[f'{name}_min'] is None or value < values[f'{name}_min']:
+        values[f'{name}_min'] = value
+    if values[f'{name}_max'] is None or value > values[f'{name}_max']:
+        values[f'{name}_max'] = value
+
+
+def _merge(into, values):
+    for name in COUNTERS:
+        into[name] += values[name]
+    for name in MINIMUMS:
+        if into[name] is None or (values[name] is not None and values[name] < into[name]):
+            into[name] = values[name]
+    for name in MAXIMUMS:
+        if into[name] is None or (values[name] is not None and values[name] > into[name]):
+            into[name] = values[name]
+
+
+def collect(results):
+    """
+    Aggregate results, an iterable of (endpoint_id, timestamp, connection_status, status_code, response_time,
+    byte_received), returns a dict of (endpoint_id, resolution, bucket) -> values of rollup fields
+    """
+    minutes = {}
+    for endpoint_id, timestamp, connection_status, status_code, response_time, byte_received in results:
+        key = (endpoint_id, Rollup.MINUTE, bucket_start(timestamp, Rollup.MINUTE))
+        values = minutes.get(key)
+        if values is None:
+            values = minutes[key] = _new_values()
+        values['attempts'] += 1
+        values[CONNECTION_STATUS_COUNTERS[connection_status]] += 1
+        if status_code is not None and len(str(status_code)) == 3 and str(status_code)[0] in STATUS_CLASS_COUNTERS:
+            values[STATUS_CLASS_COUNTERS[str(status_code)[0]]] += 1
+        _add_measure(values, 'response_time', response_time)
+        _add_measure(values, 'byte_received', byte_received)
+
+    # Coarser buckets are rolled up from minutes instead of results
+    buckets = dict(minutes)
+    for resolution in RESOLUTIONS[1:]:
+        for (endpoint_id, _, minute), values in minutes.items():
+            key = (endpoint_id, resolution, bucket_start(minute, resolution))
+            if key not in buckets:
+                buckets[key] = _new_values()
+            _merge(buckets[key], values)
+    return buckets
+
+
+def _upsert_sql(rows, least, greatest):
+    qn = connection.ops.quote_name
+    table = qn(Rollup._meta.db_table)
+    columns = KEY_COLUMNS + COUNTERS + MINIMUMS + MAXIMUMS
+    placeholders = ", ".join(["(" + ", ".join(["%s"] * len(columns)) + ")"] * rows)
+    updates = [f"{qn(c)} = {table}.{qn(c)} + EXCLUDED.{qn(c)}" for c in COUNTERS]
+    # LEAST/GREATEST of PostgreSQL ignore NULLs, MIN/MAX of SQLite don't
+    updates += [
+        f"{qn(c)} = {function}(COALESCE({table}.{qn(c)}, EXCLUDED.{qn(c)}), "
+        f"COALESCE(EXCLUDED.{qn(c)}, {table}.{qn(c)}))"
+        for names, function in ((MINIMUMS, least), (MAXIMUMS, greatest)) for c in names
+    ]
+    return (
+        f"INSERT INTO {table} ({', '.join(qn(c) for c in columns)}) VALUES {placeholders} "
+        f"ON CONFLICT ({', '.join(qn(c) for c in KEY_COLUMNS)}) DO UPDATE SET {', '.join(updates)}"
+    )
+
+
+def _apply_with_orm(buckets):
+    for (endpoint_id, resolution, bucket), values in buckets:
+        rollup, _ = Rollup.objects.select_for_update().get_or_create(
+            endpoint_id=endpoint_id, resolution=resolution, bucket=bucket,
+        )
+        stored = {name: getattr(rollup, name) for name in COUNTERS + MINIMUMS + MAXIMUMS}
+        _merge(stored, values)
+        for name, value in stored.items():
+            setattr(rollup, name, value)
+        rollup.save()
+
+
+UPSERT_FUNCTIONS = {
+    'postgresql': ('LEAST', 'GREATEST'),
+    'sqlite': ('MIN', 'MAX'),
+}
+
+
+def apply(buckets):
+    """
+    Add aggregated values (see collect) to stored rollups, should be called in a transaction
+    """
+    # Rows are always locked in the same order, so concurrent ingestions can't deadlock
+    buckets = sorted(buckets.items(), key=lambda item: (str(item[0][0]), item[0][1], item[0][2]))
+    if connection.vendor not in UPSERT_FUNCTIONS:
+        return _apply_with_orm(buckets)
+
+    fields = [Rollup._meta.get_field(c) for c in KEY_COLUMNS + COUNTERS + MINIMUMS + MAXIMUMS]
+    batch_size = connection.ops.bulk_batch_size(fields, buckets) or len(buckets)
+    with connection.cursor() as cursor:
+        for start in range(0, len(buckets), batch_size):
+            batch = buckets[start:start + batch_size]
+            params = [
+                field.get_db_prep_save(value, connection)
+                for key, values in batch
+                for field, value in zip(fields, key + tuple(values[f.name] for f in fields[len(KEY_COLUMNS):]))
+            ]
+            cursor.execute(_upsert_sql(len(batch), *UPSERT_FUNCTIONS[connection.vendor]), params)
+
+
+def record(results):
+    """
+    Update rollups with ingested results, see collect for the format of results
+    """
+    buckets = collect(results)
+    if buckets:
+        apply(buckets)
+
+
+def choose_resolution(after, before, min_points=MIN_POINTS):
+    """
+    Coarsest resolution which gives at least min_points buckets between after and before, or the finest one
+    """
+    for resolution in reversed(RESOLUTIONS):
+        if (before - after).total_seconds() / resolution >= min_points:
+            return resolution
+    return RESOLUTIONS[0]
+
+
+def query(endpoint_id, after, before, resolution):
+    """
+    Rollups of an endpoint at resolution, for buckets which overlap with [after, before)
+    """
+    return Rollup.objects.filter(
+        endpoint_id=endpoint_id,
+        resolution=resolution,
+        bucket__gte=bucket_start(after, resolution),
+        bucket__lt=before,
+    )
@@ -0,0 +1,154 @@
+"""
+Virtual inspection schedule:
+instead of storing every future inspection, inspections of an endpoint are computed from its monitoring policy,
+they happen at policy.anchor + k * policy.interval.
+
+Each computed inspection gets a deterministic id derived from its endpoint and timestamp, so every agent (and every
+request) sees the same id for the same slot. An Inspection row is only stored when the first result for that slot
+arrives, that's why agents have to send `endpoint` and `timestamp` of the inspection along with its result.
+
+The mode is selected by INSPECTION_SCHEDULE setting, "materialized" (default) or "virtual".
+"""
+import uuid
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from inspecting import models
+from monitoring import models as monitoring_models
+
+MATERIALIZED = "materialized"
+VIRTUAL = "virtual"
+
+INSPECTION_ID_NAMESPACE = uuid.UUID('5b0e7c7e-4a8e-4f43-9b36-2f5f3c1f4b2d')
+
+# Windows with more inspections than this are rejected rather than computed, a shorter window has to be used
+MAX_COMPUTED_INSPECTIONS = 100000
+
+
+def is_virtual():
+    return settings.INSPECTION_SCHEDULE == VIRTUAL
+
+
+def normalize_timestamp(timestamp):
+    if isinstance(timestamp, str):
+        try:
+            timestamp = parse_datetime(timestamp)
+        except ValueError:
+            return None
+    if not isinstance(timestamp, datetime):
+        return None
+    if timezone.is_aware(timestamp):
+        timestamp = timezone.make_naive(timestamp, timezone.utc)
+    return timestamp
+
+
+def _normalize_uuid(value):
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        return None
+
+
+def inspection_id(endpoint_id, timestamp):
+    """
+    Deterministic id of the inspection of `endpoint_id` at `timestamp`
+    """
+    endpoint_id = _normalize_uuid(endpoint_id)
+    return uuid.uuid5(INSPECTION_ID_NAMESPACE, f"{endpoint_id}/{normalize_timestamp(timestamp).isoformat()}")
+
+
+def _first_slot(anchor, step, after):
+    """
+    k of the first slot of the schedule (anchor + k * step) after after
+    """
+    return 0 if after < anchor else (after - anchor) // step + 1
+
+
+def iter_slots(anchor, interval, after, before):
+    """
+    Yield timestamps of the schedule (anchor + k * interval) which are in the (after, before) open interval
+    """
+    anchor = anchor.replace(microsecond=0)
+    step = timedelta(seconds=interval)
+    cur = anchor + _first_slot(anchor, step, after) * step
+    while cur < before:
+        yield cur
+        cur += step
+
+
+def count_slots(anchor, interval, after, before):
+    """
+    Number of timestamps iter_slots yields, without yielding them
+    """
+    anchor = anchor.replace(microsecond=0)
+    step = timedelta(seconds=interval)
+    # -((anchor - before) // step) is the first k with anchor + k * step >= before
+    return max(0, -((anchor - before) // step) - _first_slot(anchor, step, after))
+
+
+def is_on_schedule(anchor, interval, timestamp):
+    offset = timestamp - anchor.replace(microsecond=0)
+    return offset >= timedelta(0) and offset % timedelta(seconds=interval) == timedelta(0)
+
+
+def compute_inspections(after, before, groups=()):
+    """
+    List of (unsaved) inspections between after and before for endpoints monitored by any of the groups,
+    ordered by timestamp just like Inspection objects.
+    Raises ValueError if there are more than MAX_COMPUTED_INSPECTIONS of them.
+    """
+    endpoints = monitoring_models.Endpoint.objects.filter(monitoring_policy__isnull=False)
+    if groups:
+        endpoints = endpoints.filter(monitoring_policy__groups__in=groups).distinct()
+    endpoints = list(
+        endpoints.order_by().values_list('id', 'monitoring_policy__anchor', 'monitoring_policy__interval')
+    )
+
+    count = sum(count_slots(anchor, interval, after, before) for _, anchor, interval in endpoints)
+    if count > MAX_COMPUTED_INSPECTIONS:
+        raise ValueError(f"window has {count} inspections, more than {MAX_COMPUTED_INSPECTIONS}, use a shorter window")
+    inspections = [
+        models.Inspection(id=inspection_id(endpoint_id, timestamp), endpoint_id=endpoint_id, timestamp=timestamp)
+        for endpoint_id, anchor, interval in endpoints
+        for timestamp in iter_slots(anchor, interval, after, before)
+    ]
+    inspections.sort(key=lambda i: (i.timestamp, str(i.endpoint_id)))
+    return inspections
+
+
+def materialize_inspections(results):
+    """
+    Store inspections referenced by a list of results, if they are not stored yet.
+
+    Results which do not point to a valid slot of the schedule (unknown endpoint, off-schedule timestamp or an id
+    which does not match endpoint and timestamp) are dropped, the rest is returned.
+    """
+    slots = {}
+    for r in results:
+        id_, endpoint_id = _normalize_uuid(r.get('inspection')), _normalize_uuid(r.get('endpoint'))
+        timestamp = normalize_timestamp(r.get('timestamp'))
+        if None in (id_, endpoint_id, timestamp):
+            continue
+        slots[id_] = (endpoint_id, timestamp)
+
+    policies = {
+        endpoint_id: (anchor, interval) for endpoint_id, anchor, interval in
+        monitoring_models.MonitoringPolicy.objects.filter(
+            endpoint_id__in={endpoint_id for endpoint_id, _ in slots.values()}
+        ).values_list('endpoint_id', 'anchor', 'interval')
+    }
+    valid_slots = {
+        id_: (endpoint_id, timestamp) for id_, (endpoint_id, timestamp) in slots.items()
+        if endpoint_id in policies
+        and is_on_schedule(*policies[endpoint_id], timestamp)
+        and inspection_id(endpoint_id, timestamp) == id_
+    }
+    models.Inspection.objects.bulk_create(
+        [models.Inspection(id=id_, endpoint_id=endpoint_id, timestamp=timestamp)
+         for id_, (endpoint_id, timestamp) in valid_slots.items()],
+        ignore_conflicts=True,
+    )
+    return [r for r in results if _normalize_uuid(r.get('inspection')) in valid_slots]
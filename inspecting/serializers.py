@@ -1,12 +1,13 @@
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
-from inspecting import models
+from inspecting import models, rollups, sketches, stats
+from monitoring import fieldsets
 
 from datetime import datetime, timedelta
 
 
-class InspectionSerializer(serializers.ModelSerializer):
+class InspectionSerializer(fieldsets.SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = models.Inspection
         exclude = []
@@ -36,7 +37,78 @@ class InspectionFilteringSerializer(serializers.Serializer):
         return result
 
 
-class CreateHTTPInspectionResultSerializer(serializers.ModelSerializer):
+class EndpointHealthRollupSerializer(serializers.ModelSerializer):
+    success_rate = serializers.SerializerMethodField()
+    response_time_avg = serializers.SerializerMethodField()
+    byte_received_avg = serializers.SerializerMethodField()
+
+    def get_success_rate(self, rollup):
+        return rollup.succeed / rollup.attempts if rollup.attempts else None
+
+    def get_response_time_avg(self, rollup):
+        return rollup.response_time_sum / rollup.response_time_count if rollup.response_time_count else None
+
+    def get_byte_received_avg(self, rollup):
+        return rollup.byte_received_sum / rollup.byte_received_count if rollup.byte_received_count else None
+
     class Meta:
-        model = models.HTTPInspectionResult
-        fields = ['inspection', 'connection_status', 'status_code', 'response_time', 'byte_received']
+        model = models.EndpointHealthRollup
+        exclude = ['id', 'endpoint', 'resolution']
+
+
+class EndpointHealthFilteringSerializer(serializers.Serializer):
+    after = serializers.DateTimeField(required=False, default=None)
+    before = serializers.DateTimeField(required=False, default=None)
+    resolution = serializers.ChoiceField(choices=list(rollups.RESOLUTION_NAMES.values()), required=False, default=None)
+
+    def validate(self, attrs):
+        default_period = timedelta(days=1)
+        result = dict(before=attrs.get('before') or datetime.now(), after=attrs.get('after'))
+        if result['after'] is None:
+            result['after'] = result['before'] - default_period
+        if result['after'] > result['before']:
+            raise ValidationError("after should be less than or equal to before")
+        if attrs.get('resolution') is None:
+            result['resolution'] = rollups.choose_resolution(result['after'], result['before'])
+        else:
+            result['resolution'] = {name: r for r, name in rollups.RESOLUTION_NAMES.items()}[attrs['resolution']]
+        return result
+
+
+class EndpointStatsFilteringSerializer(serializers.Serializer):
+    after = serializers.DateTimeField(required=False, default=None)
+    before = serializers.DateTimeField(required=False, default=None)
+    bucket = serializers.ChoiceField(choices=list(stats.BUCKET_SIZES), required=False, default=stats.HOUR)
+
+    def validate(self, attrs):
+        default_period = timedelta(days=1)
+        result = dict(attrs, before=attrs.get('before') or datetime.now())
+        if result['after'] is None:
+            result['after'] = result['before'] - default_period
+        if result['after'] > result['before']:
+            raise ValidationError("after should be less than or equal to before")
+        if (result['before'] - result['after']) / stats.BUCKET_SIZES[result['bucket']] > stats.MAX_BUCKETS:
+            raise ValidationError(f"range is more than {stats.MAX_BUCKETS} buckets, use a larger bucket")
+        return result
+
+
+class EndpointStatusFilteringSerializer(serializers.Serializer):
+    down = serializers.BooleanField(required=False, allow_null=True, default=None)
+
+
+class LatencyFilteringSerializer(serializers.Serializer):
+    after = serializers.DateTimeField(required=False, default=None)
+    before = serializers.DateTimeField(required=False, default=None)
+    endpoints = serializers.ListField(child=serializers.UUIDField(), required=False, default=list)
+    countries = serializers.ListField(child=serializers.CharField(), required=False, default=list)
+    groups = serializers.ListField(required=False, default=list)
+    by = serializers.ChoiceField(choices=[by for by in sketches.BREAKDOWN_FIELDS if by], required=False, default=None)
+
+    def validate(self, attrs):
+        default_period = timedelta(hours=1)
+        result = dict(attrs, before=attrs.get('before') or datetime.now())
+        if result['after'] is None:
+            result['after'] = result['before'] - default_period
+        if result['after'] > result['before']:
+            raise ValidationError("after should be less than or equal to before")
+        return result
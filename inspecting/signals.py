@@ -0,0 +1,10 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from inspecting import states
+from monitoring import models as monitoring_models
+
+
+@receiver(post_delete, sender=monitoring_models.Agent)
+def forget_agent_states(sender, instance, **kwargs):
+    states.forget_agent(instance.ip)
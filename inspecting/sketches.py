@@ -0,0 +1,182 @@
+"""
+Latency sketches: mergeable summaries of response_time distributions, so percentiles over any range of time, any set of
+endpoints, countries or groups of agents are computed by merging a few sketches instead of reading raw results.
+
+DDSketch is used, every value is counted in a logarithmic bin, so any quantile is estimated with a relative error of
+at most RELATIVE_ACCURACY and merging two sketches is just adding counts of their bins.
+
+A sketch is kept per endpoint, agent and hour (LatencySketch), updated in the ingestion transaction: sketches of a
+batch are locked (see inspecting.locking), merged with new values and written back.
+"""
+import math
+import struct
+from collections import defaultdict
+
+from inspecting import locking, models
+from monitoring import models as monitoring_models
+
+RELATIVE_ACCURACY = 0.01
+# Values smaller than this (including zero) are counted together, as if they were zero
+MIN_VALUE = 1e-6
+
+QUANTILES = (0.5, 0.95, 0.99)
+# Breakdowns of percentiles -> field of LatencySketch
+BREAKDOWN_FIELDS = {
+    None: None,
+    'endpoint': 'endpoint_id',
+    'country': 'agent__country',
+    'group': 'agent__groups',
+}
+
+_HEADER = struct.Struct('<BdQiI')
+_VERSION = 1
+
+
+class DDSketch:
+    def __init__(self, relative_accuracy=RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins = defaultdict(int)
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value, count=1):
+        value = float(value)
+        if value < MIN_VALUE:
+            self.zero_count += count
+        else:
+            self.bins[math.ceil(math.log(value) / self._log_gamma)] += count
+        self.count += count
+
+    def merge(self, other):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Sketches with different accuracy can't be merged")
+        for index, count in other.bins.items():
+            self.bins[index] += count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        return self
+
+    def _value(self, index):
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def quantile(self, q):
+        """
+        Estimated q-quantile (0 <= q <= 1) of added values, None if the sketch is empty
+        """
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if seen > rank:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                return self._value(index)
+        return self._value(max(self.bins))
+
+    def to_bytes(self):
+        """
+        Compact encoding: a header and counts of every bin from the lowest to the highest non-empty one
+        """
+        bins = {index: count for index, count in self.bins.items() if count}
+        low = min(bins, default=0)
+        size = max(bins) - low + 1 if bins else 0
+        counts = [bins.get(low + i, 0) for i in range(size)]
+        return _HEADER.pack(_VERSION, self.relative_accuracy, self.zero_count, low, size) + \
+            struct.pack(f'<{size}I', *counts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        version, relative_accuracy, zero_count, low, size = _HEADER.unpack_from(data)
+        if version != _VERSION:
+            raise ValueError(f"Unknown sketch version {version}")
+        sketch = cls(relative_accuracy)
+        sketch.zero_count = zero_count
+        for i, count in enumerate(struct.unpack_from(f'<{size}I', data, _HEADER.size)):
+            if count:
+                sketch.bins[low + i] = count
+        sketch.count = zero_count + sum(sketch.bins.values())
+        return sketch
+
+
+def bucket_start(timestamp):
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def collect(results):
+    """
+    Build sketches of results, an iterable of (endpoint_id, agent_ip, timestamp, response_time),
+    returns a dict of (endpoint_id, agent_ip, bucket) -> DDSketch. Results without response_time are skipped.
+    """
+    sketches = {}
+    for endpoint_id, agent_ip, timestamp, response_time in results:
+        if response_time is None:
+            continue
+        key = (endpoint_id, agent_ip, bucket_start(timestamp))
+        if key not in sketches:
+            sketches[key] = DDSketch()
+        sketches[key].add(response_time)
+    return sketches
+
+
+def apply(sketches):
+    """
+    Merge sketches (see collect) into stored ones, should be called in a transaction
+    """
+    LatencySketch = models.LatencySketch
+    LatencySketch.objects.bulk_create(
+        [LatencySketch(endpoint_id=endpoint_id, agent_id=agent_ip, agent_ip=agent_ip, bucket=bucket,
+                       sketch=DDSketch().to_bytes())
+         for endpoint_id, agent_ip, bucket in sketches],
+        ignore_conflicts=True,
+    )
+    stored = locking.select_for_update(LatencySketch.objects, ('endpoint_id', 'agent_ip', 'bucket'), sketches)
+    changed = []
+    for row in stored:
+        merged = DDSketch.from_bytes(bytes(row.sketch)).merge(sketches[row.endpoint_id, row.agent_ip, row.bucket])
+        row.sketch, row.count = merged.to_bytes(), merged.count
+        changed.append(row)
+    LatencySketch.objects.bulk_update(changed, ['sketch', 'count'])
+
+
+def record(results):
+    """
+    Update sketches with ingested results, see collect for the format of results
+    """
+    sketches = collect(results)
+    if sketches:
+        apply(sketches)
+
+
+def query(after, before, endpoints=(), countries=(), groups=()):
+    """
+    LatencySketch rows of buckets which overlap with [after, before), optionally limited to some endpoints and agents
+    of some countries or groups
+    """
+    queryset = models.LatencySketch.objects.filter(bucket__gte=bucket_start(after), bucket__lt=before)
+    if endpoints:
+        queryset = queryset.filter(endpoint_id__in=endpoints)
+    if countries:
+        queryset = queryset.filter(agent__country__in=countries)
+    if groups:
+        queryset = queryset.filter(agent__in=monitoring_models.Agent.objects.filter(groups__in=groups))
+    return queryset
+
+
+def percentiles(queryset, by=None, quantiles=QUANTILES):
+    """
+    Merge sketches of a queryset (see query), all together or per endpoint, country or group of agents (by),
+    returns a dict of key (None if by is None) -> (count, [estimated value of each of quantiles])
+    """
+    field = BREAKDOWN_FIELDS[by]
+    merged = defaultdict(DDSketch)
+    if field is None:
+        rows = ((None, sketch) for sketch in queryset.values_list('sketch', flat=True))
+    else:
+        rows = queryset.values_list(field, 'sketch')
+    for key, sketch in rows:
+        merged[key].merge(DDSketch.from_bytes(bytes(sketch)))
+    return {key: (sketch.count, [sketch.quantile(q) for q in quantiles]) for key, sketch in merged.items()}
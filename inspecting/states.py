@@ -0,0 +1,217 @@
+"""
+Current state of endpoints, so "which endpoints are down right now" is answered by reading a small table instead of
+joining the latest inspections with their results.
+
+EndpointAgentStatus keeps the last result of every endpoint measured by every agent, the number of consecutive failures
+up to it and when the endpoint last went up or down for that agent. EndpointStatus keeps, per endpoint, how many agents
+measured it and how many of them see it down. Both are updated in place in the ingestion transaction: rows of a batch
+are locked (see inspecting.locking), advanced with results newer than their last one and written back with a multi-row
+upsert where it's supported. Results of older inspections which arrive late only go to history, they don't move the
+current state back. Statuses of an agent are removed when it's deleted (see inspecting.signals).
+
+A result is a failure if no valid response was received or its status code is in FAILED_STATUS_CLASSES.
+EndpointStatus rows are only written when the number of agents or of agents seeing the endpoint down changes, then
+the ENDPOINT_STATUSES version (see monitoring.versioning) is bumped once the transaction commits. The rendered list of
+endpoint states is cached by version, so the status board is served from the cache until an endpoint goes up or down
+(a board of tens of thousands of endpoints is a few MB, more than memcached keeps in an item by default).
+"""
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from rest_framework.renderers import JSONRenderer
+
+from inspecting import locking, models
+from monitoring import versioning
+
+FAILED_STATUS_CLASSES = ('5',)
+
+AGENT_STATUS_FIELDS = ('timestamp', 'connection_status', 'status_code', 'response_time', 'failures', 'changed_at')
+ENDPOINT_STATUS_FIELDS = ('agents', 'agents_down', 'changed_at')
+
+UPSERT_VENDORS = ('postgresql', 'sqlite')
+
+# Endpoints deleted with their states bump ENDPOINTS
+VERSION_NAMES = (versioning.ENDPOINTS, versioning.ENDPOINT_STATUSES)
+BOARD_CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def is_failure(connection_status, status_code):
+    return connection_status != "SUCCEED" or (
+        status_code is not None and str(status_code)[0] in FAILED_STATUS_CLASSES
+    )
+
+
+def collect(results):
+    """
+    Group results, an iterable of (endpoint_id, agent_ip, timestamp, connection_status, status_code, response_time),
+    returns a dict of (endpoint_id, agent_ip) -> list of (timestamp, connection_status, status_code, response_time)
+    sorted by timestamp
+    """
+    latest = defaultdict(list)
+    for endpoint_id, agent_ip, timestamp, connection_status, status_code, response_time in results:
+        latest[(endpoint_id, agent_ip)].append((timestamp, connection_status, status_code, response_time))
+    for entries in latest.values():
+        entries.sort(key=lambda entry: entry[0])
+    return latest
+
+
+def advance(status, entries):
+    """
+    Apply entries (see collect) newer than the last result of status (an EndpointAgentStatus), returns whether it
+    changed
+    """
+    changed = False
+    for timestamp, connection_status, status_code, response_time in entries:
+        if status.timestamp is not None and timestamp <= status.timestamp:
+            continue
+        failed = is_failure(connection_status, status_code)
+        if status.timestamp is None or failed != (status.failures > 0):
+            status.changed_at = timestamp
+        status.failures = status.failures + 1 if failed else 0
+        status.timestamp = timestamp
+        status.connection_status = connection_status
+        status.status_code = status_code
+        status.response_time = response_time
+        changed = True
+    return changed
+
+
+def _upsert_sql(model, columns, key_columns, rows):
+    qn = connection.ops.quote_name
+    placeholders = ", ".join(["(" + ", ".join(["%s"] * len(columns)) + ")"] * rows)
+    updates = [f"{qn(c)} = EXCLUDED.{qn(c)}" for c in columns if c not in key_columns]
+    return (
+        f"INSERT INTO {qn(model._meta.db_table)} ({', '.join(qn(c) for c in columns)}) VALUES {placeholders} "
+        f"ON CONFLICT ({', '.join(qn(c) for c in key_columns)}) DO UPDATE SET {', '.join(updates)}"
+    )
+
+
+def _save(model, objs, keys, names):
+    """
+    Write fields (names) of stored and locked objs, identified by unique fields (keys)
+    """
+    if not objs:
+        return
+    if connection.vendor not in UPSERT_VENDORS:
+        return model.objects.bulk_update(objs, names)
+    fields = [model._meta.get_field(name) for name in keys + names]
+    columns = [field.column for field in fields]
+    key_columns = columns[:len(keys)]
+    batch_size = connection.ops.bulk_batch_size(fields, objs) or len(objs)
+    with connection.cursor() as cursor:
+        for start in range(0, len(objs), batch_size):
+            batch = objs[start:start + batch_size]
+            params = [
+                field.get_db_prep_save(getattr(obj, field.attname), connection) for obj in batch for field in fields
+            ]
+            cursor.execute(_upsert_sql(model, columns, key_columns, len(batch)), params)
+
+
+def _apply_agent_statuses(latest):
+    """
+    Advance stored agent statuses with entries (see collect), returns a dict of endpoint_id -> [agents, agents_down,
+    changed_at] of changes to endpoint statuses
+    """
+    AgentStatus = models.EndpointAgentStatus
+    AgentStatus.objects.bulk_create(
+        [AgentStatus(endpoint_id=endpoint_id, agent_id=agent_ip) for endpoint_id, agent_ip in latest],
+        ignore_conflicts=True,
+    )
+    stored = locking.select_for_update(AgentStatus.objects, ('endpoint_id', 'agent_id'), latest)
+    changed = []
+    deltas = {}
+    for status in stored:
+        is_new, was_down = status.timestamp is None, status.failures > 0
+        if not advance(status, latest[status.endpoint_id, status.agent_id]):
+            continue
+        changed.append(status)
+        is_down = status.failures > 0
+        if is_new or is_down != was_down:
+            delta = deltas.setdefault(status.endpoint_id, [0, 0, status.changed_at])
+            delta[0] += is_new
+            delta[1] += is_down - was_down
+            delta[2] = max(delta[2], status.changed_at)
+    _save(AgentStatus, changed, ('endpoint', 'agent'), AGENT_STATUS_FIELDS)
+    return deltas
+
+
+def _apply_endpoint_statuses(deltas):
+    EndpointStatus = models.EndpointStatus
+    EndpointStatus.objects.bulk_create(
+        [EndpointStatus(endpoint_id=endpoint_id) for endpoint_id in deltas], ignore_conflicts=True,
+    )
+    changed = []
+    for status in EndpointStatus.objects.select_for_update().filter(endpoint_id__in=deltas).order_by('endpoint_id'):
+        agents, agents_down, changed_at = deltas[status.endpoint_id]
+        status.agents += agents
+        status.agents_down += agents_down
+        if changed_at is not None and (status.changed_at is None or changed_at > status.changed_at):
+            status.changed_at = changed_at
+        changed.append(status)
+    _save(EndpointStatus, changed, ('endpoint',), ENDPOINT_STATUS_FIELDS)
+    transaction.on_commit(lambda: versioning.bump(versioning.ENDPOINT_STATUSES))
+
+
+def record(results):
+    """
+    Update current states with ingested results, see collect for the format of results. Should be called in a
+    transaction
+    """
+    latest = collect(results)
+    if not latest:
+        return
+    deltas = _apply_agent_statuses(latest)
+    if deltas:
+        _apply_endpoint_statuses(deltas)
+
+
+def forget_agent(agent_ip):
+    """
+    Remove statuses of an agent (e.g. it's deleted) and take it out of statuses of endpoints, which keep their
+    changed_at. Should be called in a transaction
+    """
+    statuses = models.EndpointAgentStatus.objects.select_for_update().filter(agent_id=agent_ip)
+    deltas = {
+        endpoint_id: [-1, -(failures > 0), None]
+        for endpoint_id, failures in statuses.filter(timestamp__isnull=False).order_by('endpoint_id').values_list(
+            'endpoint_id', 'failures',
+        )
+    }
+    statuses.delete()
+    if deltas:
+        _apply_endpoint_statuses(deltas)
+
+
+def endpoints(down=None):
+    """
+    States of endpoints as dicts, of endpoints seen down by at least one agent if down, by none if down is False
+    """
+    queryset = models.EndpointStatus.objects.order_by()
+    if down is not None:
+        queryset = queryset.filter(agents_down__gt=0) if down else queryset.filter(agents_down=0)
+    return [
+        dict(endpoint=endpoint_id, agents=agents, agents_down=agents_down, changed_at=changed_at)
+        for endpoint_id, agents, agents_down, changed_at in queryset.values_list('endpoint_id', *ENDPOINT_STATUS_FIELDS)
+    ]
+
+
+def render_endpoints(down=None):
+    """
+    Rendered JSON list of endpoints(down), from the cache or rendered and cached
+    """
+    key = f"endpoint-statuses:{':'.join(versioning.get_versions(VERSION_NAMES))}:{down}"
+    content = cache.get(key)
+    if content is None:
+        content = JSONRenderer().render(endpoints(down))
+        cache.set(key, content, timeout=BOARD_CACHE_TIMEOUT)
+    return content
+
+
+def agents(endpoint_id):
+    """
+    EndpointAgentStatus rows of an endpoint as dicts
+    """
+    return models.EndpointAgentStatus.objects.filter(endpoint_id=endpoint_id).order_by('agent_id').values(
+        'agent_id', *AGENT_STATUS_FIELDS,
+    )
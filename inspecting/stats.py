@@ -0,0 +1,147 @@
+"""
+Statistics of results of an endpoint per time bucket (minute, hour or day, by timestamp of inspections), computed by
+the database: a single GROUP BY over results of the endpoint's inspections of the range (found with the
+(endpoint, timestamp) index of inspections), with conditional counts per connection status and class of status code,
+and min/avg/max of response time. Optionally also grouped by group of the agents which measured them.
+
+Buckets which are closed (ended STATS_CLOSE_DELAY ago, so late results are in) don't change anymore and are cached
+per bucket, a request only queries the database from the first bucket which isn't cached. Results which arrive later
+than STATS_CLOSE_DELAY are only counted once the cached bucket expires.
+
+Only results in the results table are counted: ranges which reach results that may be archived (see
+inspecting.archive) are rejected rather than counted as empty, health rollups (see inspecting.rollups) cover any range.
+"""
+from datetime import datetime, timedelta
+
+from django.core.cache import cache
+from django.db.models import Avg, Count, F, FloatField, Max, Min, Q
+from django.db.models.functions import Cast, Trunc
+
+from inspecting import archive, models
+
+MINUTE = "minute"
+HOUR = "hour"
+DAY = "day"
+BUCKET_SIZES = {MINUTE: timedelta(minutes=1), HOUR: timedelta(hours=1), DAY: timedelta(days=1)}
+
+STATUS_CLASSES = ('1xx', '2xx', '3xx', '4xx', '5xx')
+
+# Buckets with more than this are rejected, a coarser bucket size has to be used
+MAX_BUCKETS = 1500
+STATS_CLOSE_DELAY = timedelta(minutes=15)
+STATS_CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def bucket_start(timestamp, size):
+    if size == MINUTE:
+        return timestamp.replace(second=0, microsecond=0)
+    if size == HOUR:
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def buckets(after, before, size):
+    """
+    Starts of buckets of size which overlap [after, before)
+    """
+    bucket, step = bucket_start(after, size), BUCKET_SIZES[size]
+    while bucket < before:
+        yield bucket
+        bucket += step
+
+
+def first_bucket(size, now=None):
+    """
+    Start of the first bucket of size which can be counted, None if any can: results of inspections before
+    archive.horizon() may be archived
+    """
+    horizon = archive.horizon(now)
+    if horizon is None:
+        return None
+    start = bucket_start(horizon, size)
+    return start if start == horizon else start + BUCKET_SIZES[size]
+
+
+def _ratio(counted):
+    return Cast(counted, FloatField()) / Cast(F('attempts'), FloatField())
+
+
+def _aggregate(endpoint_id, after, before, size, by_group):
+    """
+    Rows of aggregated results of buckets (and groups of agents if by_group) in [after, before)
+    """
+    keys = ['bucket', 'group'] if by_group else ['bucket']
+    results = models.HTTPInspectionResult.objects.filter(
+        inspection__endpoint_id=endpoint_id,
+        inspection__timestamp__gte=after,
+        inspection__timestamp__lt=before,
+    ).order_by()
+    if by_group:
+        results = results.annotate(group=F('agent__groups'))
+    return results.annotate(bucket=Trunc('inspection__timestamp', size)).values(*keys).annotate(
+        attempts=Count('id'),
+        succeed=Count('id', filter=Q(connection_status="SUCCEED")),
+        timed_out=Count('id', filter=Q(connection_status="TIMED-OUT")),
+        **{
+            f'status_{status_class}': Count('id', filter=Q(
+                status_code__gte=int(status_class[0]) * 100, status_code__lt=(int(status_class[0]) + 1) * 100,
+            ))
+            for status_class in STATUS_CLASSES
+        },
+        response_time_min=Min('response_time'),
+        response_time_avg=Avg('response_time'),
+        response_time_max=Max('response_time'),
+    ).annotate(
+        success_ratio=_ratio('succeed'),
+        timeout_ratio=_ratio('timed_out'),
+    ).order_by(*keys)
+
+
+def _entry(row):
+    return dict(
+        attempts=row['attempts'],
+        success_ratio=row['success_ratio'],
+        timeout_ratio=row['timeout_ratio'],
+        status_classes={status_class: row[f'status_{status_class}'] for status_class in STATUS_CLASSES},
+        response_time_min=row['response_time_min'],
+        response_time_avg=row['response_time_avg'],
+        response_time_max=row['response_time_max'],
+    )
+
+
+def _cache_key(endpoint_id, size, by_group, bucket):
+    return f"endpoint-stats:{endpoint_id}:{size}:{int(by_group)}:{bucket.isoformat()}"
+
+
+def query(endpoint_id, after, before, size, by_group=False, now=None):
+    """
+    Statistics of an endpoint for buckets of size which overlap [after, before), a list of (bucket start, entry),
+    entries have a group too if by_group (one per group in a bucket). Empty buckets are left out.
+    Raises ValueError if after is before first_bucket(size).
+    """
+    now = now or datetime.now()
+    first = first_bucket(size, now)
+    if first is not None and after < first:
+        raise ValueError(f"after should be at least {first.isoformat()}, older results may be archived, "
+                         f"use health rollups for them")
+    starts = list(buckets(after, before, size))
+    closed = [bucket for bucket in starts if bucket + BUCKET_SIZES[size] + STATS_CLOSE_DELAY <= now]
+    keys = {bucket: _cache_key(endpoint_id, size, by_group, bucket) for bucket in closed}
+    stored = cache.get_many(keys.values())
+    cached = {bucket: stored[key] for bucket, key in keys.items() if key in stored}
+    first_missing = next((bucket for bucket in starts if bucket not in cached), None)
+
+    fetched = {}
+    if first_missing is not None:
+        for row in _aggregate(endpoint_id, first_missing, starts[-1] + BUCKET_SIZES[size], size, by_group):
+            entry = _entry(row)
+            if by_group:
+                entry['group'] = row['group']
+            fetched.setdefault(row['bucket'], []).append(entry)
+        # Closed buckets are cached even if they're empty, so they're not queried again
+        cache.set_many({
+            key: fetched.get(bucket, []) for bucket, key in keys.items() if bucket >= first_missing
+        }, timeout=STATS_CACHE_TIMEOUT)
+
+    entries = {**cached, **fetched}
+    return [(bucket, entry) for bucket in starts for entry in entries.get(bucket, ())]
@@ -1,62 +1,117 @@
-import traceback
 from datetime import timedelta, datetime
+from itertools import islice
 
 from celery import shared_task
-from inspecting import models
-from monitoring import models as monitoring_models
+from django.db import DatabaseError
+from django.db.models import Max
 
+from inspecting import archive, export, ingest, models, partitioning, schedule, workplans
+from monitoring import models as monitoring_models, versioning
 
-@shared_task
+# Endpoints whose last planned inspection is closer than this are topped up
+INSPECTION_GENERATION_MARGIN = timedelta(minutes=10)
+# How far in the future inspections are planned
+INSPECTION_GENERATION_HORIZON = timedelta(minutes=15)
+# Number of inspections inserted per statement
+INSPECTION_GENERATION_BATCH_SIZE = 5000
+
+
+@shared_task(acks_late=True, autoretry_for=(DatabaseError,), retry_backoff=True)
 def process_results(agent_ip, submission_time, results):
     """
     Very simple task to process list of inspection results.
-    In this version, it just save them in database and update agent last_activity
-
-    """
-    try:
-        agent = monitoring_models.Agent.objects.get(ip=agent_ip)
-        agent.last_activity = submission_time
-        agent.save()
-
-        models.HTTPInspectionResult.objects.bulk_create(
-            [models.HTTPInspectionResult(
-                inspection_id=r['inspection'],
-                agent=agent,
-                agent_ip=agent_ip,
-                connection_status=r['connection_status'],
-                status_code=r.get('status_code'),
-                response_time=r.get('response_time'),
-                byte_received=r.get('byte_received'),
-                submitted_at=submission_time,
-            ) for r in results]
-        )
-        # TODO watch for duplicates
-        # TODO Do we need to send notification?
-    except Exception as exp:
-        print(traceback.format_exc())
-        print(exp)
+    In this version, it just save them in database and update agent last_activity, see inspecting.ingest
+
+    Returns number of accepted, duplicate and rejected results.
+    Message is acknowledged after results are stored, database errors are retried.
+    """
+    return ingest.submit(agent_ip, submission_time, results)
+
+
+def _plan_inspections(now):
+    """
+    Yield the (unsaved) inspections which should be created to cover the next INSPECTION_GENERATION_HORIZON.
+
+    Latest planned timestamp of every endpoint is fetched with a single grouped query, only future inspections are
+    considered, so an endpoint without any upcoming inspection (new endpoint or a long pause in generation) starts
+    again from now instead of back-filling the past.
+    """
+    last_timestamps = dict(
+        models.Inspection.objects.filter(timestamp__gte=now).order_by().values('endpoint_id').annotate(
+            last_timestamp=Max('timestamp')
+        ).values_list('endpoint_id', 'last_timestamp')
+    )
+    margin = now + INSPECTION_GENERATION_MARGIN
+    endpoints = monitoring_models.Endpoint.objects.filter(monitoring_policy__isnull=False).order_by().values_list(
+        'id', 'monitoring_policy__interval'
+    )
+    for endpoint_id, interval in list(endpoints):
+        cur = last_timestamps.get(endpoint_id)
+        if cur is None:
+            cur = now
+            yield models.Inspection(endpoint_id=endpoint_id, timestamp=cur)
+        elif cur >= margin:
+            continue
+        interval = timedelta(seconds=interval)
+        while (cur - now) < INSPECTION_GENERATION_HORIZON:
+            cur += interval
+            yield models.Inspection(endpoint_id=endpoint_id, timestamp=cur)
 
 
 @shared_task
 def generate_inspections():
     """
-    Very simple inspection generator, this function will create future inspections to be used by the agents
+    Inspection generator, this function will create future inspections to be used by the agents
     should be called periodically
-    """
-    inspections = []
-    # TODO improve the loop and queries
 
+    Inspections are built in memory and inserted in chunks of INSPECTION_GENERATION_BATCH_SIZE, already existing
+    (endpoint, timestamp) pairs are skipped by the database, so overlapping runs are harmless.
+    Work plans of the upcoming buckets are cached afterwards, see inspecting.workplans.
+    Returns number of planned inspections.
+
+    With a virtual schedule (see inspecting.schedule) there is nothing to generate.
+    """
+    if schedule.is_virtual():
+        return 0
     now = datetime.now()
-    margin = now + timedelta(minutes=10)
-    for endpoint in monitoring_models.Endpoint.objects.select_related('monitoring_policy').all():
-        last_inspection = endpoint.inspections.last()
-        if last_inspection is None:
-            last_inspection = models.Inspection.objects.create(endpoint=endpoint, timestamp=now)
-        if last_inspection.timestamp >= margin:
-            continue
-        interval = timedelta(seconds=endpoint.monitoring_policy.interval)
-        cur = last_inspection.timestamp
-        while (cur - now) < timedelta(minutes=15):
-            cur += interval
-            inspections.append(models.Inspection(endpoint=endpoint, timestamp=cur))
-    models.Inspection.objects.bulk_create(inspections)  # TODO Check for dupicates
+    planned = _plan_inspections(now)
+    count = 0
+    while True:
+        chunk = list(islice(planned, INSPECTION_GENERATION_BATCH_SIZE))
+        if not chunk:
+            break
+        models.Inspection.objects.bulk_create(chunk, ignore_conflicts=True)
+        count += len(chunk)
+    if count:
+        versioning.bump(versioning.INSPECTIONS)
+    workplans.fill(now, now + INSPECTION_GENERATION_HORIZON)
+    return count
+
+
+@shared_task
+def maintain_partitions():
+    """
+    Create upcoming partitions of inspections and results and expire old ones, should be called periodically.
+    Does nothing unless partitioning is enabled, see inspecting.partitioning
+    """
+    return partitioning.maintain()
+
+
+@shared_task
+def archive_results():
+    """
+    Archive old results, should be called periodically.
+    Does nothing unless INSPECTION_RESULT_ARCHIVE_AFTER is set, see inspecting.archive
+    Returns number of archived results.
+    """
+    return archive.archive_expired()
+
+
+@shared_task
+def export_results():
+    """
+    Export closed days of results to files for analytics, should be called periodically.
+    Does nothing unless INSPECTION_RESULT_EXPORT_DIR is set, see inspecting.export
+    Returns number of exported results per day.
+    """
+    return {day.isoformat(): count for day, count in export.export_closed().items()}
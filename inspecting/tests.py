@@ -1,11 +1,33 @@
+import gzip
+import importlib.util
+import io
 import json
 import random
+import shutil
+import tempfile
+import threading
+import uuid
 from datetime import timedelta, datetime
+from decimal import Decimal
+from unittest import mock, skipUnless
 
+from celery.concurrency import get_implementation
+from django.core.cache import cache
+from django.core.management import call_command, CommandError
+from django.db import connection, transaction, DatabaseError
+from django.db.migrations.executor import MigrationExecutor
+from django.test import override_settings, SimpleTestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import ParseError, ValidationError
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
-from inspecting import models
-from monitoring import models as monitoring_models
+from inspecting import (
+    archive, checks, export, ingest, locking, models, parsers, partitioning, schedule, serializers, sketches, stats,
+    tasks, validation, workplans,
+)
+from monitoring import activity, identity, models as monitoring_models
 from monitoring.models import Agent
+from payeshgar_server.celery import configure_result_batching
 
 
 class InspectionTestingMixin:
@@ -86,7 +108,143 @@ class ReadingInspectionsTestCase(APITestCase, InspectionTestingMixin):
         distinct_result_count = len(set([i['id'] for i in inspections]))
         self.assertEquals(distinct_result_count, expected_count)
 
+    def test_keyset_pages_cover_the_window_once(self):
+        start = datetime(2020, 7, 7, 15, 30, 0)
+        # Inspections of different endpoints at the same timestamps, pages have to break ties by id
+        for endpoint in [self.sample_endpoint] + [self.create_endpoint([]) for _ in range(2)]:
+            self._create_sample_inspection(count=5, start_from=start, endpoint=endpoint)
+        filters = dict(after=start - timedelta(seconds=1), before=start + timedelta(minutes=5))
+        expected = self.client.get("/api/v1/inspecting/inspections", data=filters).json()
 
+        pages = []
+        response = self.client.get("/api/v1/inspecting/inspections", data=dict(filters, limit=4))
+        while True:
+            self.assertEquals(response.status_code, 200)
+            pages.append(response.json()['results'])
+            if response.json()['next'] is None:
+                break
+            response = self.client.get(response.json()['next'])
+
+        self.assertEquals([len(page) for page in pages], [4, 4, 4, 3])
+        self.assertEquals([i['id'] for page in pages for i in page], [i['id'] for i in expected])
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get("/api/v1/inspecting/inspections", data=dict(cursor="not-a-cursor"))
+
+        self.assertEquals(response.status_code, 404)
+
+    def test_inspections_are_streamed_as_ndjson(self):
+        self._create_sample_inspection()
+        expected = self.client.get("/api/v1/inspecting/inspections").json()
+
+        response = self.client.get("/api/v1/inspecting/inspections", HTTP_ACCEPT="application/x-ndjson")
+
+        self.assertTrue(response.streaming)
+        self.assertEquals(response['Content-Type'], "application/x-ndjson")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEquals([json.loads(line) for line in lines], expected)
+
+    def test_sparse_fields_and_columnar_inspections(self):
+        self._create_sample_inspection()
+        expected = self.client.get("/api/v1/inspecting/inspections").json()
+        # Rows are read with values_list(), items are just what the serializer makes of instances
+        self.assertEquals(expected, json.loads(JSONRenderer().render(serializers.InspectionSerializer(
+            models.Inspection.objects.order_by('timestamp', 'id')[1:], many=True,
+        ).data)))
+
+        response = self.client.get("/api/v1/inspecting/inspections", data=dict(fields="timestamp,id"))
+        self.assertEquals(response.json(), [dict(id=i['id'], timestamp=i['timestamp']) for i in expected])
+
+        response = self.client.get("/api/v1/inspecting/inspections", data=dict(shape="columns"))
+        self.assertEquals(response.json(), {name: [i[name] for i in expected] for name in expected[0]})
+
+        response = self.client.get("/api/v1/inspecting/inspections", data=dict(fields="endpoint", limit=5,
+                                                                               shape="columns"))
+        self.assertEquals(response.json()['results'], dict(endpoint=[i['endpoint'] for i in expected[:5]]))
+
+        response = self.client.get("/api/v1/inspecting/inspections", data=dict(fields="id"),
+                                   HTTP_ACCEPT="application/x-ndjson")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEquals([json.loads(line) for line in lines], [dict(id=i['id']) for i in expected])
+
+    def test_unknown_fields_and_shapes_are_rejected(self):
+        response = self.client.get("/api/v1/inspecting/inspections", data=dict(fields="id,secret"))
+        self.assertEquals(response.status_code, 400)
+        self.assertEquals(response.json(), dict(fields=["Unknown fields: secret"]))
+
+        response = self.client.get("/api/v1/inspecting/inspections", data=dict(shape="rows"))
+        self.assertEquals(response.status_code, 400)
+
+    def test_matching_etag_is_not_modified_until_inspections_are_generated(self):
+        cache.clear()
+        filters = dict(after=datetime(2020, 7, 7, 15, 30), before=datetime(2020, 7, 7, 15, 35), groups="asia")
+        etag = self.client.get("/api/v1/inspecting/inspections", data=filters)['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/v1/inspecting/inspections", data=filters, HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(response.status_code, 304)
+
+        tasks.generate_inspections()
+        response = self.client.get("/api/v1/inspecting/inspections", data=filters, HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(response.status_code, 200)
+
+
+class WorkPlanTestCase(APITestCase, InspectionTestingMixin):
+
+    def setUp(self):
+        cache.clear()
+        self.sample_endpoint = self.create_endpoint(group_names=["asia", "europe"])
+        self.bucket = datetime(2020, 7, 7, 15, 30)
+        self.window = dict(after=self.bucket, before=self.bucket + workplans.WORK_PLAN_BUCKET)
+
+    def _list(self, **params):
+        return self.client.get("/api/v1/inspecting/inspections", data=dict(params, groups="asia"))
+
+    def test_aligned_windows_are_served_from_cache(self):
+        self._create_sample_inspection(start_from=self.bucket + timedelta(seconds=1))
+        expected = self._list(**self.window, limit=100).json()['results']
+
+        self.assertEquals(self._list(**self.window).json(), expected)
+        with self.assertNumQueries(0):
+            response = self._list(**self.window)
+        self.assertEquals(response.json(), expected)
+        self.assertEquals(len(expected), 10)
+
+        unaligned = dict(after=self.bucket, before=self.bucket + timedelta(minutes=4))
+        self.assertEquals(len(self._list(**unaligned).json()), 8)
+
+    def test_generate_inspections_fills_work_plans_of_agents(self):
+        agent = Agent.objects.create(ip="10.0.0.1", name="agent-1")
+        agent.groups.add("asia")
+        tasks.generate_inspections()
+        bucket = workplans.bucket_of(datetime.now())
+        window = dict(after=bucket, before=bucket + workplans.WORK_PLAN_BUCKET)
+
+        with self.assertNumQueries(0):
+            response = self._list(**window)
+        self.assertEquals(response.json(), self._list(**window, limit=100).json()['results'])
+
+    def test_columnar_work_plans_are_cached_on_their_own(self):
+        self._create_sample_inspection(start_from=self.bucket + timedelta(seconds=1))
+        expected = self._list(**self.window).json()
+
+        self.assertEquals(self._list(**self.window, fields="id", shape="columns").json(),
+                          dict(id=[i['id'] for i in expected]))
+        with self.assertNumQueries(0):
+            response = self._list(**self.window, fields="id", shape="columns")
+        self.assertEquals(response.json(), dict(id=[i['id'] for i in expected]))
+        self.assertEquals(self._list(**self.window).json(), expected)
+
+    def test_policy_changes_invalidate_work_plans(self):
+        self._create_sample_inspection(start_from=self.bucket + timedelta(seconds=1))
+        self.assertEquals(len(self._list(**self.window).json()), 10)
+
+        self.sample_endpoint.monitoring_policy.groups.remove("asia")
+
+        self.assertEquals(self._list(**self.window).json(), [])
+
+
+@override_settings(INSPECTION_RESULT_INGESTION="sync")
 class SubmitInspectionResultTestCase(APITestCase, InspectionTestingMixin):
 
     def setUp(self):
@@ -173,3 +331,1288 @@ class SubmitInspectionResultTestCase(APITestCase, InspectionTestingMixin):
 
         self.assertEquals(response.status_code, 401)
 
+    def test_submit_results_in_sync_mode_should_store_them_right_away(self):
+        self._create_sample_inspection()
+        sample_inspection_id = models.Inspection.objects.first().id
+
+        body = json.dumps([{'inspection': str(sample_inspection_id), 'connection_status': "SUCCEED"}])
+        response = self.client.post("/api/v1/inspecting/inspection-results", data=body, content_type='application/json')
+
+        self.assertEquals(response.status_code, 200)
+        self.assertIn('submission', response.json())
+        self.assertEquals(response.json()['accepted'], 1)
+        self.assertEquals(models.HTTPInspectionResult.objects.count(), 1)
+
+    @override_settings(INSPECTION_RESULT_INGESTION="async")
+    def test_submit_results_in_async_mode_should_only_queue_them(self):
+        self._create_sample_inspection()
+        sample_inspection_id = models.Inspection.objects.first().id
+
+        body = json.dumps([{'inspection': str(sample_inspection_id), 'connection_status': "SUCCEED"}])
+        with mock.patch.object(tasks.process_results, 'apply_async') as apply_async:
+            response = self.client.post("/api/v1/inspecting/inspection-results", data=body,
+                                        content_type='application/json')
+
+        self.assertEquals(response.status_code, 202)
+        self.assertEquals(apply_async.call_args[1]['task_id'], response.json()['submission'])
+        self.assertEquals(apply_async.call_args[1]['kwargs']['agent_ip'], "127.0.0.1")
+        self.assertFalse(models.HTTPInspectionResult.objects.exists())
+
+
+@override_settings(INSPECTION_RESULT_INGESTION="sync")
+class SubmitCompactResultsTestCase(APITestCase, InspectionTestingMixin):
+
+    def setUp(self):
+        self.sample_endpoint = self.create_endpoint(group_names=["asia"])
+        Agent.objects.create(ip="127.0.0.1", name="Local", country="NWR")
+        self._create_sample_inspection(count=3)
+        self.inspection_ids = list(models.Inspection.objects.values_list('id', flat=True))
+
+    def _post(self, body, content_type, **extra):
+        return self.client.post("/api/v1/inspecting/inspection-results", data=body, content_type=content_type,
+                                **extra)
+
+    def _assert_stored(self, response):
+        self.assertEquals(response.status_code, 200, response.content)
+        self.assertEquals(response.json()['accepted'], 3)
+        self.assertEquals(
+            set(models.HTTPInspectionResult.objects.values_list('inspection_id', 'connection_status')),
+            {(inspection_id, "TIMED-OUT") for inspection_id in self.inspection_ids},
+        )
+
+    def test_gzipped_json_is_accepted(self):
+        body = json.dumps([{'inspection': str(i), 'connection_status': "TIMED-OUT"} for i in self.inspection_ids])
+        response = self._post(gzip.compress(body.encode()), 'application/json', HTTP_CONTENT_ENCODING='gzip')
+        self._assert_stored(response)
+
+    @skipUnless(importlib.util.find_spec('zstandard'), "zstandard is not installed")
+    def test_zstd_compressed_json_is_accepted(self):
+        import zstandard
+        body = json.dumps([{'inspection': str(i), 'connection_status': "TIMED-OUT"} for i in self.inspection_ids])
+        response = self._post(zstandard.ZstdCompressor().compress(body.encode()), 'application/json',
+                              HTTP_CONTENT_ENCODING='zstd')
+        self._assert_stored(response)
+
+    def test_columnar_json_is_expanded_to_rows(self):
+        body = json.dumps({
+            'inspection': [str(i) for i in self.inspection_ids],
+            'connection_status': [parsers.CONNECTION_STATUS_CODES.index("TIMED-OUT")] * 3,
+        })
+        response = self._post(body, parsers.ColumnarJSONParser.media_type)
+        self._assert_stored(response)
+
+    def test_columnar_json_with_columns_of_different_lengths_should_return_400(self):
+        body = json.dumps({'inspection': [str(i) for i in self.inspection_ids], 'connection_status': [0]})
+        response = self._post(body, parsers.ColumnarJSONParser.media_type)
+        self.assertEquals(response.status_code, 400)
+
+    @skipUnless(importlib.util.find_spec('msgpack'), "msgpack is not installed")
+    def test_msgpack_with_binary_ids_is_accepted(self):
+        import msgpack
+        body = msgpack.packb({
+            'inspection': [i.bytes for i in self.inspection_ids],
+            'connection_status': [parsers.CONNECTION_STATUS_CODES.index("TIMED-OUT")] * 3,
+        })
+        response = self._post(gzip.compress(body), parsers.MsgPackParser.media_type, HTTP_CONTENT_ENCODING='gzip')
+        self._assert_stored(response)
+
+    def test_corrupted_or_unknown_encodings_are_rejected(self):
+        response = self._post(b"not gzipped", 'application/json', HTTP_CONTENT_ENCODING='gzip')
+        self.assertEquals(response.status_code, 400)
+        response = self._post(b"[]", 'application/json', HTTP_CONTENT_ENCODING='br')
+        self.assertEquals(response.status_code, 415)
+
+    def test_formats_of_missing_packages_tell_what_is_missing(self):
+        with mock.patch.dict('sys.modules', {'msgpack': None, 'zstandard': None}):
+            msgpack_response = self._post(b"\x90", parsers.MsgPackParser.media_type)
+            zstd_response = self._post(b"[]", 'application/json', HTTP_CONTENT_ENCODING='zstd')
+
+        self.assertEquals((msgpack_response.status_code, zstd_response.status_code), (415, 415))
+        self.assertIn("msgpack is not installed", msgpack_response.json()['detail'])
+        self.assertIn("zstandard is not installed", zstd_response.json()['detail'])
+
+    @override_settings(INSPECTION_RESULT_CHUNK_SIZE=2)
+    def test_large_submissions_are_ingested_in_chunks(self):
+        body = json.dumps([{'inspection': str(i), 'connection_status': "TIMED-OUT"} for i in self.inspection_ids])
+        with mock.patch.object(tasks, 'process_results', wraps=tasks.process_results) as process_results:
+            response = self._post(gzip.compress(body.encode()), 'application/json', HTTP_CONTENT_ENCODING='gzip')
+
+        self._assert_stored(response)
+        self.assertEquals(response.json()['chunks'], 2)
+        self.assertEquals([len(c[1]['results']) for c in process_results.call_args_list], [2, 1])
+
+    @override_settings(INSPECTION_RESULT_CHUNK_SIZE=2, INSPECTION_RESULT_INGESTION="async")
+    def test_chunks_are_queued_as_separate_tasks(self):
+        body = json.dumps([{'inspection': str(i), 'connection_status': "TIMED-OUT"} for i in self.inspection_ids])
+        with mock.patch.object(tasks.process_results, 'apply_async') as apply_async:
+            response = self._post(body, 'application/json')
+
+        submission = response.json()['submission']
+        self.assertEquals(response.status_code, 202)
+        self.assertEquals([c[1]['task_id'] for c in apply_async.call_args_list], [submission, f"{submission}.1"])
+
+    @override_settings(INSPECTION_RESULT_INGESTION="async")
+    def test_bodies_which_are_not_lists_are_rejected_before_queueing(self):
+        bodies = [(b"1", 'application/json')]
+        if importlib.util.find_spec('msgpack'):
+            import msgpack
+            bodies.append((msgpack.packb(1), parsers.MsgPackParser.media_type))
+        with mock.patch.object(tasks.process_results, 'apply_async') as apply_async:
+            for body, content_type in bodies:
+                self.assertEquals(self._post(body, content_type).status_code, 400)
+                self.assertEquals(self._post(body, content_type, QUERY_STRING="validate=1").status_code, 400)
+        self.assertFalse(apply_async.called)
+
+    @override_settings(INSPECTION_RESULT_INGESTION="async")
+    def test_empty_submissions_get_zero_counts_without_a_submission(self):
+        with mock.patch.object(tasks.process_results, 'apply_async') as apply_async:
+            response = self._post(b"[]", 'application/json')
+
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(response.json(), dict(chunks=0, accepted=0, duplicate=0, rejected=0))
+        self.assertFalse(apply_async.called)
+
+    @override_settings(INSPECTION_RESULT_MAX_BODY_SIZE=100)
+    def test_too_large_bodies_should_return_413(self):
+        body = json.dumps([{'inspection': str(i), 'connection_status': "TIMED-OUT"} for i in self.inspection_ids])
+        for content_type in ('application/json', parsers.ColumnarJSONParser.media_type):
+            response = self._post(gzip.compress(body.encode()), content_type, HTTP_CONTENT_ENCODING='gzip')
+            self.assertEquals(response.status_code, 413)
+        self.assertFalse(models.HTTPInspectionResult.objects.exists())
+
+
+class IterJsonArrayTestCase(SimpleTestCase):
+
+    def _parse(self, body, read_size=3):
+        return list(parsers.iter_json_array(io.BytesIO(body.encode()), read_size=read_size))
+
+    def test_items_are_parsed_across_reads(self):
+        items = [{'inspection': "a", 'response_time': 12.125}, 1234567, "مثل", [], None]
+        self.assertEquals(self._parse(json.dumps(items)), items)
+        self.assertEquals(self._parse(" [ 1 ,\n 22 ] \n"), [1, 22])
+        self.assertEquals(self._parse("[]"), [])
+
+    def test_malformed_bodies_are_rejected(self):
+        for body in ('{"inspection": "a"}', '[1, 2', '[1 2]', '[1,]', '[1] 2', '[NaN]', ''):
+            with self.subTest(body=body), self.assertRaises(ParseError):
+                self._parse(body)
+
+
+class GenerateInspectionsTestCase(APITestCase, InspectionTestingMixin):
+
+    def test_generate_inspections_for_new_endpoints(self):
+        endpoint = self.create_endpoint(group_names=["asia"])
+
+        tasks.generate_inspections()
+
+        inspections = models.Inspection.objects.filter(endpoint=endpoint)
+        # the first one is now, then one every 30 seconds for the next 15 minutes
+        self.assertEquals(inspections.count(), 31)
+
+    def test_generate_inspections_twice_should_not_create_duplicates(self):
+        endpoint = self.create_endpoint(group_names=["asia"])
+
+        tasks.generate_inspections()
+        tasks.generate_inspections()
+
+        self.assertEquals(models.Inspection.objects.filter(endpoint=endpoint).count(), 31)
+
+    def test_generate_inspections_should_continue_from_the_last_inspection(self):
+        endpoint = self.create_endpoint(group_names=["asia"])
+        last_timestamp = datetime.now() + timedelta(minutes=2)
+        models.Inspection.objects.create(endpoint=endpoint, timestamp=last_timestamp)
+
+        tasks.generate_inspections()
+
+        timestamps = list(models.Inspection.objects.filter(endpoint=endpoint).values_list('timestamp', flat=True))
+        self.assertEquals(timestamps[0], last_timestamp)
+        self.assertTrue(all(b - a == timedelta(seconds=30) for a, b in zip(timestamps, timestamps[1:])))
+
+    def test_generate_inspections_query_count_does_not_depend_on_number_of_endpoints(self):
+        self.create_endpoint(group_names=["asia"])
+        with CaptureQueriesContext(connection) as few_endpoints:
+            tasks.generate_inspections()
+
+        models.Inspection.objects.all().delete()
+        for i in range(5):
+            endpoint = monitoring_models.Endpoint.objects.create(name=f'generated-endpoint-{i}')
+            monitoring_models.MonitoringPolicy.objects.create(endpoint=endpoint)
+        with CaptureQueriesContext(connection) as more_endpoints:
+            tasks.generate_inspections()
+
+        self.assertEquals(len(few_endpoints), len(more_endpoints))
+
+
+@override_settings(INSPECTION_SCHEDULE="virtual", INSPECTION_RESULT_INGESTION="sync")
+class VirtualScheduleTestCase(APITestCase, InspectionTestingMixin):
+
+    def setUp(self):
+        self.sample_endpoint = self.create_endpoint(group_names=["asia"])
+        self.anchor = datetime(2020, 7, 7, 15, 30, 0)
+        monitoring_models.MonitoringPolicy.objects.filter(endpoint=self.sample_endpoint).update(
+            anchor=self.anchor, interval=5
+        )
+        self.agent = Agent.objects.create(ip="127.0.0.1", name="Local", country="NWR")
+
+    def _list_inspections(self, **filters):
+        response = self.client.get("/api/v1/inspecting/inspections", data=filters)
+        self.assertEquals(response.status_code, 200)
+        return response.json()
+
+    def test_list_inspections_are_computed_from_policy(self):
+        inspections = self._list_inspections(
+            after=self.anchor + timedelta(seconds=2),
+            before=self.anchor + timedelta(seconds=31),
+        )
+
+        # 5, 10, 15, 20, 25 and 30 seconds after the anchor
+        self.assertEquals(len(inspections), 6)
+        self.assertFalse(models.Inspection.objects.exists())
+
+    def test_slots_are_counted_without_computing_them(self):
+        for after, before in ((-10, 31), (2, 30), (5, 5), (0, 0), (40, 20), (-20, -5)):
+            after, before = self.anchor + timedelta(seconds=after), self.anchor + timedelta(seconds=before)
+            self.assertEquals(schedule.count_slots(self.anchor, 5, after, before),
+                              len(list(schedule.iter_slots(self.anchor, 5, after, before))))
+
+    def test_too_long_windows_are_rejected(self):
+        response = self.client.get("/api/v1/inspecting/inspections",
+                                   data=dict(after=self.anchor, before=datetime(2100, 1, 1), limit=10))
+
+        self.assertEquals(response.status_code, 400)
+
+    def test_computed_inspections_are_paginated_too(self):
+        filters = dict(after=self.anchor + timedelta(seconds=2), before=self.anchor + timedelta(seconds=31))
+        first = self._list_inspections(limit=4, **filters)
+        second = self.client.get(first['next']).json()
+
+        self.assertEquals(len(first['results']), 4)
+        self.assertEquals(second['next'], None)
+        self.assertEquals([i['id'] for i in first['results'] + second['results']],
+                          [i['id'] for i in self._list_inspections(**filters)])
+
+    def test_list_inspections_ids_are_deterministic(self):
+        filters = dict(after=self.anchor, before=self.anchor + timedelta(minutes=1))
+        first_ids = [i['id'] for i in self._list_inspections(**filters)]
+        second_ids = [i['id'] for i in self._list_inspections(**filters)]
+
+        self.assertEquals(first_ids, second_ids)
+        self.assertEquals(len(set(first_ids)), len(first_ids))
+
+    def test_list_inspections_for_other_groups(self):
+        inspections = self._list_inspections(
+            after=self.anchor, before=self.anchor + timedelta(minutes=1), groups=["europe"]
+        )
+        self.assertEquals(len(inspections), 0)
+
+    def test_submitting_a_result_should_store_the_inspection(self):
+        inspection = self._list_inspections(after=self.anchor, before=self.anchor + timedelta(seconds=6))[0]
+        body = json.dumps([
+            {
+                'inspection': inspection['id'],
+                'endpoint': inspection['endpoint'],
+                'timestamp': inspection['timestamp'],
+                'connection_status': "SUCCEED",
+                'status_code': 200,
+                'response_time': 0.128,
+                'byte_received': 2048
+            }
+        ])
+        response = self.client.post("/api/v1/inspecting/inspection-results?validate=1", data=body,
+                                    content_type='application/json')
+
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(models.Inspection.objects.get().id, uuid.UUID(inspection['id']))
+        self.assertEquals(models.HTTPInspectionResult.objects.count(), 1)
+
+    def test_submitting_a_result_with_a_forged_inspection_id_should_be_rejected(self):
+        inspection = self._list_inspections(after=self.anchor, before=self.anchor + timedelta(seconds=6))[0]
+        body = json.dumps([
+            {
+                'inspection': str(uuid.uuid4()),
+                'endpoint': inspection['endpoint'],
+                'timestamp': inspection['timestamp'],
+                'connection_status': "SUCCEED",
+            }
+        ])
+        response = self.client.post("/api/v1/inspecting/inspection-results?validate=1", data=body,
+                                    content_type='application/json')
+
+        self.assertEquals(response.status_code, 400)
+        self.assertFalse(models.Inspection.objects.exists())
+
+    def test_generate_inspections_does_nothing(self):
+        tasks.generate_inspections()
+        self.assertFalse(models.Inspection.objects.exists())
+
+
+class ResultBatcherTestCase(SimpleTestCase):
+
+    def _store_into(self, stored):
+        def store(submissions):
+            stored.append(submissions)
+            return [dict(accepted=len(results)) for _, _, results in submissions]
+
+        return store
+
+    def _submit_concurrently(self, batcher, submissions):
+        errors = []
+
+        def submit(submission):
+            try:
+                batcher.submit(*submission)
+            except Exception as exp:
+                errors.append(exp)
+
+        threads = [threading.Thread(target=submit, args=(submission,)) for submission in submissions]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=5)
+        return errors
+
+    def test_full_batch_is_stored_at_once(self):
+        stored = []
+        batcher = ingest.ResultBatcher(store=self._store_into(stored), max_rows=4, max_age=5)
+        submissions = [(f"10.0.0.{i}", datetime.now(), [{}, {}]) for i in range(2)]
+
+        errors = self._submit_concurrently(batcher, submissions)
+
+        self.assertEquals(errors, [])
+        self.assertEquals(len(stored), 1)
+        self.assertCountEqual(stored[0], submissions)
+
+    def test_old_batch_is_stored_even_if_it_is_not_full(self):
+        stored = []
+        batcher = ingest.ResultBatcher(store=self._store_into(stored), max_rows=100, max_age=0.01)
+
+        counts = batcher.submit("10.0.0.1", datetime.now(), [{}])
+
+        self.assertEquals(len(stored), 1)
+        self.assertEquals(counts, dict(accepted=1))
+
+    @override_settings(INSPECTION_RESULT_BATCHING=True, INSPECTION_RESULT_BATCH_MAX_AGE=5)
+    def test_batches_are_not_waited_for_with_a_pool_which_runs_a_task_at_a_time(self):
+        self.addCleanup(ingest.configure_worker, get_implementation('threads'), 8)
+        for pool, concurrency, max_age in (('prefork', 8, 0), ('solo', 1, 0), ('threads', 1, 0), ('threads', 8, 5)):
+            with self.subTest(pool=pool, concurrency=concurrency), self.assertLogs(ingest.logger) as logs:
+                configure_result_batching(sender=mock.Mock(pool_cls=pool, concurrency=concurrency))
+                ingest.logger.info("configured")
+
+                self.assertEquals(ingest.get_batcher().max_age, max_age)
+                self.assertEquals(len(logs.records), 1 if max_age else 2)
+
+    def test_store_error_is_raised_for_every_submitter(self):
+        def store(submissions):
+            raise DatabaseError("database is gone")
+
+        batcher = ingest.ResultBatcher(store=store, max_rows=3, max_age=5)
+        submissions = [(f"10.0.0.{i}", datetime.now(), [{}]) for i in range(3)]
+
+        errors = self._submit_concurrently(batcher, submissions)
+
+        self.assertEquals(len(errors), 3)
+
+
+class StoreSubmissionsTestCase(APITestCase, InspectionTestingMixin):
+
+    def setUp(self):
+        cache.clear()
+        identity.clear_local()
+        self.sample_endpoint = self.create_endpoint(group_names=["asia"])
+        self._create_sample_inspection()
+        self.inspection_ids = list(models.Inspection.objects.values_list('id', flat=True))
+        self.agents = [Agent.objects.create(ip=f"10.0.0.{i}", name=f"agent-{i}") for i in range(3)]
+
+    def test_results_of_several_submissions_are_stored_together(self):
+        submission_time = datetime.now()
+        submissions = [
+            (agent.ip, submission_time, [
+                {'inspection': inspection_id, 'connection_status': "SUCCEED"} for inspection_id in self.inspection_ids
+            ]) for agent in self.agents
+        ]
+
+        ingest.store_submissions(submissions)
+
+        self.assertEquals(models.HTTPInspectionResult.objects.count(), len(self.agents) * len(self.inspection_ids))
+        activity.flush()
+        self.assertTrue(all(a.last_activity == submission_time for a in Agent.objects.all()))
+
+    def test_resubmitting_results_should_skip_duplicates(self):
+        results = [{'inspection': str(inspection_id), 'connection_status': "SUCCEED"}
+                   for inspection_id in self.inspection_ids]
+
+        first = ingest.store_submissions([("10.0.0.1", datetime.now(), results)])
+        second = ingest.store_submissions([("10.0.0.1", datetime.now(), results + results)])
+
+        self.assertEquals(first, [dict(accepted=len(results), duplicate=0, rejected=0)])
+        self.assertEquals(second, [dict(accepted=0, duplicate=2 * len(results), rejected=0)])
+        self.assertEquals(models.HTTPInspectionResult.objects.count(), len(results))
+
+    def test_results_stored_concurrently_are_neither_counted_nor_aggregated(self):
+        insert_results = ingest.insert_results
+
+        def insert_concurrently(rows):
+            # Another worker stores the same results after they were looked up
+            ingest.bulk_create_backend(rows)
+            return insert_results(rows)
+
+        results = [{'inspection': str(self.inspection_ids[0]), 'connection_status': "SUCCEED"}]
+        for backend in ingest.STORAGE_BACKENDS:
+            models.HTTPInspectionResult.objects.all().delete()
+            with override_settings(INSPECTION_RESULT_STORAGE_BACKEND=backend), \
+                    mock.patch.object(ingest, 'insert_results', insert_concurrently):
+                counts = ingest.store_submissions([("10.0.0.1", datetime.now(), results)])
+
+            self.assertEquals(counts, [dict(accepted=0, duplicate=1, rejected=0)])
+            self.assertEquals(models.HTTPInspectionResult.objects.count(), 1)
+            self.assertFalse(models.EndpointHealthRollup.objects.exists())
+            self.assertFalse(models.EndpointAgentStatus.objects.exists())
+
+    def test_invalid_results_and_unknown_inspections_are_rejected_one_by_one(self):
+        results = [
+            {'inspection': str(self.inspection_ids[0]), 'connection_status': "SUCCEED", 'status_code': 200,
+             'response_time': 0.128, 'byte_received': 2048},
+            {'inspection': str(uuid.uuid4()), 'connection_status': "SUCCEED"},
+            {'inspection': str(self.inspection_ids[1]), 'connection_status': "UNKNOWN"},
+            {'inspection': str(self.inspection_ids[2]), 'connection_status': "SUCCEED", 'response_time': "slow"},
+            "not a result",
+        ]
+
+        counts = ingest.store_submissions([("10.0.0.1", datetime.now(), results)])
+
+        self.assertEquals(counts, [dict(accepted=1, duplicate=0, rejected=4)])
+        self.assertEquals(models.HTTPInspectionResult.objects.get().inspection_id, self.inspection_ids[0])
+
+    def test_counts_are_reported_per_submission(self):
+        result = {'inspection': str(self.inspection_ids[0]), 'connection_status': "SUCCEED"}
+
+        counts = ingest.store_submissions([
+            ("10.0.0.1", datetime.now(), [result]),
+            ("10.0.0.1", datetime.now(), [result]),
+            ("10.0.0.2", datetime.now(), [result]),
+        ])
+
+        self.assertEquals(counts, [
+            dict(accepted=1, duplicate=0, rejected=0),
+            dict(accepted=0, duplicate=1, rejected=0),
+            dict(accepted=1, duplicate=0, rejected=0),
+        ])
+
+    @override_settings(INSPECTION_RESULT_STORAGE_BACKEND="copy")
+    def test_copy_backend_falls_back_to_bulk_create_on_other_databases(self):
+        ingest.store_submissions([
+            ("10.0.0.1", datetime.now(), [{'inspection': self.inspection_ids[0], 'connection_status': "SUCCEED"}]),
+        ])
+
+        self.assertEquals(models.HTTPInspectionResult.objects.count(), 1)
+
+    def test_results_of_unknown_agents_are_dropped(self):
+        ingest.store_submissions([
+            ("10.0.0.99", datetime.now(), [{'inspection': self.inspection_ids[0], 'connection_status': "SUCCEED"}]),
+            ("10.0.0.1", datetime.now(), [{'inspection': self.inspection_ids[0], 'connection_status': "SUCCEED"}]),
+        ])
+
+        self.assertEquals(models.HTTPInspectionResult.objects.get().agent_ip, "10.0.0.1")
+
+    def test_compact_columns_keep_values_of_results(self):
+        ingest.store_submissions([("10.0.0.1", datetime.now(), [
+            {'inspection': str(self.inspection_ids[0]), 'connection_status': "SUCCEED", 'status_code': "404",
+             'response_time': "12.345", 'byte_received': 2048},
+            {'inspection': str(self.inspection_ids[1]), 'connection_status': "TIMED-OUT"},
+        ])])
+
+        results = models.HTTPInspectionResult.objects.order_by('connection_status')
+        self.assertEquals(
+            list(results.values_list('connection_status', 'status_code', 'response_time')),
+            [("SUCCEED", "404", Decimal("12.345")), ("TIMED-OUT", None, None)],
+        )
+        self.assertEquals(results.get(connection_status="TIMED-OUT").inspection_id, self.inspection_ids[1])
+        self.assertEquals(results.get(response_time__gt=Decimal("12.3")).inspection_id, self.inspection_ids[0])
+        table = models.HTTPInspectionResult._meta.db_table
+        columns = "connection_status, status_code, response_time_us"
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT {columns} FROM {table} WHERE status_code > 0")
+            self.assertEquals(cursor.fetchone(), (0, 404, 12345000))
+
+    def test_results_keep_their_agent_after_it_is_deleted(self):
+        ingest.store_submissions([
+            ("10.0.0.1", datetime.now(), [{'inspection': self.inspection_ids[0], 'connection_status': "SUCCEED"}]),
+        ])
+
+        Agent.objects.filter(ip="10.0.0.1").delete()
+
+        self.assertEquals(models.HTTPInspectionResult.objects.get().agent_ip, "10.0.0.1")
+
+
+class CompactResultsMigrationTestCase(TransactionTestCase):
+    before = [('inspecting', '0005_latencysketch')]
+    after = [('inspecting', '0008_compact_http_results')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        executor.loader.build_graph()
+        return executor.loader.project_state(targets).apps
+
+    def setUp(self):
+        apps = self.migrate(self.before)
+        Agent = apps.get_model('monitoring', 'Agent')
+        Inspection = apps.get_model('inspecting', 'Inspection')
+        Result = apps.get_model('inspecting', 'HTTPInspectionResult')
+        agent = Agent.objects.create(ip="10.0.0.1", name="agent-1")
+        endpoint = apps.get_model('monitoring', 'Endpoint').objects.create(name="endpoint")
+        inspection = Inspection.objects.create(endpoint=endpoint, timestamp=datetime(2026, 10, 1, 12, 0))
+        Result.objects.create(inspection=inspection, agent=agent, agent_ip=agent.ip, connection_status="SUCCEED",
+                              status_code="200", response_time=Decimal("0.128"))
+        # Result of a deleted agent with a status code which isn't a number
+        Result.objects.create(inspection=inspection, agent=None, agent_ip="10.0.0.2", connection_status="SUCCEED",
+                              status_code="abc")
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_results_are_compacted_and_expanded_back(self):
+        Result = self.migrate(self.after).get_model('inspecting', 'HTTPInspectionResult')
+        self.assertEquals(
+            sorted(Result.objects.values_list('agent_id', 'connection_status', 'status_code', 'response_time')),
+            [("10.0.0.1", "SUCCEED", "200", Decimal("0.128")), ("10.0.0.2", "SUCCEED", None, None)],
+        )
+
+        Result = self.migrate(self.before).get_model('inspecting', 'HTTPInspectionResult')
+        self.assertEquals(
+            sorted(Result.objects.values_list('agent_ip', 'agent_id', 'connection_status', 'status_code')),
+            [("10.0.0.1", "10.0.0.1", "SUCCEED", "200"), ("10.0.0.2", None, "SUCCEED", None)],
+        )
+
+
+class EndpointHealthRollupTestCase(APITestCase, InspectionTestingMixin):
+
+    def setUp(self):
+        cache.clear()
+        identity.clear_local()
+        self.sample_endpoint = self.create_endpoint(group_names=["asia"])
+        Agent.objects.create(ip="10.0.0.1", name="agent-1")
+        Agent.objects.create(ip="10.0.0.2", name="agent-2")
+        self.start = datetime(2026, 10, 18, 12, 0)
+        self._create_sample_inspection(count=4, start_from=self.start, interval=timedelta(seconds=40))
+        self.inspections = list(models.Inspection.objects.all())
+
+    def _result(self, inspection, connection_status="SUCCEED", status_code=200, response_time=0.1):
+        return {'inspection': str(inspection.id), 'connection_status': connection_status, 'status_code': status_code,
+                'response_time': response_time, 'byte_received': 1000}
+
+    def test_rollups_are_updated_incrementally(self):
+        ingest.store_submissions([("10.0.0.1", datetime.now(), [
+            self._result(self.inspections[0], response_time=0.2),
+            self._result(self.inspections[1], status_code=503, response_time=0.4),
+        ])])
+        ingest.store_submissions([("10.0.0.2", datetime.now(), [
+            self._result(self.inspections[1], response_time=0.1),
+            self._result(self.inspections[2], connection_status="TIMED-OUT", status_code=None, response_time=None),
+        ])])
+
+        minutes = models.EndpointHealthRollup.objects.filter(resolution=models.EndpointHealthRollup.MINUTE)
+        self.assertEquals([(r.bucket.minute, r.attempts) for r in minutes], [(0, 3), (1, 1)])
+        hour = models.EndpointHealthRollup.objects.get(resolution=models.EndpointHealthRollup.HOUR)
+        self.assertEquals(hour.bucket, self.start)
+        self.assertEquals((hour.attempts, hour.succeed, hour.timed_out), (4, 3, 1))
+        self.assertEquals((hour.status_2xx, hour.status_5xx), (2, 1))
+        self.assertEquals(hour.response_time_count, 3)
+        self.assertEquals(
+            (hour.response_time_sum, hour.response_time_min, hour.response_time_max),
+            (Decimal("0.7"), Decimal("0.1"), Decimal("0.4")),
+        )
+        self.assertEquals(hour.byte_received_sum, 4000)
+        days = models.EndpointHealthRollup.objects.filter(resolution=models.EndpointHealthRollup.DAY)
+        self.assertEquals(days.count(), 1)
+
+    def test_duplicates_and_rejected_results_are_not_rolled_up(self):
+        submission = ("10.0.0.1", datetime.now(), [self._result(self.inspections[0]), {'inspection': "invalid"}])
+        ingest.store_submissions([submission])
+        ingest.store_submissions([submission])
+
+        hour = models.EndpointHealthRollup.objects.get(resolution=models.EndpointHealthRollup.HOUR)
+        self.assertEquals(hour.attempts, 1)
+
+    def test_health_api_chooses_the_coarsest_resolution_which_fits_the_range(self):
+        ingest.store_submissions([("10.0.0.1", datetime.now(), [self._result(i) for i in self.inspections])])
+        url = f"/api/v1/inspecting/endpoints/{self.sample_endpoint.id}/health"
+
+        response = self.client.get(url, data={'after': "2026-10-12T00:00:00", 'before': "2026-10-19T00:00:00"})
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(response.json()['resolution'], "hour")
+        self.assertEquals([(b['bucket'], b['attempts']) for b in response.json()['buckets']],
+                          [("2026-10-18T12:00:00", 4)])
+
+        response = self.client.get(url, data={'after': "2026-10-18T11:30:00", 'before': "2026-10-18T12:30:00"})
+        self.assertEquals(response.json()['resolution'], "minute")
+        self.assertEquals([b['attempts'] for b in response.json()['buckets']], [2, 1, 1])
+        self.assertEquals(response.json()['buckets'][0]['success_rate'], 1)
+
+        response = self.client.get(url, data={'before': "2026-10-19T00:00:00", 'resolution': "day"})
+        self.assertEquals(response.json()['resolution'], "day")
+        self.assertEquals(len(response.json()['buckets']), 1)
+
+
+class EndpointStatsTestCase(APITestCase, InspectionTestingMixin):
+
+    def setUp(self):
+        cache.clear()
+        identity.clear_local()
+        self.sample_endpoint = self.create_endpoint(group_names=["asia", "europe"])
+        Agent.objects.create(ip="10.0.0.1", name="agent-1").groups.add("asia")
+        Agent.objects.create(ip="10.0.0.2", name="agent-2").groups.add("europe")
+        self.start = datetime(2026, 10, 18, 12, 0)
+        self._create_sample_inspection(count=4, start_from=self.start, interval=timedelta(seconds=40))
+        inspections = list(models.Inspection.objects.all())
+        ingest.store_submissions([("10.0.0.1", datetime.now(), [
+            self._result(inspections[0], response_time=0.2),
+            self._result(inspections[1], status_code=503, response_time=0.4),
+        ])])
+        ingest.store_submissions([("10.0.0.2", datetime.now(), [
+            self._result(inspections[1], response_time=0.1),
+            self._result(inspections[2], connection_status="TIMED-OUT", status_code=None, response_time=None),
+        ])])
+        self.url = f"/api/v1/inspecting/endpoints/{self.sample_endpoint.id}/stats"
+
+    def _result(self, inspection, connection_status="SUCCEED", status_code=200, response_time=0.1):
+        return {'inspection': str(inspection.id), 'connection_status': connection_status, 'status_code': status_code,
+                'response_time': response_time, 'byte_received': 1000}
+
+    def test_stats_of_buckets(self):
+        response = self.client.get(self.url, data={'after': "2026-10-18T11:59:00", 'before': "2026-10-18T12:05:00",
+                                                   'bucket': "minute"})
+
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(response.json()['bucket'], "minute")
+        first, second = response.json()['buckets']
+        self.assertEquals((first['bucket'], first['attempts'], second['bucket'], second['attempts']),
+                          ("2026-10-18T12:00:00", 3, "2026-10-18T12:01:00", 1))
+        self.assertEquals((first['success_ratio'], first['timeout_ratio']), (1, 0))
+        self.assertEquals(first['status_classes'], {'1xx': 0, '2xx': 2, '3xx': 0, '4xx': 0, '5xx': 1})
+        self.assertEquals(
+            (first['response_time_min'], first['response_time_avg'], first['response_time_max']),
+            (0.1, 0.233, 0.4),
+        )
+        self.assertEquals((second['timeout_ratio'], second['response_time_avg']), (1, None))
+
+    def test_stats_by_group_of_agents(self):
+        response = self.client.get(f"{self.url}/groups", data={'before': "2026-10-19T00:00:00"})
+
+        buckets = response.json()['buckets']
+        self.assertEquals([(b['bucket'], b['group'], b['attempts'], b['success_ratio']) for b in buckets],
+                          [("2026-10-18T12:00:00", "asia", 2, 1), ("2026-10-18T12:00:00", "europe", 2, 0.5)])
+
+    def test_closed_buckets_are_cached(self):
+        after, before, now = self.start, self.start + timedelta(hours=2), self.start + timedelta(hours=1, minutes=30)
+        expected = stats.query(self.sample_endpoint.id, after, before, stats.HOUR, now=now)
+
+        # Only the open bucket is queried again
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEquals(stats.query(self.sample_endpoint.id, after, before, stats.HOUR, now=now), expected)
+        self.assertEquals(len(queries), 1)
+        self.assertIn("13:00:00", queries[0]['sql'])
+
+        with self.assertNumQueries(0):
+            stats.query(self.sample_endpoint.id, after, self.start + timedelta(hours=1), stats.HOUR, now=now)
+
+    def test_too_many_buckets_are_rejected(self):
+        response = self.client.get(self.url, data={'after': "2026-01-01T00:00:00", 'bucket': "minute"})
+
+        self.assertEquals(response.status_code, 400)
+
+    @override_settings(INSPECTION_RESULT_ARCHIVE_AFTER=1)
+    def test_ranges_of_archived_results_are_rejected(self):
+        # Results before 12:00 of the previous day may be archived
+        now = self.start + timedelta(days=1, minutes=30)
+        self.assertEquals(stats.first_bucket(stats.HOUR, now), self.start)
+        self.assertEquals(stats.first_bucket(stats.DAY, now), datetime(2026, 10, 19))
+        self.assertEquals([bucket for bucket, _ in stats.query(self.sample_endpoint.id, self.start, now, stats.HOUR,
+                                                               now=now)], [self.start])
+        with self.assertRaises(ValueError):
+            stats.query(self.sample_endpoint.id, self.start - timedelta(minutes=1), now, stats.HOUR, now=now)
+
+        response = self.client.get(self.url, data={'after': "2025-01-01T00:00:00", 'bucket': "day"})
+        self.assertEquals(response.status_code, 400)
+        self.assertIn("health rollups", response.json()['after'])
+
+
+class EndpointStatusTestCase(APITestCase, InspectionTestingMixin):
+
+    def setUp(self):
+        cache.clear()
+        identity.clear_local()
+        self.sample_endpoint = self.create_endpoint(group_names=["asia"])
+        Agent.objects.create(ip="10.0.0.1", name="agent-1")
+        Agent.objects.create(ip="10.0.0.2", name="agent-2")
+        self.start = datetime(2026, 10, 18, 12, 0)
+        self._create_sample_inspection(count=5, start_from=self.start, interval=timedelta(seconds=30))
+        self.inspections = list(models.Inspection.objects.all())
+
+    def _result(self, inspection, connection_status="SUCCEED", status_code=200, response_time=0.1):
+        return {'inspection': str(inspection.id), 'connection_status': connection_status, 'status_code': status_code,
+                'response_time': response_time, 'byte_received': 1000}
+
+    def _failure(self, inspection):
+        return self._result(inspection, connection_status="CONN-FAILED", status_code=None, response_time=None)
+
+    def test_failure_streaks_and_changes(self):
+        ingest.store_submissions([("10.0.0.1", datetime.now(), [
+            self._result(self.inspections[0]),
+            self._failure(self.inspections[1]),
+            self._result(self.inspections[2], status_code=503),
+        ])])
+        status = models.EndpointAgentStatus.objects.get(agent_id="10.0.0.1")
+        self.assertEquals((status.timestamp, status.status_code, status.failures),
+                          (self.inspections[2].timestamp, "503", 2))
+        self.assertEquals(status.changed_at, self.inspections[1].timestamp)
+        endpoint_status = models.EndpointStatus.objects.get(endpoint=self.sample_endpoint)
+        self.assertEquals((endpoint_status.agents, endpoint_status.agents_down), (1, 1))
+
+        ingest.store_submissions([("10.0.0.1", datetime.now(), [self._result(self.inspections[3])])])
+        status.refresh_from_db()
+        self.assertEquals((status.failures, status.changed_at), (0, self.inspections[3].timestamp))
+        endpoint_status.refresh_from_db()
+        self.assertEquals((endpoint_status.agents_down, endpoint_status.changed_at),
+                          (0, self.inspections[3].timestamp))
+
+    def test_late_results_do_not_move_the_state_back(self):
+        ingest.store_submissions([("10.0.0.1", datetime.now(), [self._result(self.inspections[4])])])
+        ingest.store_submissions([("10.0.0.1", datetime.now(), [self._failure(self.inspections[3])])])
+
+        status = models.EndpointAgentStatus.objects.get(agent_id="10.0.0.1")
+        self.assertEquals((status.timestamp, status.connection_status, status.failures),
+                          (self.inspections[4].timestamp, "SUCCEED", 0))
+        self.assertEquals(models.EndpointStatus.objects.get(endpoint=self.sample_endpoint).agents_down, 0)
+
+    def test_only_statuses_of_touched_pairs_are_locked(self):
+        other = self.create_endpoint(group_names=["europe"])
+        self._create_sample_inspection(count=1, start_from=self.start, endpoint=other)
+        other_inspection = models.Inspection.objects.get(endpoint=other)
+        ingest.store_submissions([
+            ("10.0.0.1", datetime.now(), [self._result(other_inspection)]),
+            ("10.0.0.2", datetime.now(), [self._result(self.inspections[0])]),
+        ])
+        locked = []
+        select_for_update = locking.select_for_update
+
+        def spy(queryset, fields, keys):
+            rows = select_for_update(queryset, fields, keys)
+            locked.extend((row.endpoint_id, row.agent_id) for row in rows if fields == ('endpoint_id', 'agent_id'))
+            return rows
+
+        with mock.patch.object(locking, 'select_for_update', spy):
+            ingest.store_submissions([
+                ("10.0.0.1", datetime.now(), [self._result(self.inspections[1])]),
+                ("10.0.0.2", datetime.now(), [self._result(other_inspection)]),
+            ])
+        self.assertEquals(sorted(locked), sorted([(self.sample_endpoint.id, "10.0.0.1"), (other.id, "10.0.0.2")]))
+
+    def test_status_apis(self):
+        other_endpoint = self.create_endpoint(group_names=[])
+        other_inspection = models.Inspection.objects.create(endpoint=other_endpoint, timestamp=self.start)
+        ingest.store_submissions([
+            ("10.0.0.1", datetime.now(), [self._failure(self.inspections[0]), self._result(other_inspection)]),
+            ("10.0.0.2", datetime.now(), [self._result(self.inspections[0])]),
+        ])
+
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/v1/inspecting/endpoint-statuses", data={'down': "true"})
+        self.assertEquals(json.loads(response.content), [dict(
+            endpoint=str(self.sample_endpoint.id), agents=2, agents_down=1, changed_at="2026-10-18T12:00:00",
+        )])
+        response = self.client.get("/api/v1/inspecting/endpoint-statuses")
+        self.assertEquals(len(json.loads(response.content)), 2)
+
+        response = self.client.get(f"/api/v1/inspecting/endpoints/{self.sample_endpoint.id}/status")
+        self.assertEquals([(s['agent'], s['down'], s['failures'], s['connection_status']) for s in response.json()],
+                          [("10.0.0.1", True, 1, "CONN-FAILED"), ("10.0.0.2", False, 0, "SUCCEED")])
+
+    def test_board_is_cached_until_an_endpoint_goes_up_or_down(self):
+        url = "/api/v1/inspecting/endpoint-statuses"
+        with mock.patch.object(transaction, 'on_commit', lambda callback: callback()):
+            ingest.store_submissions([("10.0.0.1", datetime.now(), [self._failure(self.inspections[0])])])
+            response = self.client.get(url)
+            with self.assertNumQueries(0):
+                self.assertEquals(self.client.get(url).content, response.content)
+            self.assertEquals(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+            # A longer streak doesn't change the board
+            ingest.store_submissions([("10.0.0.1", datetime.now(), [self._failure(self.inspections[1])])])
+            self.assertEquals(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+            ingest.store_submissions([("10.0.0.1", datetime.now(), [self._result(self.inspections[2])])])
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(json.loads(response.content)[0]['agents_down'], 0)
+
+    def test_deleted_agent_is_taken_out_of_states(self):
+        url = "/api/v1/inspecting/endpoint-statuses"
+        with mock.patch.object(transaction, 'on_commit', lambda callback: callback()):
+            ingest.store_submissions([
+                ("10.0.0.1", datetime.now(), [self._failure(self.inspections[0])]),
+                ("10.0.0.2", datetime.now(), [self._result(self.inspections[0])]),
+            ])
+            response = self.client.get(url)
+
+            Agent.objects.filter(ip="10.0.0.1").delete()
+
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(json.loads(response.content), [dict(
+            endpoint=str(self.sample_endpoint.id), agents=1, agents_down=0, changed_at="2026-10-18T12:00:00",
+        )])
+        self.assertEquals(list(models.EndpointAgentStatus.objects.values_list('agent_id', flat=True)), ["10.0.0.2"])
+
+
+class DDSketchTestCase(SimpleTestCase):
+
+    def test_quantiles_are_within_relative_accuracy(self):
+        values = [random.lognormvariate(-2, 1) for _ in range(5000)] + [0] * 10
+        sketch = sketches.DDSketch()
+        for value in values:
+            sketch.add(value)
+        values.sort()
+        for q in (0.5, 0.95, 0.99):
+            exact = values[int(q * (len(values) - 1))]
+            self.assertLessEqual(abs(sketch.quantile(q) - exact), exact * sketches.RELATIVE_ACCURACY)
+        self.assertEquals(sketch.quantile(0), 0)
+
+    def test_merged_sketches_are_the_same_as_one_sketch_of_all_values(self):
+        values = [random.uniform(0.001, 5) for _ in range(1000)]
+        whole, left, right = sketches.DDSketch(), sketches.DDSketch(), sketches.DDSketch()
+        for i, value in enumerate(values):
+            whole.add(value)
+            (left if i % 2 else right).add(value)
+        merged = sketches.DDSketch.from_bytes(left.to_bytes()).merge(sketches.DDSketch.from_bytes(right.to_bytes()))
+        self.assertEquals(merged.count, 1000)
+        self.assertEquals([merged.quantile(q) for q in (0.1, 0.5, 0.99)], [whole.quantile(q) for q in (0.1, 0.5, 0.99)])
+
+
+class LatencySketchTestCase(APITestCase, InspectionTestingMixin):
+
+    def setUp(self):
+        cache.clear()
+        identity.clear_local()
+        self.sample_endpoint = self.create_endpoint(group_names=["asia"])
+        europe = monitoring_models.Group.objects.create(name="europe")
+        Agent.objects.create(ip="10.0.0.1", name="agent-1", country="DEU").groups.add(europe)
+        Agent.objects.create(ip="10.0.0.2", name="agent-2", country="IRN")
+        self._create_sample_inspection(count=100, start_from=datetime(2026, 10, 18, 12, 0))
+        self.inspections = list(models.Inspection.objects.all())
+
+    def _submit(self, agent_ip, inspections, response_time):
+        ingest.store_submissions([(agent_ip, datetime.now(), [
+            {'inspection': str(i.id), 'connection_status': "SUCCEED", 'response_time': response_time}
+            for i in inspections
+        ])])
+
+    def test_sketches_are_kept_per_agent_and_hour_and_merged_on_ingestion(self):
+        self._submit("10.0.0.1", self.inspections[:50], 0.1)
+        self._submit("10.0.0.1", self.inspections[50:], 0.2)
+        self._submit("10.0.0.2", self.inspections, 0.5)
+
+        self.assertEquals(
+            sorted(models.LatencySketch.objects.values_list('agent_ip', 'bucket', 'count')),
+            [("10.0.0.1", datetime(2026, 10, 18, 12, 0), 100), ("10.0.0.2", datetime(2026, 10, 18, 12, 0), 100)],
+        )
+
+    def test_percentiles_are_computed_per_country_or_group(self):
+        self._submit("10.0.0.1", self.inspections[:50], 0.1)
+        self._submit("10.0.0.1", self.inspections[50:], 0.2)
+        self._submit("10.0.0.2", self.inspections, 0.5)
+        params = {'after': "2026-10-18T12:00:00", 'before': "2026-10-18T13:00:00"}
+
+        response = self.client.get("/api/v1/inspecting/latency-percentiles", data=params)
+        self.assertEquals(response.status_code, 200)
+        [overall] = response.json()
+        self.assertEquals(overall['count'], 200)
+        self.assertAlmostEqual(overall['p50'], 0.2, delta=0.2 * sketches.RELATIVE_ACCURACY)
+        self.assertAlmostEqual(overall['p99'], 0.5, delta=0.5 * sketches.RELATIVE_ACCURACY)
+
+        response = self.client.get("/api/v1/inspecting/latency-percentiles", data=dict(params, by="country"))
+        by_country = {entry['country']: entry for entry in response.json()}
+        self.assertEquals(by_country['DEU']['count'], 100)
+        self.assertAlmostEqual(by_country['DEU']['p95'], 0.2, delta=0.2 * sketches.RELATIVE_ACCURACY)
+
+        response = self.client.get("/api/v1/inspecting/latency-percentiles", data=dict(params, groups="europe"))
+        self.assertEquals(response.json()[0]['count'], 100)
+
+    def test_only_sketches_of_touched_keys_are_locked(self):
+        self._submit("10.0.0.1", self.inspections, 0.1)
+        self._submit("10.0.0.2", self.inspections, 0.5)
+        other = self.create_endpoint(group_names=["africa"])
+        bucket = datetime(2026, 10, 18, 12, 0)
+        for agent_ip in ("10.0.0.1", "10.0.0.2"):
+            models.LatencySketch.objects.create(endpoint=other, agent_id=agent_ip, agent_ip=agent_ip, bucket=bucket,
+                                                sketch=sketches.DDSketch().to_bytes())
+        keys = [(other.id, "10.0.0.2", bucket), (self.sample_endpoint.id, "10.0.0.1", bucket)]
+
+        for batch_size in (locking.LOCK_BATCH_SIZE, 1):
+            with mock.patch.object(locking, 'LOCK_BATCH_SIZE', batch_size), transaction.atomic():
+                rows = locking.select_for_update(
+                    models.LatencySketch.objects, ('endpoint_id', 'agent_ip', 'bucket'), keys,
+                )
+            self.assertEquals(sorted((row.endpoint_id, row.agent_ip, row.bucket) for row in rows), sorted(keys))
+
+
+class CopyStreamTestCase(SimpleTestCase):
+
+    def test_rows_are_encoded_as_csv_with_empty_fields_for_nulls(self):
+        stream = ingest.CopyStream([("a", None, 1), ('b "quoted"', "", 2)])
+        self.assertEquals(stream.read(), 'a,,1\n"b ""quoted""",,2\n')
+
+    def test_rows_are_read_in_chunks(self):
+        rows = [(i, "x" * 10) for i in range(100)]
+        expected = ingest.CopyStream(rows).read()
+        stream = ingest.CopyStream(rows)
+        chunks = []
+        while True:
+            chunk = stream.read(64)
+            if not chunk:
+                break
+            self.assertLessEqual(len(chunk), 64)
+            chunks.append(chunk)
+
+        self.assertEquals("".join(chunks), expected)
+
+
+class ValidateResultsTestCase(APITestCase, InspectionTestingMixin):
+
+    def setUp(self):
+        self.sample_endpoint = self.create_endpoint(group_names=["asia"])
+        self._create_sample_inspection(count=100, interval=timedelta(seconds=1))
+        self.inspection_ids = [str(i) for i in models.Inspection.objects.values_list('id', flat=True)]
+
+    def _results(self, inspection_ids):
+        return [
+            {
+                'inspection': inspection_id,
+                'connection_status': "SUCCEED",
+                'status_code': 200,
+                'response_time': 0.128,
+                'byte_received': 2048,
+            } for inspection_id in inspection_ids
+        ]
+
+    def test_all_inspections_are_checked_with_a_single_query(self):
+        with self.assertNumQueries(1):
+            validation.validate_results(self._results(self.inspection_ids))
+
+    def test_errors_are_reported_per_row(self):
+        results = self._results(self.inspection_ids[:3])
+        results[1]['connection_status'] = "SLEEPING"
+        results[2]['inspection'] = str(uuid.uuid4())
+
+        with self.assertRaises(ValidationError) as context:
+            validation.validate_results(results)
+
+        errors = context.exception.detail
+        self.assertEquals(len(errors), 3)
+        self.assertEquals(errors[0], {})
+        self.assertEquals(list(errors[1].keys()), ['connection_status'])
+        self.assertEquals(list(errors[2].keys()), ['inspection'])
+
+    def test_payload_should_be_a_list(self):
+        with self.assertRaises(ValidationError):
+            validation.validate_results({'inspection': self.inspection_ids[0]})
+
+
+class PartitioningTestCase(SimpleTestCase):
+
+    def test_daily_partitions_are_planned_ahead(self):
+        now = datetime(2026, 10, 18, 12, 22)
+        planned = partitioning.plan_partitions("results", partitioning.DAILY, None, now, ahead=2)
+        self.assertEquals(planned, [
+            ("results_p20261018", datetime(2026, 10, 18), datetime(2026, 10, 19)),
+            ("results_p20261019", datetime(2026, 10, 19), datetime(2026, 10, 20)),
+            ("results_p20261020", datetime(2026, 10, 20), datetime(2026, 10, 21)),
+        ])
+
+    def test_monthly_partitions_continue_from_existing_ones(self):
+        now = datetime(2026, 12, 31, 23, 59)
+        planned = partitioning.plan_partitions("results", partitioning.MONTHLY, datetime(2026, 12, 15), now, ahead=1)
+        self.assertEquals(planned, [
+            ("results_p202612", datetime(2026, 12, 15), datetime(2027, 1, 1)),
+            ("results_p202701", datetime(2027, 1, 1), datetime(2027, 2, 1)),
+        ])
+        self.assertEquals(partitioning.plan_partitions("results", partitioning.MONTHLY, datetime(2027, 2, 1), now,
+                                                       ahead=1), [])
+
+    @override_settings(INSPECTION_PARTITIONING=partitioning.DAILY)
+    def test_partitioning_is_only_supported_on_postgresql(self):
+        if connection.vendor == 'postgresql':
+            self.skipTest("Running on PostgreSQL")
+        self.assertEquals(tasks.maintain_partitions(), {})
+        with self.assertRaises(CommandError):
+            call_command('partitions')
+
+
+@skipUnless(connection.vendor == 'postgresql', "Partitioning is only supported on PostgreSQL")
+@override_settings(INSPECTION_PARTITIONING=partitioning.DAILY)
+class PartitionConversionTestCase(APITestCase, InspectionTestingMixin):
+
+    def setUp(self):
+        cache.clear()
+        identity.clear_local()
+        self.sample_endpoint = self.create_endpoint(group_names=["asia"])
+        Agent.objects.create(ip="10.0.0.1", name="agent-1")
+        self.old_inspection = models.Inspection.objects.create(
+            endpoint=self.sample_endpoint, timestamp=datetime.now() - timedelta(days=3),
+        )
+        self.submit(self.old_inspection)
+
+    def submit(self, *inspections):
+        return ingest.store_submissions([("10.0.0.1", datetime.now(), [
+            {'inspection': str(inspection.id), 'connection_status': "SUCCEED"} for inspection in inspections
+        ])])[0]
+
+    def constraint_names(self, model):
+        partitioned_tables = {m._meta.db_table for m in partitioning.LAYOUT}
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+        return {
+            name for name, constraint in constraints.items()
+            if not constraint['foreign_key'] or constraint['foreign_key'][0] not in partitioned_tables
+        }
+
+    def test_constraints_and_indexes_keep_their_names(self):
+        names = {model: self.constraint_names(model) for model in partitioning.LAYOUT}
+
+        call_command('partitions', '--convert', stdout=io.StringIO())
+
+        for model in partitioning.LAYOUT:
+            with connection.cursor() as cursor:
+                self.assertTrue(partitioning.is_partitioned(cursor, model._meta.db_table))
+            self.assertEquals(self.constraint_names(model), names[model])
+
+    def test_duplicates_are_skipped_across_partitions(self):
+        call_command('partitions', '--convert', stdout=io.StringIO())
+        new_inspection = models.Inspection.objects.create(
+            endpoint=self.sample_endpoint, timestamp=datetime.now() + timedelta(days=2),
+        )
+
+        self.assertEquals(self.submit(self.old_inspection, new_inspection), dict(accepted=1, duplicate=1, rejected=0))
+        # Rows which get past the lookup of stored results are skipped by the unique constraint
+        for backend in ingest.STORAGE_BACKENDS:
+            with override_settings(INSPECTION_RESULT_STORAGE_BACKEND=backend):
+                ingest.insert_results([
+                    tuple(dict(
+                        inspection_id=inspection.id, timestamp=inspection.timestamp, agent_id="10.0.0.1",
+                        connection_status="SUCCEED", status_code=None, response_time=None, byte_received=None,
+                        submitted_at=datetime.now(),
+                    )[column] for column in ingest.RESULT_COLUMNS)
+                    for inspection in (self.old_inspection, new_inspection)
+                ])
+
+        self.assertEquals(models.HTTPInspectionResult.objects.count(), 2)
+        table = models.HTTPInspectionResult._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT tableoid::regclass::text FROM {table} WHERE inspection_id = %s",
+                           [new_inspection.id])
+            self.assertEquals(cursor.fetchone()[0], partitioning.partition_name(
+                table, partitioning.period_start(new_inspection.timestamp, partitioning.DAILY), partitioning.DAILY,
+            ))
+
+    def test_migrations_can_alter_unique_constraints_after_conversion(self):
+        call_command('partitions', '--convert', stdout=io.StringIO())
+
+        for model in partitioning.LAYOUT:
+            unique_together = model._meta.unique_together
+            with connection.schema_editor() as editor:
+                editor.alter_unique_together(model, unique_together, [])
+                editor.alter_unique_together(model, [], unique_together)
+
+        self.assertEquals(self.submit(self.old_inspection), dict(accepted=0, duplicate=1, rejected=0))
+
+
+class ResultArchiveTestCase(APITestCase, InspectionTestingMixin):
+
+    def setUp(self):
+        cache.clear()
+        identity.clear_local()
+        self.sample_endpoint = self.create_endpoint(group_names=["asia"])
+        Agent.objects.create(ip="10.0.0.1", name="agent-1")
+        Agent.objects.create(ip="10.0.0.2", name="agent-2")
+        self.start = datetime(2026, 10, 1, 12, 0)
+        self._create_sample_inspection(count=240, start_from=self.start)
+        self.inspections = list(models.Inspection.objects.order_by('timestamp'))
+
+    def _submit(self, agent_ip, inspections):
+        ingest.store_submissions([(agent_ip, datetime.now(), [
+            {'inspection': str(inspection.id), 'connection_status': "SUCCEED" if i % 7 else "TIMED-OUT",
+             'status_code': 200 if i % 7 else None, 'response_time': f"0.{100 + i % 13:03d}" if i % 7 else None,
+             'byte_received': 2048 if i % 7 else None}
+            for i, inspection in enumerate(inspections)
+        ])])
+
+    def _series(self, after, before):
+        return [
+            (result.inspection.timestamp, result.agent_id, result.connection_status, result.status_code,
+             result.response_time, result.byte_received, result.submitted_at)
+            for result in archive.query(self.sample_endpoint.id, after, before)
+        ]
+
+    def test_encoded_rows_are_decoded_back(self):
+        rows = [(0, 1500, 0, 200, 128000, 2048), (30000000, 900, 0, 200, 131000, 2048),
+                (60000000, -20, 2, None, None, None), (90000001, 1200, 0, 503, 99000, 0)]
+
+        self.assertEquals(archive.decode(archive.encode(rows)), rows)
+        self.assertEquals(archive.decode(archive.encode([])), [])
+
+    def test_archived_results_are_read_just_like_stored_ones(self):
+        self._submit("10.0.0.1", self.inspections)
+        self._submit("10.0.0.2", self.inspections[::2])
+        after, before = self.start + timedelta(minutes=5), self.start + timedelta(hours=1, minutes=10)
+        expected = self._series(after, before)
+
+        archived = archive.archive(self.start + timedelta(hours=1, minutes=30))
+
+        self.assertEquals(archived, 180)
+        self.assertEquals(models.HTTPInspectionResult.objects.count(), 180)
+        self.assertEquals(
+            sorted(models.HTTPInspectionResultChunk.objects.values_list('agent_id', 'bucket', 'count')),
+            [("10.0.0.1", self.start, 120), ("10.0.0.2", self.start, 60)],
+        )
+        self.assertEquals(self._series(after, before), expected)
+
+    def test_late_results_are_merged_into_archived_chunks(self):
+        self._submit("10.0.0.1", self.inspections[:60])
+        archive.archive(self.start + timedelta(hours=2))
+        self._submit("10.0.0.1", self.inspections[50:120])
+
+        archive.archive(self.start + timedelta(hours=2))
+
+        self.assertFalse(models.HTTPInspectionResult.objects.exists())
+        self.assertEquals(models.HTTPInspectionResultChunk.objects.get().count, 120)
+        self.assertEquals(len(self._series(self.start, self.start + timedelta(hours=1))), 120)
+
+    def test_only_chunks_of_touched_pairs_are_locked(self):
+        other = self.create_endpoint(group_names=["europe"])
+        self._create_sample_inspection(count=120, start_from=self.start, endpoint=other)
+        others = list(models.Inspection.objects.filter(endpoint=other).order_by('timestamp'))
+        for agent_ip in ("10.0.0.1", "10.0.0.2"):
+            self._submit(agent_ip, self.inspections[:60] + others[:60])
+        archive.archive(self.start + timedelta(hours=2))
+        self._submit("10.0.0.1", self.inspections[60:120])
+        self._submit("10.0.0.2", others[60:])
+        locked = []
+        select_for_update = locking.select_for_update
+
+        def spy(queryset, fields, keys):
+            rows = select_for_update(queryset, fields, keys)
+            locked.extend((row.endpoint_id, row.agent_id) for row in rows)
+            return rows
+
+        with mock.patch.object(locking, 'select_for_update', spy):
+            archive.archive(self.start + timedelta(hours=2))
+
+        self.assertEquals(sorted(locked), sorted([(self.sample_endpoint.id, "10.0.0.1"), (other.id, "10.0.0.2")]))
+        self.assertEquals(sorted(models.HTTPInspectionResultChunk.objects.values_list('count', flat=True)),
+                          [60, 60, 120, 120])
+
+    def test_archiving_is_disabled_by_default(self):
+        self._submit("10.0.0.1", self.inspections)
+
+        self.assertEquals(tasks.archive_results(), 0)
+        with override_settings(INSPECTION_RESULT_ARCHIVE_AFTER=1):
+            self.assertEquals(archive.archive_expired(now=self.start + timedelta(days=1, hours=1)), 120)
+
+
+class ExportDependencyCheckTestCase(SimpleTestCase):
+
+    def test_missing_pyarrow_is_an_error_only_if_results_are_exported(self):
+        with mock.patch.object(checks, 'find_spec', return_value=None):
+            self.assertEquals(checks.check_export_dependencies(None), [])
+            with override_settings(INSPECTION_RESULT_EXPORT_DIR="/tmp/exports"):
+                errors = checks.check_export_dependencies(None)
+        self.assertEquals([error.id for error in errors], ['inspecting.E001'])
+
+    @override_settings(INSPECTION_RESULT_EXPORT_DIR="/tmp/exports")
+    def test_installed_pyarrow_passes(self):
+        with mock.patch.object(checks, 'find_spec', return_value=object()):
+            self.assertEquals(checks.check_export_dependencies(None), [])
+
+
+@skipUnless(importlib.util.find_spec('pyarrow'), "pyarrow is not installed")
+class ResultExportTestCase(APITestCase, InspectionTestingMixin):
+
+    def setUp(self):
+        cache.clear()
+        identity.clear_local()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.sample_endpoint = self.create_endpoint(group_names=["asia"])
+        Agent.objects.create(ip="10.0.0.1", name="agent-1", country="DEU")
+        Agent.objects.create(ip="10.0.0.2", name="agent-2", country="IRN")
+        self.start = datetime(2026, 10, 1, 23, 0)
+        self._create_sample_inspection(count=240, start_from=self.start)
+        inspections = list(models.Inspection.objects.order_by('timestamp'))
+        for agent_ip, response_time in (("10.0.0.1", "0.100"), ("10.0.0.2", "0.300")):
+            ingest.store_submissions([(agent_ip, datetime.now(), [
+                {'inspection': str(inspection.id), 'connection_status': "TIMED-OUT" if i % 10 == 0 else "SUCCEED",
+                 'status_code': None if i % 10 == 0 else 200, 'response_time': None if i % 10 == 0 else response_time}
+                for i, inspection in enumerate(inspections)
+            ])])
+
+    def test_closed_days_are_exported_once(self):
+        with override_settings(INSPECTION_RESULT_EXPORT_DIR=self.directory):
+            first = export.export_closed(now=datetime(2026, 10, 3, 0, 30))
+            second = export.export_closed(now=datetime(2026, 10, 3, 2, 0))
+
+        self.assertEquals(first, {datetime(2026, 10, 1).date(): 240})
+        self.assertEquals(second, {datetime(2026, 10, 2).date(): 240})
+        self.assertEquals(export.exported_days(self.directory, export.PARQUET),
+                          [datetime(2026, 10, 1).date(), datetime(2026, 10, 2).date()])
+
+    def test_days_which_got_late_results_are_exported_again(self):
+        Agent.objects.create(ip="10.0.0.3", name="agent-3", country="FRA")
+        late = [models.Inspection.objects.filter(timestamp__date=datetime(2026, 10, day).date()).first()
+                for day in (1, 2)]
+        with override_settings(INSPECTION_RESULT_EXPORT_DIR=self.directory):
+            export.export_closed(now=datetime(2026, 10, 3, 2, 0))
+            ingest.store_submissions([("10.0.0.3", datetime.now(), [
+                {'inspection': str(inspection.id), 'connection_status': "SUCCEED", 'status_code': 200,
+                 'response_time': "0.200"} for inspection in late
+            ])])
+            # Late results are found even once they are archived
+            archive.archive(datetime(2026, 10, 2))
+
+            self.assertEquals(export.export_closed(now=datetime(2026, 10, 3, 3, 0)), {
+                datetime(2026, 10, 1).date(): 241, datetime(2026, 10, 2).date(): 241,
+            })
+            self.assertEquals(export.export_closed(now=datetime(2026, 10, 3, 4, 0)), {})
+
+        # Later than LATE_RESULTS_PERIOD they're left to re-exporting the day
+        ingest.store_submissions([("10.0.0.3", datetime.now(), [
+            {'inspection': str(models.Inspection.objects.filter(timestamp__date=late[0].timestamp.date())[1].id),
+             'connection_status': "SUCCEED", 'status_code': 200, 'response_time': "0.200"},
+        ])])
+        first_day = late[0].timestamp.date()
+        for last_closed, expected in ((first_day + timedelta(days=6), [first_day]),
+                                      (first_day + export.LATE_RESULTS_PERIOD, [])):
+            self.assertEquals(export.late_days(self.directory, export.PARQUET, [first_day], last_closed), expected)
+
+    def test_aggregates_are_computed_from_exported_files(self):
+        for file_format in (export.PARQUET, export.ARROW):
+            with self.subTest(file_format=file_format):
+                archive.archive(self.start + timedelta(hours=1))
+                for day in (1, 2):
+                    export.export_day(datetime(2026, 10, day).date(), self.directory, file_format)
+                self.assertEquals(export.exported_count(self.directory, datetime(2026, 10, 1).date(), file_format), 240)
+
+                with self.assertNumQueries(0):
+                    report = export.aggregate(self.start, self.start + timedelta(hours=2), by='country',
+                                              directory=self.directory, file_format=file_format)
+
+                self.assertEquals(set(report), {"DEU", "IRN"})
+                self.assertEquals(report["DEU"]["count"], 240)
+                self.assertEquals(report["DEU"]["timed_out"], 24)
+                self.assertAlmostEquals(report["DEU"]["success_rate"], 0.9)
+                self.assertAlmostEquals(report["IRN"]["response_time_avg"], 0.3)
+                self.assertAlmostEquals(report["IRN"]["response_time_quantiles"][1], 0.3)
+                total = export.aggregate(self.start, self.start + timedelta(hours=1), directory=self.directory,
+                                         file_format=file_format)
+                self.assertEquals(total[None]["count"], 240)
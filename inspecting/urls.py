@@ -4,5 +4,11 @@ from inspecting import views
 urlpatterns = [
     path('inspections', views.InspectionListAPIView.as_view()),
     path('inspection-results', views.CreateInspectionResultsAPIView.as_view()),
+    path('endpoints/<uuid:endpoint_id>/health', views.EndpointHealthAPIView.as_view()),
+    path('endpoints/<uuid:endpoint_id>/stats', views.EndpointStatsAPIView.as_view()),
+    path('endpoints/<uuid:endpoint_id>/stats/groups', views.EndpointStatsAPIView.as_view(by_group=True)),
+    path('endpoints/<uuid:endpoint_id>/status', views.EndpointAgentStatusAPIView.as_view()),
+    path('endpoint-statuses', views.EndpointStatusListAPIView.as_view()),
+    path('latency-percentiles', views.LatencyPercentilesAPIView.as_view()),
 
 ]
@@ -0,0 +1,141 @@
+"""
+Validation of inspection results submitted by agents.
+
+Results are checked row by row in plain Python (clean_result), references to inspections of a whole submission are
+checked with a single query (validate_results), errors are reported per row just like a DRF serializer with many=True.
+"""
+import uuid
+from decimal import Decimal
+
+from rest_framework.exceptions import ValidationError
+
+from inspecting import models, schedule
+from monitoring import models as monitoring_models
+
+CONNECTION_STATUSES = {
+    status for status, _ in models.HTTPInspectionResult._meta.get_field('connection_status').choices
+}
+
+
+def _clean_inspection(value):
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        raise ValueError(f'"{value}" is not a valid UUID.')
+
+
+def _clean_connection_status(value):
+    if value not in CONNECTION_STATUSES:
+        raise ValueError(f'"{value}" is not a valid choice.')
+    return value
+
+
+def _clean_status_code(value):
+    if isinstance(value, bool) or not isinstance(value, (int, str)) or not str(value).isdigit() or len(str(value)) > 4:
+        raise ValueError("A valid status code is required.")
+    return str(value)
+
+
+def _clean_response_time(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float, str, Decimal)):
+        raise ValueError("A valid number is required.")
+    try:
+        value = Decimal(str(value)).quantize(Decimal('0.001'))
+    except ArithmeticError:
+        raise ValueError("A valid number is required.")
+    if not value.is_finite() or value.copy_abs() >= 1000:
+        raise ValueError("Ensure that there are no more than 3 digits before the decimal point.")
+    return value
+
+
+def _clean_byte_received(value):
+    if isinstance(value, bool) or not isinstance(value, (int, str)) or not str(value).isdigit():
+        raise ValueError("A valid positive integer is required.")
+    return int(value)
+
+
+# Field name -> (cleaner, required)
+RESULT_FIELDS = {
+    'inspection': (_clean_inspection, True),
+    'connection_status': (_clean_connection_status, True),
+    'status_code': (_clean_status_code, False),
+    'response_time': (_clean_response_time, False),
+    'byte_received': (_clean_byte_received, False),
+}
+
+
+def clean_result(result):
+    """
+    Check and convert a submitted result in plain Python, returns a (cleaned, errors) pair,
+    errors is a dict of field name -> list of messages (like DRF serializer errors)
+    """
+    if not isinstance(result, dict):
+        return None, {'non_field_errors': ["Invalid data. Expected a dictionary."]}
+    cleaned, errors = {}, {}
+    for name, (cleaner, required) in RESULT_FIELDS.items():
+        value = result.get(name)
+        if value is None:
+            if required:
+                errors[name] = ["This field is required."]
+            cleaned[name] = None
+            continue
+        try:
+            cleaned[name] = cleaner(value)
+        except ValueError as exp:
+            errors[name] = [str(exp)]
+    return cleaned, errors
+
+
+def validate_results(results):
+    """
+    Validate a list of submitted results, raise ValidationError with a list of errors (one dict per row, empty for
+    valid rows) if any of them is invalid.
+
+    With a virtual schedule inspections may not be stored yet, so endpoint and timestamp of each inspection are
+    checked against its id instead, and endpoints are checked with a single query.
+    """
+    if not isinstance(results, list):
+        raise ValidationError({'non_field_errors': [
+            f'Expected a list of items but got type "{type(results).__name__}".'
+        ]})
+
+    virtual = schedule.is_virtual()
+    rows = [clean_result(result) for result in results]
+    if virtual:
+        rows = [_clean_virtual_result(result, cleaned, errors) for result, (cleaned, errors) in zip(results, rows)]
+        referenced = {cleaned['endpoint'] for cleaned, errors in rows if 'endpoint' not in errors}
+        known = set(monitoring_models.MonitoringPolicy.objects.filter(
+            endpoint_id__in=referenced
+        ).values_list('endpoint_id', flat=True))
+        reference = 'endpoint'
+    else:
+        referenced = {cleaned['inspection'] for cleaned, errors in rows if 'inspection' not in errors}
+        known = set(models.Inspection.objects.filter(id__in=referenced).values_list('id', flat=True))
+        reference = 'inspection'
+
+    for cleaned, errors in rows:
+        if reference not in errors and cleaned is not None and cleaned[reference] not in known:
+            errors[reference] = [f'Invalid pk "{cleaned[reference]}" - object does not exist.']
+    all_errors = [errors for _, errors in rows]
+    if any(all_errors):
+        raise ValidationError(all_errors)
+
+
+def _clean_virtual_result(result, cleaned, errors):
+    if cleaned is None:
+        return cleaned, errors
+    for name in ('endpoint', 'timestamp'):
+        if result.get(name) is None:
+            errors[name] = ["This field is required."]
+    if 'endpoint' not in errors:
+        try:
+            cleaned['endpoint'] = uuid.UUID(str(result['endpoint']))
+        except ValueError:
+            errors['endpoint'] = [f'"{result["endpoint"]}" is not a valid UUID.']
+    if 'timestamp' not in errors:
+        cleaned['timestamp'] = schedule.normalize_timestamp(result['timestamp'])
+        if cleaned['timestamp'] is None:
+            errors['timestamp'] = ["Datetime has wrong format."]
+    if not errors and schedule.inspection_id(cleaned['endpoint'], cleaned['timestamp']) != cleaned['inspection']:
+        errors['non_field_errors'] = ["inspection does not match endpoint and timestamp"]
+    return cleaned, errors
@@ -1,17 +1,47 @@
+import uuid
 from datetime import datetime
 
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
 from ipware import get_client_ip
-from rest_framework.exceptions import ValidationError
-from rest_framework.generics import ListAPIView
+from rest_framework.exceptions import ParseError, ValidationError
+from rest_framework.generics import GenericAPIView, ListAPIView
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 
-from inspecting import serializers, models, tasks
-from monitoring.models import Agent
+from inspecting import (
+    serializers, models, pagination, parsers, renderers, rollups, sketches, states, stats, tasks, validation,
+    workplans,
+)
+from monitoring import fieldsets, identity, versioning
 
 
-class InspectionListAPIView(ListAPIView):
+class InspectionListAPIView(versioning.ConditionalGetMixin, fieldsets.SparseFieldsetMixin, ListAPIView):
+    """
+    Inspections of a time window, optionally of endpoints monitored by some groups.
+
+    Responses are a plain list, or pages of `limit` inspections with a `next` link (keyset pagination, see
+    inspecting.pagination). With `Accept: application/x-ndjson` (or ?format=ndjson) the whole window is streamed
+    as one inspection per line instead, rows are read in chunks so memory doesn't grow with the window.
+    Plain JSON lists of windows aligned to work plan buckets are served from the cache (see inspecting.workplans).
+    Items can be limited to some fields and lists can be columnar (see monitoring.fieldsets), rows are read without
+    building model instances either way.
+
+    Responses have an ETag, polls with a matching If-None-Match get 304 Not Modified (see monitoring.versioning).
+    """
     serializer_class = serializers.InspectionSerializer
+    pagination_class = pagination.KeysetPagination
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, renderers.NDJSONRenderer]
+    # Rows fetched at once while streaming, server-side cursors are used on PostgreSQL
+    stream_chunk_size = 2000
+    version_names = (versioning.ENDPOINTS, versioning.INSPECTIONS)
+
+    def get_etag_parts(self):
+        # The window may be relative to now, so the resolved one is part of the ETag
+        filters = self._get_filtering()
+        return settings.INSPECTION_SCHEDULE, filters['after'], filters['before']
 
     def _get_filtering(self):
         serializer = serializers.InspectionFilteringSerializer(data=self.request.GET)
@@ -20,39 +50,196 @@ class InspectionListAPIView(ListAPIView):
 
     def get_queryset(self):
         filters = self._get_filtering()
-        queryset = models.Inspection.objects.filter(
-            timestamp__gt=filters['after'],
-            timestamp__lt=filters['before'],
-        ).select_related('endpoint', 'endpoint__monitoring_policy', )
-        if len(filters['groups']) > 0:
-            queryset = queryset.distinct().filter(endpoint__monitoring_policy__groups__in=filters['groups'])
-        return queryset
+        try:
+            return workplans.inspections(filters['after'], filters['before'], filters['groups'])
+        except ValueError as error:
+            # Too many inspections to compute, see inspecting.schedule
+            raise ValidationError({"before": str(error)})
+
+    def list(self, request, *args, **kwargs):
+        if request.accepted_renderer.format != renderers.NDJSONRenderer.format:
+            filters = self._get_filtering()
+            if (
+                request.accepted_media_type == JSONRenderer.media_type
+                and self.paginator.get_limit(request) is None
+                and workplans.is_aligned(filters['after'], filters['before'])
+            ):
+                content = workplans.get(
+                    filters['groups'], filters['after'], self.get_requested_fields(), self.is_columnar(),
+                )
+                return HttpResponse(content, content_type=JSONRenderer.media_type)
+            return super().list(request, *args, **kwargs)
+        serializer = self.get_serializer()
+        names = list(serializer.fields)
+        rows = fieldsets.rows(serializer, self.filter_queryset(self.get_queryset()), self.stream_chunk_size)
+        return StreamingHttpResponse(
+            (renderers.render_line(dict(zip(names, row))) for row in rows),
+            content_type=renderers.NDJSONRenderer.media_type,
+        )
+
+
+class EndpointHealthAPIView(GenericAPIView):
+    """
+    Health of an endpoint over time, from rollups at the requested resolution or the coarsest one which fits the
+    requested range (see inspecting.rollups)
+    """
+    serializer_class = serializers.EndpointHealthRollupSerializer
+
+    def get(self, request, endpoint_id, *args, **kwargs):
+        filtering = serializers.EndpointHealthFilteringSerializer(data=request.GET)
+        filtering.is_valid(raise_exception=True)
+        filters = filtering.validated_data
+        buckets = rollups.query(endpoint_id, filters['after'], filters['before'], filters['resolution'])
+        return Response(dict(
+            resolution=rollups.RESOLUTION_NAMES[filters['resolution']],
+            buckets=self.get_serializer(buckets, many=True).data,
+        ))
+
+
+class EndpointStatsAPIView(APIView):
+    """
+    Statistics of results of an endpoint per time bucket, computed by the database and cached once buckets are closed,
+    see inspecting.stats. With by_group, there's an entry per group of agents in every bucket.
+    """
+    by_group = False
+
+    def get(self, request, endpoint_id, *args, **kwargs):
+        filtering = serializers.EndpointStatsFilteringSerializer(data=request.GET)
+        filtering.is_valid(raise_exception=True)
+        filters = filtering.validated_data
+        try:
+            buckets = stats.query(endpoint_id, filters['after'], filters['before'], filters['bucket'], self.by_group)
+        except ValueError as error:
+            raise ValidationError({"after": str(error)})
+        return Response(dict(
+            bucket=filters['bucket'],
+            buckets=[dict(bucket=bucket, **entry) for bucket, entry in buckets],
+        ))
+
+
+class EndpointStatusListAPIView(versioning.ConditionalGetMixin, ListAPIView):
+    """
+    Current state of every endpoint (or of endpoints which are down or up, with ?down=), only reads the small table of
+    endpoint states, see inspecting.states. Plain JSON lists are served from the cache until an endpoint goes up or
+    down, responses have an ETag just like inspections.
+    """
+    version_names = states.VERSION_NAMES
+
+    def list(self, request, *args, **kwargs):
+        filtering = serializers.EndpointStatusFilteringSerializer(data=request.GET)
+        filtering.is_valid(raise_exception=True)
+        down = filtering.validated_data['down']
+        if request.accepted_media_type == JSONRenderer.media_type:
+            return HttpResponse(states.render_endpoints(down), content_type=JSONRenderer.media_type)
+        return Response(states.endpoints(down))
+
+
+class EndpointAgentStatusAPIView(APIView):
+    """
+    Current state of an endpoint as measured by every agent: last result, consecutive failures and when it last went
+    up or down, see inspecting.states
+    """
+
+    def get(self, request, endpoint_id, *args, **kwargs):
+        data = []
+        for row in states.agents(endpoint_id):
+            agent_ip = row.pop('agent_id')
+            data.append(dict(agent=agent_ip, down=row['failures'] > 0, **row))
+        return Response(data)
+
+
+class LatencyPercentilesAPIView(APIView):
+    """
+    Percentiles of response time over a range, for all or some endpoints, countries and groups of agents, all together
+    or broken down by endpoint, country or group. Computed by merging latency sketches, see inspecting.sketches
+    """
+
+    def get(self, request, *args, **kwargs):
+        filtering = serializers.LatencyFilteringSerializer(data=request.GET)
+        filtering.is_valid(raise_exception=True)
+        filters = filtering.validated_data
+        queryset = sketches.query(
+            filters['after'], filters['before'], filters['endpoints'], filters['countries'], filters['groups'],
+        )
+        percentiles = sketches.percentiles(queryset, filters['by'])
+        if filters['by'] == 'group' and filters['groups']:
+            percentiles = {group: value for group, value in percentiles.items() if group in filters['groups']}
+        data = []
+        for key, (count, values) in percentiles.items():
+            entry = dict(count=count, **{f"p{round(q * 100)}": value for q, value in zip(sketches.QUANTILES, values)})
+            if filters['by']:
+                entry[filters['by']] = key
+            data.append(entry)
+        return Response(data)
 
 
 class CreateInspectionResultsAPIView(APIView):
     model = models.HTTPInspectionResult
+    # JSON is the default, see inspecting.parsers for compact and compressed formats
+    parser_classes = (parsers.JSONParser, parsers.ColumnarJSONParser, parsers.MsgPackParser)
 
     def get_agent_ip(self):
         client_ip = get_client_ip(self.request)[0]
-        agent = Agent.objects.filter(ip=client_ip).first()
-        if agent is None:
+        if not identity.is_known(client_ip):
             exc = ValidationError({"non_field_error": "IP Address is not recognized"})
             exc.status_code = 401
             raise exc
         return client_ip
 
-    def _run_background_task(self, results):
-        tasks.process_results(
-            agent_ip=self.get_agent_ip(),
-            submission_time=datetime.now(),
-            results=results,
-        )
+    def _run_background_task(self, agent_ip, chunks):
+        """
+        Queue chunks of results to be processed by workers, or process them right away if INSPECTION_RESULT_INGESTION
+        is sync. Returns the response body (submission id, number of chunks and result counts if processed) and the
+        proper status code.
+        The first chunk is queued with the submission id as its task id, the rest with "<submission id>.<index>".
+        A submission without any result has nothing to queue, it gets zero counts and no submission id.
+        """
+        submission_id = str(uuid.uuid4())
+        submission_time = datetime.now()
+        sync = settings.INSPECTION_RESULT_INGESTION == "sync"
+        counts = dict(accepted=0, duplicate=0, rejected=0)
+        index = -1
+        for index, results in enumerate(chunks):
+            task_kwargs = dict(
+                agent_ip=agent_ip,
+                submission_time=submission_time,
+                results=results,
+            )
+            if sync:
+                for key, value in tasks.process_results(**task_kwargs).items():
+                    counts[key] += value
+            else:
+                task_id = submission_id if index == 0 else f"{submission_id}.{index}"
+                tasks.process_results.apply_async(kwargs=task_kwargs, task_id=task_id)
+        if index == -1:
+            return dict(chunks=0, **counts), 200
+        body = dict(submission=submission_id, chunks=index + 1)
+        if sync:
+            return dict(body, **counts), 200
+        return body, 202
+
+    def _chunks(self, results):
+        if not isinstance(results, list):
+            raise ParseError('Expected a list of results.')
+        size = settings.INSPECTION_RESULT_CHUNK_SIZE
+        return (results[i:i + size] for i in range(0, len(results), size))
 
     def post(self, request, *args, **kwargs):
-        results = request.data
+        """
+        Plain JSON bodies are parsed incrementally and handed to ingestion chunk by chunk, so memory usage doesn't
+        depend on size of the submission. If the body turns out to be malformed, chunks before the error are already
+        ingested, retrying the whole submission is harmless since stored results are skipped as duplicates.
+        With validate=1 (or a compact format) the whole body is parsed first.
+        """
+        # Agent is authenticated before its (possibly large) body is parsed
+        agent_ip = self.get_agent_ip()
         force_validate = request.GET.get('validate') == "1"
-        if force_validate:
-            serializer = serializers.CreateHTTPInspectionResultSerializer(data=results, many=True)
-            serializer.is_valid(raise_exception=True)
-        self._run_background_task(results)
-        return Response({}, status=200)  # TODO: an empty response
+        if not force_validate and parsers.is_streamable(request):
+            chunks = parsers.iter_result_chunks(request, settings.INSPECTION_RESULT_CHUNK_SIZE)
+        else:
+            results = request.data
+            if force_validate:
+                validation.validate_results(results)
+            chunks = self._chunks(results)
+        body, status = self._run_background_task(agent_ip, chunks)
+        return Response(body, status=status)
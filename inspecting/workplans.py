@@ -0,0 +1,115 @@
+"""
+Work plans: rendered inspection listings of aligned windows, cached per set of groups.
+
+Agents of the same groups poll the same window and get the same list, so listings of windows aligned to
+WORK_PLAN_BUCKET (after = a multiple of the bucket, before = after + bucket) are rendered once and their JSON bytes
+are kept in the shared cache. Entries are filled by inspecting.tasks.generate_inspections for the group sets of known
+agents and upcoming buckets, and on a miss by the first request which needs them. Listings of some fields or columnar
+ones (see monitoring.fieldsets) are cached on their own, on a miss.
+
+Keys include the ENDPOINTS and INSPECTIONS versions (see monitoring.versioning), so a change of endpoints, policies or
+groups, or newly generated inspections, makes every existing entry unreachable, old entries just expire.
+"""
+import hashlib
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.renderers import JSONRenderer
+
+from inspecting import models, schedule, serializers
+from monitoring import events, fieldsets, models as monitoring_models, versioning
+
+WORK_PLAN_BUCKET = timedelta(minutes=5)
+# Seconds an entry is kept, a bit more than inspections are planned ahead
+WORK_PLAN_CACHE_TIMEOUT = 30 * 60
+
+VERSION_NAMES = (versioning.ENDPOINTS, versioning.INSPECTIONS)
+
+
+def inspections(after, before, groups=()):
+    """
+    Inspections of (after, before), of endpoints monitored by any of groups if there is any
+    """
+    if schedule.is_virtual():
+        return schedule.compute_inspections(after, before, groups)
+    queryset = models.Inspection.objects.filter(
+        timestamp__gt=after,
+        timestamp__lt=before,
+    ).order_by('timestamp', 'id')
+    if len(groups) > 0:
+        # A semi-join instead of joining groups, so there are no duplicates to remove with DISTINCT
+        queryset = queryset.filter(endpoint_id__in=monitoring_models.MonitoringPolicy.objects.filter(
+            groups__in=groups,
+        ).values('endpoint_id'))
+    return queryset
+
+
+def is_aligned(after, before):
+    return before - after == WORK_PLAN_BUCKET and (after - datetime.min) % WORK_PLAN_BUCKET == timedelta(0)
+
+
+def bucket_of(timestamp):
+    return timestamp - (timestamp - datetime.min) % WORK_PLAN_BUCKET
+
+
+def render(groups, after, fields=None, columnar=False):
+    """
+    JSON listing of the bucket starting at after for groups, of some fields and columnar, see monitoring.fieldsets
+    """
+    serializer = serializers.InspectionSerializer(fields=fields)
+    rows = fieldsets.rows(serializer, inspections(after, after + WORK_PLAN_BUCKET, groups))
+    return JSONRenderer().render(fieldsets.shape(list(serializer.fields), rows, columnar))
+
+
+def _cache_key(versions, groups, after, fields=None, columnar=False):
+    key = repr((versions, settings.INSPECTION_SCHEDULE, sorted(set(groups)), after.isoformat(), fields, columnar))
+    return f"work-plan:{hashlib.sha1(key.encode()).hexdigest()}"
+
+
+def get(groups, after, fields=None, columnar=False):
+    """
+    Rendered listing of the bucket starting at after for groups (see render), from the cache or rendered and cached
+    """
+    key = _cache_key(versioning.get_versions(VERSION_NAMES), groups, after, fields, columnar)
+    content = cache.get(key)
+    if content is None:
+        content = render(groups, after, fields, columnar)
+        cache.set(key, content, timeout=WORK_PLAN_CACHE_TIMEOUT)
+    return content
+
+
+def agent_group_sets():
+    """
+    Distinct sets of groups of agents, every agent asks for the work plan of its own groups
+    """
+    groups = {}
+    for ip, group in monitoring_models.Agent.objects.order_by().values_list('ip', 'groups'):
+        groups.setdefault(ip, set())
+        if group is not None:
+            groups[ip].add(group)
+    return {frozenset(agent_groups) for agent_groups in groups.values()}
+
+
+def fill(after, before):
+    """
+    Render and cache work plans of buckets overlapping (after, before) for group sets of known agents which are not
+    cached yet, and push them to agents of those groups (see monitoring.events). Returns number of rendered plans.
+    """
+    versions = versioning.get_versions(VERSION_NAMES)
+    buckets = []
+    bucket = bucket_of(after)
+    while bucket < before:
+        buckets.append(bucket)
+        bucket += WORK_PLAN_BUCKET
+    keys = {
+        _cache_key(versions, groups, bucket): (groups, bucket)
+        for groups in agent_group_sets() for bucket in buckets
+    }
+    missing = keys.keys() - cache.get_many(keys).keys()
+    rendered = {key: render(*keys[key]) for key in missing}
+    cache.set_many(rendered, timeout=WORK_PLAN_CACHE_TIMEOUT)
+    for key, content in rendered.items():
+        groups, bucket = keys[key]
+        events.inspections_planned(groups, bucket, bucket + WORK_PLAN_BUCKET, content)
+    return len(missing)
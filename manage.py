@@ -5,7 +5,9 @@ import sys
 
 
 def main():
-    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'payeshgar_server.settings')
+    # The test suite has settings of its own
+    default_settings = 'payeshgar_server.settings.test' if sys.argv[1:2] == ['test'] else 'payeshgar_server.settings'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', default_settings)
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
@@ -0,0 +1,115 @@
+"""
+Tracker of agents' last activity:
+instead of updating the Agent row on every request, the newest activity time of each agent is kept in the cache and
+flush() writes all of them to the database with a single bulk UPDATE, it's called every few seconds by
+monitoring.tasks.flush_agent_activity.
+
+Readers should pass agents through apply_pending() to see fresh values before they are flushed.
+The cache has to be shared between web and worker processes (e.g. memcached or redis) in production.
+
+Recorded activities are read and written under a lock kept in the cache, so concurrent writers can't replace a newer
+activity with an older one. Agents whose activity changed since the last flush are kept in a set, flush() only reads
+and writes those.
+"""
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.core.cache import cache
+
+from monitoring import models
+
+ACTIVITY_CACHE_TIMEOUT = 24 * 60 * 60
+# Seconds the lock is held at most, a lock of a crashed process expires after it
+LOCK_TIMEOUT = 5
+# Number of agents read and written per statement by flush()
+FLUSH_BATCH_SIZE = 1000
+
+_LOCK_KEY = "agent-activity-lock"
+_CHANGED_KEY = "agent-activity-changed"
+
+
+def _cache_key(agent_ip):
+    return f"agent-activity:{agent_ip}"
+
+
+@contextmanager
+def _locked():
+    """
+    Hold the lock of recorded activities, shared by all processes (add() only succeeds for one of them)
+    """
+    token = uuid.uuid4().hex
+    while not cache.add(_LOCK_KEY, token, timeout=LOCK_TIMEOUT):
+        time.sleep(0.001)
+    try:
+        yield
+    finally:
+        if cache.get(_LOCK_KEY) == token:
+            cache.delete(_LOCK_KEY)
+
+
+def _mark_changed(agent_ips):
+    """
+    Add agents to the set of agents to flush, the lock has to be held
+    """
+    changed = cache.get(_CHANGED_KEY, set())
+    cache.set(_CHANGED_KEY, changed | set(agent_ips), timeout=ACTIVITY_CACHE_TIMEOUT)
+
+
+def record_many(activities):
+    """
+    Record a dict of agent_ip -> datetime of activity, older values than what's already recorded are ignored
+    """
+    keys = {_cache_key(agent_ip): (agent_ip, timestamp) for agent_ip, timestamp in activities.items()}
+    with _locked():
+        recorded = cache.get_many(keys.keys())
+        newer = {
+            key: (agent_ip, timestamp) for key, (agent_ip, timestamp) in keys.items()
+            if key not in recorded or recorded[key] < timestamp
+        }
+        if newer:
+            cache.set_many({key: timestamp for key, (_, timestamp) in newer.items()}, timeout=ACTIVITY_CACHE_TIMEOUT)
+            _mark_changed(agent_ip for agent_ip, _ in newer.values())
+
+
+def record(agent_ip, timestamp):
+    record_many({agent_ip: timestamp})
+
+
+def apply_pending(agents):
+    """
+    Set recorded activities (which may not be flushed yet) on a list of agents,
+    returns them ordered by last_activity just like Agent queryset
+    """
+    recorded = cache.get_many([_cache_key(agent.ip) for agent in agents])
+    for agent in agents:
+        timestamp = recorded.get(_cache_key(agent.ip))
+        if timestamp is not None and timestamp > agent.last_activity:
+            agent.last_activity = timestamp
+    return sorted(agents, key=lambda agent: agent.last_activity, reverse=True)
+
+
+def flush():
+    """
+    Write recorded activities of agents which changed since the last flush and are newer than the stored ones,
+    returns number of updated agents
+    """
+    with _locked():
+        agent_ips = sorted(cache.get(_CHANGED_KEY, ()))
+        cache.delete(_CHANGED_KEY)
+    count = 0
+    try:
+        for start in range(0, len(agent_ips), FLUSH_BATCH_SIZE):
+            agents = list(models.Agent.objects.filter(
+                ip__in=agent_ips[start:start + FLUSH_BATCH_SIZE],
+            ).only('ip', 'last_activity'))
+            stored = {agent.ip: agent.last_activity for agent in agents}
+            changed = [agent for agent in apply_pending(agents) if agent.last_activity != stored[agent.ip]]
+            models.Agent.objects.bulk_update(changed, ['last_activity'])
+            count += len(changed)
+    except Exception:
+        # They're flushed by the next run
+        with _locked():
+            _mark_changed(agent_ips)
+        raise
+    return count
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+# Cache backends which aren't shared between processes
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    """
+    The default cache has to be shared by web and worker processes in production: activity of agents (see
+    monitoring.activity) is flushed by a worker, versions of endpoints, inspections and endpoint states (see
+    monitoring.versioning) are bumped by whichever process changes them and checked by all the others.
+    Any other environment (development, tests, see settings.test) can use any cache.
+    """
+    backend = settings.CACHES['default']['BACKEND']
+    if settings.ENVIRONMENT != "PRODUCTION" or backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Error(
+        f"The default cache ({backend}) isn't shared between processes",
+        hint="Set PAYESHGAR_CACHE_BACKEND and PAYESHGAR_CACHE_LOCATION to a shared cache, e.g. memcached",
+        id='monitoring.E001',
+    )]
@@ -0,0 +1,259 @@
+"""
+Server-sent events for agents: instead of polling endpoints and inspections on a fixed interval, agents keep a
+`GET /api/v1/monitoring/events?groups=...` request open (text/event-stream) and are told as soon as something changes:
+    - "endpoints": endpoints, policies or groups changed, data is the new version (see monitoring.versioning), agents
+      fetch /monitoring/endpoints again (with If-None-Match)
+    - "inspections": inspections of a work plan bucket of the agent's group set were planned, data has the bucket
+      (after, before) and its inspections, the same list /inspecting/inspections returns for that window (see
+      inspecting.workplans). Buckets may be sent more than once, inspections are identified by their id.
+
+Streams are served by EventStreamApplication, a plain ASGI application in front of Django (see payeshgar_server.asgi),
+an idle stream is just a coroutine waiting on a queue, so one process holds thousands of them. Every event is encoded
+once and the same bytes are queued to every matching stream, a stream which can't keep up (QUEUE_SIZE events behind)
+is closed, the agent reconnects and catches up by fetching.
+
+Events are published with publish() from any process and fanned out by a broker, selected by AGENT_EVENTS_BROKER:
+    - "kombu" (default): a fanout exchange on the Celery broker (CELERY_BROKER_URL), so events published by workers
+      and other web processes reach every ASGI process
+    - "local": in-process, only streams of the publishing process get the events, enough for a single process
+      deployment, tests and load tests
+Events are best effort, a missed one only costs an agent the wait until its next (much less frequent) poll.
+"""
+import asyncio
+import json
+import logging
+import threading
+import uuid
+from types import SimpleNamespace
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from ipware import get_client_ip
+from kombu import Connection, Exchange, Queue
+from kombu.mixins import ConsumerMixin
+from kombu.pools import producers
+
+from monitoring import identity
+
+logger = logging.getLogger(__name__)
+
+LOCAL = "local"
+KOMBU = "kombu"
+
+ENDPOINTS = "endpoints"
+INSPECTIONS = "inspections"
+
+EVENTS_PATH = "/api/v1/monitoring/events"
+# Seconds between keep-alive comments of an idle stream, so proxies don't close it
+KEEPALIVE_INTERVAL = 15
+# Milliseconds agents wait before reconnecting (the `retry` field of the stream)
+RECONNECT_DELAY = 5000
+# Events queued for a stream before it's considered too slow and closed
+QUEUE_SIZE = 100
+
+EXCHANGE = Exchange('agent_events', type='fanout', durable=False)
+
+
+def event(event_type, data, groups=None):
+    """
+    An event, data is a JSON text, groups is the group set it's meant for or None for every agent
+    """
+    return dict(type=event_type, data=data, groups=None if groups is None else sorted(set(groups)))
+
+
+def encode(event_):
+    return f"event: {event_['type']}\ndata: {event_['data']}\n\n".encode()
+
+
+class LocalBroker:
+    def __init__(self):
+        self.listeners = []
+
+    def publish(self, event_):
+        for listener in list(self.listeners):
+            listener(event_)
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+
+class _Consumer(ConsumerMixin):
+    def __init__(self, connection, listener):
+        self.connection = connection
+        self.listener = listener
+
+    def get_consumers(self, Consumer, channel):
+        # A queue of this process only, gone with its connection
+        queue = Queue(f'agent_events.{uuid.uuid4().hex}', EXCHANGE, exclusive=True, auto_delete=True)
+        return [Consumer(queues=[queue], callbacks=[self.on_message], accept=['json'])]
+
+    def on_message(self, body, message):
+        self.listener(body)
+        message.ack()
+
+
+class KombuBroker:
+    def __init__(self, url):
+        self.url = url
+
+    def publish(self, event_):
+        with producers[Connection(self.url)].acquire(block=True) as producer:
+            producer.publish(event_, exchange=EXCHANGE, declare=[EXCHANGE], serializer='json')
+
+    def subscribe(self, listener):
+        # Messages are consumed by a thread, reconnecting whenever the connection is lost
+        consumer = _Consumer(Connection(self.url), listener)
+        threading.Thread(target=consumer.run, name="agent-events-consumer", daemon=True).start()
+
+
+_brokers = {}
+_brokers_lock = threading.Lock()
+
+
+def get_broker():
+    name = settings.AGENT_EVENTS_BROKER
+    with _brokers_lock:
+        if name not in _brokers:
+            _brokers[name] = KombuBroker(settings.CELERY_BROKER_URL) if name == KOMBU else LocalBroker()
+        return _brokers[name]
+
+
+def publish(event_):
+    try:
+        get_broker().publish(event_)
+    except Exception:
+        logger.warning("Failed to publish %s event", event_['type'], exc_info=True)
+
+
+class Hub:
+    """
+    Streams of a process (of a single event loop), by group set
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.streams = {}
+
+    def subscribe(self, groups):
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.streams.setdefault(frozenset(groups), set()).add(queue)
+        return queue
+
+    def unsubscribe(self, groups, queue):
+        key = frozenset(groups)
+        self.streams[key].discard(queue)
+        if not self.streams[key]:
+            del self.streams[key]
+
+    def dispatch(self, event_):
+        if event_['groups'] is None:
+            queues = [queue for queues in self.streams.values() for queue in queues]
+        else:
+            queues = self.streams.get(frozenset(event_['groups']), ())
+        frame = encode(event_)
+        for queue in list(queues):
+            try:
+                queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                # Too slow, make room for the sentinel which closes the stream
+                queue.get_nowait()
+                queue.put_nowait(None)
+
+    def deliver(self, event_):
+        """
+        Dispatch event_ from any thread (brokers deliver from the publishing thread or a consumer thread)
+        """
+        if not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.dispatch, event_)
+
+
+_hubs = {}
+
+
+def get_hub():
+    """
+    Hub of the running event loop, subscribed to the broker the first time
+    """
+    loop = asyncio.get_running_loop()
+    if loop not in _hubs:
+        _hubs[loop] = Hub(loop)
+        get_broker().subscribe(_hubs[loop].deliver)
+    return _hubs[loop]
+
+
+class EventStreamApplication:
+    """
+    ASGI application which serves event streams on EVENTS_PATH and passes anything else to application
+    """
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] == EVENTS_PATH:
+            return await self.stream(scope, receive, send)
+        return await self.application(scope, receive, send)
+
+    @staticmethod
+    async def respond(send, status, body, content_type=b'application/json'):
+        await send({'type': 'http.response.start', 'status': status, 'headers': [(b'content-type', content_type)]})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def stream(self, scope, receive, send):
+        if scope['method'] != 'GET':
+            return await self.respond(send, 405, b'{"detail":"Method not allowed"}')
+        headers = {name.decode('latin1'): value.decode('latin1') for name, value in scope['headers']}
+        meta = {'HTTP_' + name.upper().replace('-', '_'): value for name, value in headers.items()}
+        meta['REMOTE_ADDR'] = scope['client'][0] if scope.get('client') else ''
+        agent_ip = get_client_ip(SimpleNamespace(META=meta))[0]
+        if not await sync_to_async(identity.is_known)(agent_ip):
+            return await self.respond(send, 401, b'{"non_field_error":"IP Address is not recognized"}')
+        groups = parse_qs(scope['query_string'].decode('latin1')).get('groups', [])
+
+        hub = get_hub()
+        queue = hub.subscribe(groups)
+        disconnected = asyncio.ensure_future(self._wait_for_disconnect(receive, queue))
+        try:
+            await send({'type': 'http.response.start', 'status': 200, 'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                # Nginx buffers responses by default
+                (b'x-accel-buffering', b'no'),
+            ]})
+            await send({'type': 'http.response.body', 'body': f"retry: {RECONNECT_DELAY}\n\n".encode(),
+                        'more_body': True})
+            while True:
+                try:
+                    frame = await asyncio.wait_for(queue.get(), KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    frame = b": keep-alive\n\n"
+                if frame is None:
+                    break
+                await send({'type': 'http.response.body', 'body': frame, 'more_body': True})
+            if not disconnected.done():
+                await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            disconnected.cancel()
+            hub.unsubscribe(groups, queue)
+
+    @staticmethod
+    async def _wait_for_disconnect(receive, queue):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+        # Drop whatever is queued, the stream is closed anyway
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+
+def endpoints_changed(version):
+    publish(event(ENDPOINTS, json.dumps(version)))
+
+
+def inspections_planned(groups, after, before, content):
+    """
+    Publish the rendered work plan (content, a JSON list) of the bucket (after, before) of groups
+    """
+    publish(event(INSPECTIONS, f'{{"after":"{after.isoformat()}","before":"{before.isoformat()}",'
+                               f'"inspections":{content.decode()}}}', groups))
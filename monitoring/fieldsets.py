@@ -0,0 +1,143 @@
+"""
+Sparse fieldsets and columnar responses of list views.
+
+`?fields=id,timestamp` (comma separated or repeated) keeps only some fields of the serializer, and the queryset only
+reads what they need: when every field is a column of the model, rows are read with .values_list() and represented
+by the serializer fields, without building model instances or calling the serializer per item. Otherwise instances
+are loaded with .only() the columns of the fields (if every field is a model field or relation).
+
+`?shape=columns` turns the list of objects into an object of parallel arrays, one per field, so keys aren't repeated
+for every item:
+    [{"id": 1, "name": "a"}, {"id": 2, "name": "b"}] -> {"id": [1, 2], "name": ["a", "b"]}
+
+Both are implemented by SparseFieldsetMixin for list views of model serializers which use
+SparseFieldsetSerializerMixin, responses without them are the same as before, just built faster.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+FIELDS_PARAM = 'fields'
+SHAPE_PARAM = 'shape'
+OBJECTS = 'objects'
+COLUMNS = 'columns'
+SHAPES = (OBJECTS, COLUMNS)
+
+
+class SparseFieldsetSerializerMixin:
+    """
+    Serializer which takes fields, names of the only fields to keep
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+def _model_field(serializer, field):
+    """
+    Model field which is the source of field, None if it isn't one
+    """
+    if field.source == '*' or '.' in field.source:
+        return None
+    try:
+        return serializer.Meta.model._meta.get_field(field.source)
+    except FieldDoesNotExist:
+        return None
+
+
+def _is_column(model_field):
+    return model_field is not None and model_field.concrete and not model_field.many_to_many
+
+
+def _converter(field):
+    # Primary key related fields are represented by the key itself, which is what the column holds
+    if isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None:
+        return None
+    return field.to_representation
+
+
+def rows(serializer, items, chunk_size=None):
+    """
+    Represented values of fields of serializer (a model serializer) for items (a queryset or a list of instances), an
+    iterable of a tuple per item in the order of serializer.fields. Querysets are read in chunks of chunk_size if given
+    """
+    fields = list(serializer.fields.values())
+    if not isinstance(items, list):
+        model_fields = [_model_field(serializer, field) for field in fields]
+        if all(_is_column(model_field) and not isinstance(field, serializers.BaseSerializer)
+               for field, model_field in zip(fields, model_fields)):
+            converters = [_converter(field) for field in fields]
+            values = items.values_list(*(model_field.name for model_field in model_fields))
+            return (
+                tuple(value if value is None or convert is None else convert(value)
+                      for value, convert in zip(row, converters))
+                for row in (values.iterator(chunk_size) if chunk_size else values)
+            )
+        if None not in model_fields:
+            items = items.only(*(model_field.name for model_field in model_fields if _is_column(model_field)))
+        if chunk_size:
+            items = items.iterator(chunk_size)
+    names = list(serializer.fields)
+    return (tuple(data[name] for name in names) for data in map(serializer.to_representation, items))
+
+
+def shape(names, rows_, columnar=False):
+    """
+    List of objects of rows (see rows), or an object of a list per field if columnar
+    """
+    if columnar:
+        columns = [[] for _ in names]
+        for row in rows_:
+            for column, value in zip(columns, row):
+                column.append(value)
+        return dict(zip(names, columns))
+    return [dict(zip(names, row)) for row in rows_]
+
+
+class SparseFieldsetMixin:
+    """
+    ?fields= and ?shape= for a list view (GenericAPIView) of a serializer which uses SparseFieldsetSerializerMixin,
+    see module docstring
+    """
+
+    def get_requested_fields(self):
+        """
+        Names of requested fields in the order of the serializer, None if every field is requested
+        """
+        requested = {
+            name.strip()
+            for value in self.request.query_params.getlist(FIELDS_PARAM) for name in value.split(',') if name.strip()
+        }
+        if not requested:
+            return None
+        available = list(self.get_serializer_class()().fields)
+        unknown = requested - set(available)
+        if unknown:
+            raise ValidationError({FIELDS_PARAM: [f"Unknown fields: {', '.join(sorted(unknown))}"]})
+        return [name for name in available if name in requested]
+
+    def is_columnar(self):
+        value = self.request.query_params.get(SHAPE_PARAM, OBJECTS)
+        if value not in SHAPES:
+            raise ValidationError({SHAPE_PARAM: [f"Should be one of {', '.join(SHAPES)}"]})
+        return value == COLUMNS
+
+    def get_serializer(self, *args, **kwargs):
+        # Only responses are sparse, requests which write are validated by every field
+        if self.request is not None and self.request.method == 'GET':
+            kwargs.setdefault('fields', self.get_requested_fields())
+        return super().get_serializer(*args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        columnar = self.is_columnar()
+        queryset = self.filter_queryset(self.get_queryset())
+        serializer = self.get_serializer()
+        page = self.paginate_queryset(queryset)
+        data = shape(list(serializer.fields), rows(serializer, queryset if page is None else page), columnar)
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
@@ -0,0 +1,81 @@
+"""
+Cache of agent identities:
+agents are identified by their IP address, so authenticating a request (or a submission in a worker) is only a matter
+of knowing whether an IP belongs to an agent. Answers are cached in two tiers, so it doesn't take a query per request:
+    - the shared cache (e.g. memcached, see CACHES setting) for AGENT_CACHE_TIMEOUT seconds
+    - an in-process dict in front of it for LOCAL_CACHE_TIMEOUT seconds, which saves a round trip to the cache server
+Both known and unknown IPs are cached.
+
+Saving or deleting an Agent invalidates its IP (see monitoring.signals) in the shared cache and in the local tier of
+the current process, local tiers of other processes may keep the old answer for LOCAL_CACHE_TIMEOUT seconds.
+"""
+import threading
+import time
+
+from django.core.cache import cache
+
+from monitoring import models
+
+AGENT_CACHE_TIMEOUT = 5 * 60
+LOCAL_CACHE_TIMEOUT = 5
+LOCAL_CACHE_MAX_SIZE = 10000
+
+_local = {}
+_local_lock = threading.Lock()
+
+
+def _cache_key(agent_ip):
+    return f"agent-identity:{agent_ip}"
+
+
+def _get_local(agent_ips):
+    now = time.monotonic()
+    with _local_lock:
+        entries = {agent_ip: _local.get(agent_ip) for agent_ip in agent_ips}
+    return {agent_ip: entry[0] for agent_ip, entry in entries.items() if entry is not None and entry[1] > now}
+
+
+def _set_local(answers):
+    expires_at = time.monotonic() + LOCAL_CACHE_TIMEOUT
+    with _local_lock:
+        # IPs of unknown clients are cached too, so the tier is dropped once it grows too large instead of growing
+        # without bound
+        if len(_local) + len(answers) > LOCAL_CACHE_MAX_SIZE:
+            _local.clear()
+        _local.update({agent_ip: (known, expires_at) for agent_ip, known in answers.items()})
+
+
+def known_agents(agent_ips):
+    """
+    Set of IPs which belong to an agent among agent_ips
+    """
+    answers = _get_local(agent_ips)
+    missing = set(agent_ips) - answers.keys()
+    if missing:
+        shared = cache.get_many([_cache_key(agent_ip) for agent_ip in missing])
+        fetched = {agent_ip: shared[_cache_key(agent_ip)] for agent_ip in missing if _cache_key(agent_ip) in shared}
+        missing -= fetched.keys()
+        if missing:
+            stored = set(models.Agent.objects.filter(ip__in=missing).values_list('ip', flat=True))
+            queried = {agent_ip: agent_ip in stored for agent_ip in missing}
+            cache.set_many({_cache_key(agent_ip): known for agent_ip, known in queried.items()},
+                           timeout=AGENT_CACHE_TIMEOUT)
+            fetched.update(queried)
+        _set_local(fetched)
+        answers.update(fetched)
+    return {agent_ip for agent_ip, known in answers.items() if known}
+
+
+def is_known(agent_ip):
+    return agent_ip in known_agents([agent_ip])
+
+
+def invalidate(agent_ip):
+    with _local_lock:
+        _local.pop(agent_ip, None)
+    cache.delete(_cache_key(agent_ip))
+
+
+def clear_local():
+    with _local_lock:
+        _local.clear()
@@ -0,0 +1,19 @@
+# Generated by Django 3.0.8 on 2026-10-18 12:29
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0003_auto_20200713_1936'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='monitoringpolicy',
+            name='anchor',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Schedule anchor'),
+        ),
+    ]
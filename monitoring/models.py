@@ -100,9 +100,12 @@ class MonitoringPolicy(models.Model):
     When it comes to monitoring a service, there are some details that are not relevant to the service itself, but they
     are required for monitoring.
 
+    anchor is the point in time where the schedule of inspections starts, inspections happen at anchor + k * interval
+
     """
     endpoint = models.OneToOneField(Endpoint, on_delete=models.CASCADE, related_name="monitoring_policy")
     interval = models.PositiveIntegerField(default=30, verbose_name="Interval in seconds")
+    anchor = models.DateTimeField(default=timezone.now, verbose_name="Schedule anchor")
     groups = models.ManyToManyField(Group, related_name="+", blank=True)
 
     def __str__(self):
@@ -4,7 +4,7 @@ from django.db.transaction import atomic
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
-from monitoring import models
+from monitoring import fieldsets, models
 
 
 class AgentSerializer(serializers.ModelSerializer):
@@ -44,7 +44,7 @@ class MonitoringPolicySerializer(serializers.ModelSerializer):
         return value
 
 
-class EndpointSerializer(serializers.ModelSerializer):
+class EndpointSerializer(fieldsets.SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     http_details = HTTPEndpointDetailSerializer()
     monitoring_policy = MonitoringPolicySerializer(required=False)
 
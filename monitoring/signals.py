@@ -0,0 +1,26 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from monitoring import events, identity, models, versioning
+
+
+@receiver(post_save, sender=models.Agent)
+@receiver(post_delete, sender=models.Agent)
+def invalidate_agent_identity(sender, instance, **kwargs):
+    identity.invalidate(instance.ip)
+
+
+@receiver(post_save, sender=models.Endpoint)
+@receiver(post_delete, sender=models.Endpoint)
+@receiver(post_save, sender=models.HTTPEndpointDetail)
+@receiver(post_delete, sender=models.HTTPEndpointDetail)
+@receiver(post_save, sender=models.MonitoringPolicy)
+@receiver(post_delete, sender=models.MonitoringPolicy)
+@receiver(post_save, sender=models.Group)
+@receiver(post_delete, sender=models.Group)
+@receiver(m2m_changed, sender=models.MonitoringPolicy.groups.through)
+def bump_endpoints_version(sender, **kwargs):
+    version, = versioning.bump(versioning.ENDPOINTS)
+    # Agents which are told about the change fetch endpoints right away, so not before it's visible to them
+    transaction.on_commit(lambda: events.endpoints_changed(version))
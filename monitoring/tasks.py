@@ -0,0 +1,11 @@
+from celery import shared_task
+
+from monitoring import activity
+
+
+@shared_task
+def flush_agent_activity():
+    """
+    Write agents' last activity recorded in the cache to the database, should be called every few seconds
+    """
+    return activity.flush()
@@ -1,7 +1,16 @@
+import asyncio
 import json
 import random
+import threading
+from datetime import datetime, timedelta
 
-from monitoring import models
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings, SimpleTestCase
+from django.test.utils import CaptureQueriesContext
+
+from monitoring import activity, checks, events, identity, models
 
 from rest_framework.test import APITestCase
 
@@ -45,6 +54,27 @@ class AgentCreationTestCase(APITestCase):
             self.assertEquals(response.status_code, 200)
             self.assertEquals(data['name'], name)
 
+    def test_agent_introducing_itself_again_only_writes_what_changed(self):
+        body = dict(name="foo", groups=self.groups, country="DEU")
+
+        def introduce():
+            return self.client.post("/api/v1/monitoring/agents", data=json.dumps(body),
+                                    content_type="application/json")
+
+        self.assertEquals(introduce().status_code, 201)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEquals(introduce().status_code, 200)
+        self.assertEquals([q['sql'] for q in queries if not q['sql'].startswith('SELECT')], [])
+
+        body.update(name="bar", groups=self.groups[:1])
+        with CaptureQueriesContext(connection) as queries:
+            response = introduce()
+        updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE')]
+        self.assertEquals(len(updates), 1)
+        self.assertNotIn('"country"', updates[0])
+        self.assertEquals((response.json()['name'], response.json()['groups']), ("bar", ["europe"]))
+        self.assertEquals(list(models.Agent.objects.get().groups.values_list('name', flat=True)), ["europe"])
+
     def test_agent_introducing_itself_with_invalid_country_code_is_not_ok(self):
         body = dict(
             name="foo",
@@ -83,6 +113,84 @@ class ReadingAgentsTestCase(APITestCase):
         self.assertEquals(response.status_code, 200)
 
 
+class AgentActivityTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.long_ago = datetime(2020, 7, 7, 15, 30, 40)
+        self.agents = [
+            models.Agent.objects.create(ip=f"10.0.0.{i}", name=f"agent-{i}", last_activity=self.long_ago)
+            for i in range(3)
+        ]
+
+    def test_recorded_activity_is_not_written_right_away(self):
+        activity.record("10.0.0.1", datetime.now())
+        self.assertEquals(models.Agent.objects.get(ip="10.0.0.1").last_activity, self.long_ago)
+
+    def test_list_of_agents_shows_recorded_activity(self):
+        now = datetime.now()
+        activity.record("10.0.0.1", now)
+
+        response = self.client.get("/api/v1/monitoring/agents")
+        data = response.json()
+
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(data[0]['ip'], "10.0.0.1")
+        self.assertEquals(data[0]['last_activity'], now.isoformat())
+
+    def test_older_activity_is_ignored(self):
+        now = datetime.now()
+        activity.record("10.0.0.1", now)
+        activity.record("10.0.0.1", now - timedelta(minutes=1))
+        activity.flush()
+
+        self.assertEquals(models.Agent.objects.get(ip="10.0.0.1").last_activity, now)
+
+    def test_flush_writes_all_changes_at_once(self):
+        now = datetime.now()
+        activity.record_many({"10.0.0.0": now, "10.0.0.2": now})
+
+        with CaptureQueriesContext(connection) as queries:
+            updated = activity.flush()
+
+        self.assertEquals(updated, 2)
+        self.assertEquals(len([q for q in queries if q['sql'].startswith('UPDATE')]), 1)
+        self.assertEquals(models.Agent.objects.filter(last_activity=now).count(), 2)
+        # Only agents which changed since the last flush are read
+        with self.assertNumQueries(0):
+            self.assertEquals(activity.flush(), 0)
+
+    def test_concurrent_records_wait_for_each_other(self):
+        recorded = threading.Event()
+
+        def record():
+            activity.record("10.0.0.1", datetime.now())
+            recorded.set()
+
+        with activity._locked():
+            threading.Thread(target=record).start()
+            self.assertFalse(recorded.wait(0.05))
+        self.assertTrue(recorded.wait(5))
+        self.assertEquals(activity.flush(), 1)
+
+
+@override_settings(ENVIRONMENT="PRODUCTION")
+class SharedCacheCheckTestCase(SimpleTestCase):
+
+    def test_local_memory_cache_is_an_error_in_production(self):
+        errors = checks.check_shared_cache(None)
+
+        self.assertEquals([error.id for error in errors], ['monitoring.E001'])
+        for environment in ("DEVELOPMENT", "TEST"):
+            with override_settings(ENVIRONMENT=environment):
+                self.assertEquals(checks.check_shared_cache(None), [])
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache', 'LOCATION': '127.0.0.1:11211',
+    }})
+    def test_shared_cache_passes(self):
+        self.assertEquals(checks.check_shared_cache(None), [])
+
+
 class EndpointCreationTestCase(APITestCase):
     def setUp(self):
         self.groups = ["europe", "hetzner", "germany"]
@@ -360,3 +468,174 @@ class ReadingEndpointTestCase(APITestCase):
 
         self.assertEquals(response.status_code, 200)
         self.assertEquals(len(data), 2 + 3 + 4)
+
+    def test_read_endpoints_with_sparse_fields(self):
+        expected = self.client.get("/api/v1/monitoring/endpoints").json()
+
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/v1/monitoring/endpoints", data=dict(fields="id,name"))
+        self.assertEquals(response.json(), [dict(id=e['id'], name=e['name']) for e in expected])
+
+        # Nested fields are fetched with a query per relation, whatever the number of endpoints
+        with self.assertNumQueries(3):
+            response = self.client.get("/api/v1/monitoring/endpoints", data=dict(fields="name,monitoring_policy",
+                                                                                 shape="columns"))
+        self.assertEquals(response.json(), dict(
+            monitoring_policy=[e['monitoring_policy'] for e in expected], name=[e['name'] for e in expected],
+        ))
+        self.assertEquals(sorted(response.json()['monitoring_policy'][0]['groups']), sorted(self.groups))
+
+    def test_sparse_fields_do_not_apply_to_creation(self):
+        response = self.client.post("/api/v1/monitoring/endpoints?fields=id", data=dict(
+            name="sparse", http_details=dict(hostname="foo.com", port="443", path="/", method_name="GET"),
+        ), format='json')
+
+        self.assertEquals(response.status_code, 201)
+        self.assertEquals(response.json()['http_details']['hostname'], "foo.com")
+
+
+class AgentIdentityTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        identity.clear_local()
+        models.Agent.objects.create(ip="10.0.0.1", name="agent-1")
+
+    def test_known_agents_are_looked_up_with_a_single_query_and_then_cached(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEquals(identity.known_agents(["10.0.0.1", "10.0.0.2"]), {"10.0.0.1"})
+        self.assertEquals(len(queries), 1)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(identity.is_known("10.0.0.1"))
+            self.assertFalse(identity.is_known("10.0.0.2"))
+        self.assertEquals(len(queries), 0)
+
+    def test_shared_cache_is_used_when_local_tier_is_empty(self):
+        identity.is_known("10.0.0.1")
+        identity.clear_local()
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(identity.is_known("10.0.0.1"))
+        self.assertEquals(len(queries), 0)
+
+    def test_saving_or_deleting_an_agent_invalidates_its_identity(self):
+        self.assertFalse(identity.is_known("10.0.0.2"))
+        models.Agent.objects.create(ip="10.0.0.2", name="agent-2")
+        self.assertTrue(identity.is_known("10.0.0.2"))
+
+        models.Agent.objects.filter(ip="10.0.0.2").delete()
+        self.assertFalse(identity.is_known("10.0.0.2"))
+
+
+class ConditionalEndpointsTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.group = models.Group.objects.create(name="europe")
+        self.endpoint = models.Endpoint.objects.create(name="endpoint")
+        self.policy = models.MonitoringPolicy.objects.create(endpoint=self.endpoint)
+        self.policy.groups.add(self.group)
+
+    def _get(self, etag=None, **params):
+        headers = {} if etag is None else dict(HTTP_IF_NONE_MATCH=etag)
+        return self.client.get("/api/v1/monitoring/endpoints", data=dict(groups="europe", **params), **headers)
+
+    def test_matching_etag_is_not_modified_without_queries(self):
+        etag = self._get()['ETag']
+
+        with self.assertNumQueries(0):
+            response = self._get(etag)
+        self.assertEquals(response.status_code, 304)
+        self.assertEquals(response['ETag'], etag)
+
+        self.assertEquals(self._get(etag, extra="1").status_code, 200)
+
+    def test_changes_of_endpoints_policies_and_groups_change_the_etag(self):
+        changes = [
+            lambda: models.HTTPEndpointDetail.objects.create(endpoint=self.endpoint, hostname='foo.com', port=80,
+                                                             path='/', method_name='get'),
+            lambda: models.Group.objects.create(name="asia"),
+            lambda: self.policy.groups.remove(self.group),
+            lambda: self.policy.save(),
+            lambda: self.endpoint.delete(),
+        ]
+        for change in changes:
+            etag = self._get()['ETag']
+            change()
+            self.assertEquals(self._get(etag).status_code, 200)
+
+
+class EventStreamTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        identity.clear_local()
+        models.Agent.objects.create(ip="10.0.0.1", name="agent-1")
+
+    def _stream(self, published, groups=(), client_ip="10.0.0.1", publish=events.publish, timeout=0.01):
+        """
+        Messages sent by a stream of groups which is open while published events are published (with publish), kept
+        open until a message per event is sent or timeout (seconds) passes
+        """
+        scope = dict(
+            type='http', method='GET', path=events.EVENTS_PATH, headers=[], client=(client_ip, 1234),
+            query_string="&".join(f"groups={group}" for group in groups).encode(),
+        )
+
+        async def run():
+            sent, inbox = [], asyncio.Queue()
+
+            async def send(message):
+                sent.append(message)
+
+            inbox.put_nowait({'type': 'http.request', 'body': b''})
+            stream = asyncio.ensure_future(events.EventStreamApplication(None)(scope, inbox.get, send))
+            while not sent and not stream.done():
+                await asyncio.sleep(0.01)
+            for event in published:
+                publish(event)
+            deadline = asyncio.get_running_loop().time() + timeout
+            while len(sent) < 2 + len(published) and asyncio.get_running_loop().time() < deadline:
+                await asyncio.sleep(0.01)
+            inbox.put_nowait({'type': 'http.disconnect'})
+            await stream
+            return sent
+
+        return async_to_sync(run)()
+
+    def test_agents_get_events_of_their_group_set_and_everyone(self):
+        sent = self._stream([
+            events.event(events.INSPECTIONS, '[1]', ["asia", "europe"]),
+            events.event(events.INSPECTIONS, '[2]', ["europe"]),
+            events.event(events.ENDPOINTS, '"version"'),
+        ], groups=["europe", "asia"])
+
+        self.assertEquals(sent[0]['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), sent[0]['headers'])
+        body = b"".join(message.get('body', b'') for message in sent[1:])
+        self.assertEquals(body.split(b"\n\n"), [
+            b"retry: 5000", b"event: inspections\ndata: [1]", b'event: endpoints\ndata: "version"', b"",
+        ])
+
+    @override_settings(AGENT_EVENTS_BROKER=events.KOMBU, CELERY_BROKER_URL="memory://")
+    def test_events_published_by_workers_reach_streams(self):
+        stopped = threading.Event()
+
+        def publish_from_worker(event):
+            # Published from a thread of its own like a worker does, again until the consumer of the stream's
+            # process has bound its queue to the exchange (events published before that aren't kept)
+            def run():
+                while not stopped.wait(0.05):
+                    events.publish(event)
+            threading.Thread(target=run, daemon=True).start()
+
+        try:
+            sent = self._stream([events.event(events.ENDPOINTS, '"version"')], publish=publish_from_worker, timeout=5)
+        finally:
+            stopped.set()
+
+        body = b"".join(message.get('body', b'') for message in sent[1:])
+        self.assertEquals(body.split(b"\n\n")[:2], [b"retry: 5000", b'event: endpoints\ndata: "version"'])
+
+    def test_unknown_agents_are_not_accepted(self):
+        sent = self._stream([], client_ip="10.0.0.2")
+
+        self.assertEquals(sent[0]['status'], 401)
@@ -0,0 +1,90 @@
+"""
+Versions of data which agents (and dashboards) poll, for conditional GET:
+each name (ENDPOINTS, INSPECTIONS, ENDPOINT_STATUSES) has a version token in the shared cache which is replaced by
+bump() whenever the data changes. List views using ConditionalGetMixin build their ETag from the versions they depend
+on and the request (query parameters and accepted media type), so a request with a matching If-None-Match gets 304 Not
+Modified after a single cache read, without running the main query or serializing anything.
+
+    - ENDPOINTS: endpoints, their HTTP details, monitoring policies and groups (see monitoring.signals)
+    - INSPECTIONS: generated inspections (see inspecting.tasks.generate_inspections)
+    - ENDPOINT_STATUSES: current states of endpoints over all agents (see inspecting.states)
+
+A version missing from the cache (evicted, or a fresh cache) gets a new token, which only costs clients a full
+response. The cache has to be shared between web and worker processes (e.g. memcached or redis) in production.
+"""
+import hashlib
+import uuid
+
+from django.core.cache import cache
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+ENDPOINTS = "endpoints"
+INSPECTIONS = "inspections"
+ENDPOINT_STATUSES = "endpoint-statuses"
+
+VERSION_CACHE_TIMEOUT = None
+
+
+def _cache_key(name):
+    return f"data-version:{name}"
+
+
+def get_versions(names):
+    """
+    List of current version tokens of names
+    """
+    keys = [_cache_key(name) for name in names]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # add() keeps the token of a concurrent request, if there is one
+            cache.add(key, uuid.uuid4().hex, timeout=VERSION_CACHE_TIMEOUT)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump(*names):
+    """
+    Replace versions of names, returns the new ones
+    """
+    versions = {name: uuid.uuid4().hex for name in names}
+    cache.set_many({_cache_key(name): version for name, version in versions.items()}, timeout=VERSION_CACHE_TIMEOUT)
+    return [versions[name] for name in names]
+
+
+def etag(names, *parts):
+    """
+    ETag of a response which depends on versions of names and anything else given as parts
+    """
+    digest = hashlib.sha1(repr((get_versions(names), parts)).encode())
+    return digest.hexdigest()
+
+
+class ConditionalGetMixin:
+    """
+    ETag and 304 Not Modified for GET requests of a generic view whose response only depends on versions of
+    version_names, query parameters and whatever get_etag_parts() returns.
+    """
+    version_names = ()
+
+    def get_etag_parts(self):
+        return ()
+
+    def get_etag(self, request):
+        return etag(
+            self.version_names, request.accepted_media_type, sorted(request.query_params.lists()),
+            *self.get_etag_parts(),
+        )
+
+    def get(self, request, *args, **kwargs):
+        tag = quote_etag(self.get_etag(request))
+        etags = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+        if tag in etags or '*' in etags:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = super().get(request, *args, **kwargs)
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = tag
+        return response
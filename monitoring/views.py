@@ -1,9 +1,11 @@
+from django.utils import timezone
 from django.utils.functional import SimpleLazyObject
 from rest_framework import mixins
 from rest_framework.generics import ListCreateAPIView, RetrieveUpdateDestroyAPIView, ListAPIView, UpdateAPIView, \
     CreateAPIView, GenericAPIView
+from rest_framework.response import Response
 from ipware import get_client_ip
-from monitoring import models, serializers
+from monitoring import activity, fieldsets, models, serializers, versioning
 
 
 class AgentListCreateView(mixins.ListModelMixin,
@@ -17,12 +19,18 @@ class AgentListCreateView(mixins.ListModelMixin,
     def get(self, request, *args, **kwargs):
         return self.list(request, *args, **kwargs)
 
+    def list(self, request, *args, **kwargs):
+        agents = activity.apply_pending(list(self.filter_queryset(self.get_queryset())))
+        serializer = self.get_serializer(agents, many=True)
+        return Response(serializer.data)
+
     def get_object(self):
         if self._agent_object is None:
             self._agent_object = models.Agent.objects.filter(ip=self._get_client_ip_address()).first()
         return self._agent_object
 
     def post(self, request, *args, **kwargs):
+        activity.record(self._get_client_ip_address(), timezone.now())
         agent = self.get_object()
         if agent is None:
             return self.create(request, *args, **kwargs)
@@ -34,21 +42,50 @@ class AgentListCreateView(mixins.ListModelMixin,
     def perform_create(self, serializer):
         return serializer.save(ip=self._get_client_ip_address())
 
+    def perform_update(self, serializer):
+        # Agents introduce themselves again on every start, only fields which changed are written
+        agent, data = serializer.instance, dict(serializer.validated_data)
+        groups = data.pop('groups', None)
+        changed = [name for name, value in data.items() if getattr(agent, name) != value]
+        for name in changed:
+            setattr(agent, name, data[name])
+        if changed:
+            agent.save(update_fields=changed)
+        if groups is not None and set(groups) != set(agent.groups.all()):
+            agent.groups.set(groups)
+
 
 class AgentDetailView(RetrieveUpdateDestroyAPIView):
     serializer_class = serializers.AgentSerializer
     queryset = SimpleLazyObject(lambda: models.Agent.objects.all())
     lookup_url_kwarg = "agent_ip"
 
+    def get_object(self):
+        agent = super(AgentDetailView, self).get_object()
+        activity.apply_pending([agent])
+        return agent
+
 
-class EndpointListCreateView(ListCreateAPIView):
+class EndpointListCreateView(versioning.ConditionalGetMixin, fieldsets.SparseFieldsetMixin, ListCreateAPIView):
+    """
+    Endpoints, optionally of some groups, with sparse fieldsets and columnar responses (see monitoring.fieldsets)
+    """
     serializer_class = serializers.EndpointSerializer
     queryset = SimpleLazyObject(
         lambda: models.Endpoint.objects.prefetch_related('http_details', 'monitoring_policy').all()
     )
+    version_names = (versioning.ENDPOINTS,)
+    # Related objects of nested fields, only fetched when the field is requested
+    field_prefetches = {
+        'http_details': ('http_details',),
+        'monitoring_policy': ('monitoring_policy', 'monitoring_policy__groups'),
+    }
 
     def get_queryset(self):
-        queryset = models.Endpoint.objects.prefetch_related('http_details', 'monitoring_policy')
+        fields = self.get_requested_fields() or list(self.field_prefetches)
+        queryset = models.Endpoint.objects.prefetch_related(
+            *(lookup for name in fields for lookup in self.field_prefetches.get(name, ()))
+        )
         if 'groups' in self.request.GET:
             groups = self.request.GET.getlist('groups')
             queryset = queryset.distinct().filter(monitoring_policy__groups__in=groups)
@@ -9,8 +9,21 @@ https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'payeshgar_server.settings')
 
-application = get_asgi_application()
+django.setup(set_prefix=False)
+
+# Imported once Django is set up
+from django.core.handlers.asgi import ASGIHandler  # noqa: E402
+
+from monitoring import events  # noqa: E402
+
+# Django 3.0 runs views with sync_to_async. asgiref 3.2 (see requirements.txt) runs them in the default executor of
+# the event loop, a pool of ASGI_THREADS threads (an environment variable read by asgiref, e.g. ASGI_THREADS=32),
+# each with a database connection of its own. asgiref 3.3+ would run every view of the process in a single thread.
+django_application = ASGIHandler()
+
+# Event streams of agents are served outside of Django, see monitoring.events
+application = events.EventStreamApplication(django_application)
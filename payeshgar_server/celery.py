@@ -2,7 +2,8 @@ from __future__ import absolute_import, unicode_literals
 
 import os
 from kombu import Exchange, Queue
-from celery import Celery
+from celery import Celery, signals
+from celery.concurrency import get_implementation
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'payeshgar_server.settings')
 app = Celery('celery_app')
@@ -29,6 +30,10 @@ app.conf.task_queues = (
 app.conf.task_routes = {
     'inspecting.tasks.process_results': {'queue': 'new_result'},
     'inspecting.tasks.generate_inspections': {'queue': 'inspection_generation'},
+    'monitoring.tasks.flush_agent_activity': {'queue': 'new_result'},
+    'inspecting.tasks.maintain_partitions': {'queue': 'inspection_generation'},
+    'inspecting.tasks.archive_results': {'queue': 'inspection_generation'},
+    'inspecting.tasks.export_results': {'queue': 'inspection_generation'},
 }
 
 app.conf.beat_schedule = {
@@ -36,5 +41,28 @@ app.conf.beat_schedule = {
         'task': 'inspecting.tasks.generate_inspections',
         'schedule': 300.0,
     },
+    'flush_agent_activity': {
+        'task': 'monitoring.tasks.flush_agent_activity',
+        'schedule': 5.0,
+    },
+    'maintain_partitions': {
+        'task': 'inspecting.tasks.maintain_partitions',
+        'schedule': 3600.0,
+    },
+    'archive_results': {
+        'task': 'inspecting.tasks.archive_results',
+        'schedule': 3600.0,
+    },
+    'export_results': {
+        'task': 'inspecting.tasks.export_results',
+        'schedule': 3600.0,
+    },
 
 }
+
+
+@signals.worker_init.connect
+def configure_result_batching(sender, **kwargs):
+    # Whether submissions can meet in a batch depends on the pool, see inspecting.ingest
+    from inspecting import ingest
+    ingest.configure_worker(get_implementation(sender.pool_cls), sender.concurrency)
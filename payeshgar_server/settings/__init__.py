@@ -67,6 +67,68 @@ CELERY_BROKER_URL = "amqp://{rabbitmq_hostname}:{rabbitmq_port}".format(
     rabbitmq_port=os.environ.get("PAYESHGAR_RABBITMQ_PORT", "5672"),
 )
 
+# Cache shared by web and worker processes (agent activity and identity, versions of endpoints and inspections are kept
+# in it), e.g. memcached:
+# PAYESHGAR_CACHE_BACKEND=django.core.cache.backends.memcached.MemcachedCache PAYESHGAR_CACHE_LOCATION=127.0.0.1:11211
+# The local memory default is only fit for tests (see settings.test) and development, in production it fails the
+# system checks (see monitoring.checks)
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv("PAYESHGAR_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        'LOCATION': os.getenv("PAYESHGAR_CACHE_LOCATION", ""),
+    }
+}
+
+# How future inspections are scheduled:
+#   - "materialized": every future inspection is stored by inspecting.tasks.generate_inspections
+#   - "virtual": inspections are computed from monitoring policies on the fly, see inspecting.schedule
+INSPECTION_SCHEDULE = os.getenv("PAYESHGAR_INSPECTION_SCHEDULE", "materialized")
+
+# How submitted inspection results are ingested:
+#   - "async": request is only authenticated and queued (new_result queue), agent receives 202 with a submission id
+#   - "sync": results are processed within the request, useful for tests and development
+INSPECTION_RESULT_INGESTION = os.getenv("PAYESHGAR_INSPECTION_RESULT_INGESTION", "async")
+
+# Micro-batching of result ingestion, see inspecting.ingest.ResultBatcher
+# submissions processed concurrently by a worker (thread/gevent pool) are stored together, once the batch has
+# MAX_ROWS results or is MAX_AGE seconds old. Workers use the threads pool then (unless -P says otherwise), a prefork
+# or solo pool runs a task at a time per process, so submissions are stored one by one without waiting.
+INSPECTION_RESULT_BATCHING = os.getenv("PAYESHGAR_INSPECTION_RESULT_BATCHING", "0") == "1"
+INSPECTION_RESULT_BATCH_MAX_ROWS = int(os.getenv("PAYESHGAR_INSPECTION_RESULT_BATCH_MAX_ROWS", "5000"))
+INSPECTION_RESULT_BATCH_MAX_AGE = float(os.getenv("PAYESHGAR_INSPECTION_RESULT_BATCH_MAX_AGE", "0.5"))
+if INSPECTION_RESULT_BATCHING:
+    CELERY_WORKER_POOL = "threads"
+
+# How result rows are written: "bulk_create" or "copy" (COPY FROM STDIN, PostgreSQL only), see inspecting.ingest
+INSPECTION_RESULT_STORAGE_BACKEND = os.getenv("PAYESHGAR_INSPECTION_RESULT_STORAGE_BACKEND", "bulk_create")
+
+# Limits of result submissions: bodies larger than MAX_BODY_SIZE bytes (after decompression) are rejected with 413,
+# results are parsed and handed to ingestion in chunks of CHUNK_SIZE, see inspecting.parsers.iter_result_chunks
+INSPECTION_RESULT_MAX_BODY_SIZE = int(os.getenv("PAYESHGAR_INSPECTION_RESULT_MAX_BODY_SIZE", str(128 * 1024 * 1024)))
+INSPECTION_RESULT_CHUNK_SIZE = int(os.getenv("PAYESHGAR_INSPECTION_RESULT_CHUNK_SIZE", "5000"))
+
+# Opt-in time partitioning of inspections and results on PostgreSQL, see inspecting.partitioning
+#   - PARTITIONING: "" (disabled), "daily" or "monthly"
+#   - PARTITION_RETENTION: partitions older than this many days are expired, 0 keeps everything
+#   - EXPIRED_PARTITIONS: "detach" (expired partitions are kept as standalone tables) or "drop"
+INSPECTION_PARTITIONING = os.getenv("PAYESHGAR_INSPECTION_PARTITIONING", "")
+INSPECTION_PARTITION_RETENTION = int(os.getenv("PAYESHGAR_INSPECTION_PARTITION_RETENTION", "0"))
+INSPECTION_EXPIRED_PARTITIONS = os.getenv("PAYESHGAR_INSPECTION_EXPIRED_PARTITIONS", "detach")
+# Results of inspections older than this many days are packed into compressed chunks (see inspecting.archive),
+# 0 keeps all results as rows. Archived results lose their ids, only archive.query() and archive.iter_rows() (so
+# exports) read them: endpoint stats reject older ranges, health rollups and latency sketches are kept as they are.
+INSPECTION_RESULT_ARCHIVE_AFTER = int(os.getenv("PAYESHGAR_INSPECTION_RESULT_ARCHIVE_AFTER", "0"))
+# Closed days of results are exported to files in this directory for analytics (see inspecting.export), empty disables
+# export. The format is "parquet" or "arrow" (Arrow IPC), pyarrow is required for both.
+INSPECTION_RESULT_EXPORT_DIR = os.getenv("PAYESHGAR_INSPECTION_RESULT_EXPORT_DIR", "")
+INSPECTION_RESULT_EXPORT_FORMAT = os.getenv("PAYESHGAR_INSPECTION_RESULT_EXPORT_FORMAT", "parquet")
+
+# How events for agents (see monitoring.events) are fanned out to processes serving event streams:
+#   - "kombu": a fanout exchange on the Celery broker, needed as events are published by workers and other processes
+#     (e.g. work plans by inspecting.tasks), the default
+#   - "local": in-process only, for a single process deployment, tests (see settings.test) and load tests
+AGENT_EVENTS_BROKER = os.getenv("PAYESHGAR_AGENT_EVENTS_BROKER", "kombu")
+
 ENVIRONMENT = os.getenv("PAYESHGAR_ENVIRONMENT", "PRODUCTION")
 
 if ENVIRONMENT == "PRODUCTION":
@@ -0,0 +1,9 @@
+"""
+Settings of the test suite, used by `manage.py test` unless DJANGO_SETTINGS_MODULE says otherwise (other test
+runners should point DJANGO_SETTINGS_MODULE here too)
+"""
+from payeshgar_server.settings import *  # noqa
+
+# Tests run in a single process, so the local memory cache is fine (see monitoring.checks)
+ENVIRONMENT = "TEST"
+AGENT_EVENTS_BROKER = "local"